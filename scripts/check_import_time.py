@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measure import time of the application and enforce an import-time budget.
+
+Usage:
+    python scripts/check_import_time.py [--module src.main] [--budget-ms 1000] [--runs 5]
+
+Each run imports the module in a fresh interpreter with ``-X importtime``.
+The best run is compared against the budget, and the check fails if any of
+the heavy CV modules (cv2, numpy) is imported eagerly.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Modules that must only be imported on first CV use
+FORBIDDEN_MODULES = ("cv2", "numpy")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+
+def measure(module: str) -> tuple[float, dict[str, float]]:
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        Tuple of (total import time in ms, cumulative ms per imported module)
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr)
+        raise SystemExit(f"Error: importing {module} failed")
+
+    modules: dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2)) / 1000
+
+    return modules.get(module, 0.0), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check application import time")
+    parser.add_argument("--module", default="src.main", help="Module to import")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="Maximum import time in ms")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs (best is used)")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest modules to list")
+
+    args = parser.parse_args()
+
+    results = [measure(args.module) for _ in range(args.runs)]
+    total_ms, modules = min(results, key=lambda r: r[0])
+
+    print(f"Import time for {args.module}: {total_ms:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("\nSlowest imports (cumulative):")
+    for name, ms in sorted(modules.items(), key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    failed = False
+    eager = [name for name in FORBIDDEN_MODULES if name in modules]
+    if eager:
+        print(f"\nFAIL: heavy modules imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
-from typing import Optional
-from fastapi import APIRouter, File, Form, UploadFile, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+import asyncio
+import hashlib
+import tempfile
+import zipfile
+from collections import defaultdict
+from pathlib import PurePosixPath
+from typing import IO, TYPE_CHECKING, Callable, Literal, Optional, Union
+from fastapi import APIRouter, File, Form, Header, Query, UploadFile, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 from ..core.models import (
     ToolkitTemplate,
@@ -11,14 +18,34 @@ from ..core.models import (
     ToolkitStatus,
     CheckInResponse,
     CheckInRecord,
+    ReferenceImage,
+    CheckInJob,
+    UploadSession,
 )
+from ..core.config import settings
+from ..core.deadline import CheckInAborted, Deadline
 from ..services.template_service import template_service
-from ..services.toolkit_instance_service import toolkit_instance_service
-from ..utils.image_utils import load_image
+from ..services.toolkit_instance_service import toolkit_instance_service, ToolkitConflictError
+from ..services.annotation_renderer import annotation_renderer
+from ..services.artifact_store import ARTIFACT_MEDIA_TYPES, artifact_store
+from ..services.cv_executor import cv_executor, ExecutorSaturated, Priority
+from ..services.job_queue import job_queue
+from ..services.memory_budget import ImageTooLarge, MemoryMeter, memory_budget
+from ..services.resource_governor import resource_governor
+from ..services.upload_sessions import UploadConflict, UploadIncomplete, UploadNotFound, upload_sessions
+from ..services.warmup import warmup_state
+
+if TYPE_CHECKING:
+    from ..utils.image_utils import ImageData
 
 router = APIRouter(prefix="/api", tags=["api"])
 
 
+def _executor_busy(e: ExecutorSaturated) -> HTTPException:
+    """503 response telling the client when to retry a rejected CV job."""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
 # ==================== HEALTH ====================
 
 class HealthResponse(BaseModel):
@@ -32,6 +59,98 @@ async def health_check():
     return HealthResponse(status="healthy", version="1.0.0")
 
 
+class ReadyResponse(BaseModel):
+    ready: bool
+    status: str
+    templates_compiled: int
+    duration_ms: Optional[float] = None
+    errors: list[str] = []
+
+
+@router.get("/ready", response_model=ReadyResponse)
+async def readiness_check(response: Response):
+    """Readiness probe: 200 once startup warm-up has finished, 503 before."""
+    if not warmup_state.ready:
+        response.status_code = 503
+    return ReadyResponse(
+        ready=warmup_state.ready,
+        status=warmup_state.status.value,
+        templates_compiled=warmup_state.templates_compiled,
+        duration_ms=warmup_state.duration_ms,
+        errors=warmup_state.errors,
+    )
+
+
+class PriorityClassStats(BaseModel):
+    weight: float
+    running: int
+    queued: int
+    completed: int
+    rejected: int
+    wait_ms_p50: Optional[float] = None
+    wait_ms_p95: Optional[float] = None
+
+
+class ExecutorStats(BaseModel):
+    max_workers: int
+    max_queue: int
+    interactive_reserved: int
+    running: int
+    queued: int
+    paused: int
+    completed: int
+    rejected: int
+    wait_ms_p50: Optional[float] = None
+    wait_ms_p95: Optional[float] = None
+    wait_ms_max: Optional[float] = None
+    classes: dict[Priority, PriorityClassStats]
+
+
+@router.get("/executor", response_model=ExecutorStats)
+async def executor_stats():
+    """CV executor queue depth and recent queue-wait times, overall and per priority class."""
+    return ExecutorStats(**cv_executor.stats())
+
+
+class ResourceLayoutResponse(BaseModel):
+    host_cpus: int
+    affinity_cpus: int
+    cgroup_cpu_limit: Optional[float] = None
+    effective_cpus: int
+    backend: str
+    executor_workers: int
+    process_workers: Optional[int] = None
+    opencv_threads: int
+    blas_threads: int
+    memory_limit_bytes: Optional[int] = None
+    memory_budget_bytes: int
+
+
+@router.get("/resources", response_model=ResourceLayoutResponse)
+async def resource_layout():
+    """Effective CPU and memory budget and the worker/thread counts derived from it."""
+    return ResourceLayoutResponse(**resource_governor.describe())
+
+
+class MemoryBudgetStats(BaseModel):
+    budget_bytes: int
+    max_request_bytes: int
+    reserved_bytes: int
+    in_flight: int
+    admitted: int
+    rejected: int
+    downscaled: int
+    too_large: int
+    measured_to_estimated_p50: Optional[float] = None
+    measured_to_estimated_p95: Optional[float] = None
+
+
+@router.get("/memory", response_model=MemoryBudgetStats)
+async def memory_budget_stats():
+    """Check-in memory budget usage and how measured peaks compare with estimates."""
+    return MemoryBudgetStats(**memory_budget.stats())
+
+
 # ==================== TEMPLATES ====================
 
 class TemplateListResponse(BaseModel):
@@ -70,11 +189,13 @@ async def update_template(template_id: str, template: ToolkitTemplate):
     """Update an existing template."""
     if template_id != template.template_id:
         raise HTTPException(status_code=400, detail="template_id in URL must match template_id in body")
+    if not template_service.get_template(template_id):
+        raise HTTPException(status_code=404, detail=f"Template '{template_id}' not found")
     try:
         updated = template_service.update_template(template)
         return updated
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.delete("/templates/{template_id}")
@@ -101,8 +222,10 @@ async def upload_template_image(
 
     try:
         contents = await file.read()
-        template_service.save_image(template_id, contents)
+        await cv_executor.run(template_service.save_image, template_id, contents)
         return {"message": "Image uploaded successfully"}
+    except ExecutorSaturated as e:
+        raise _executor_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save image: {e}")
 
@@ -123,19 +246,108 @@ async def check_template_image(template_id: str):
     return {"has_image": template_service.has_image(template_id)}
 
 
+@router.post("/templates/{template_id}/layers/{layer_id}/image")
+async def upload_layer_image(
+    template_id: str,
+    layer_id: str,
+    file: UploadFile = File(..., description="Reference image for the layer"),
+):
+    """Upload or update the reference image of one layer of a template.
+
+    The layer's ArUco markers are detected from it, as for a template image.
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    try:
+        contents = await file.read()
+        await cv_executor.run(template_service.save_layer_image, template_id, layer_id, contents)
+        return {"message": "Image uploaded successfully"}
+    except ExecutorSaturated as e:
+        raise _executor_busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save image: {e}")
+
+
+@router.get("/templates/{template_id}/layers/{layer_id}/image")
+async def get_layer_image(template_id: str, layer_id: str):
+    """Get the reference image of one layer of a template."""
+    image_path = template_service.get_layer_image_path(template_id, layer_id)
+    if not image_path:
+        raise HTTPException(status_code=404, detail=f"No image found for layer '{layer_id}'")
+
+    return FileResponse(image_path, media_type="image/png")
+
+
+@router.get("/templates/{template_id}/references", response_model=list[ReferenceImage])
+async def list_template_references(template_id: str):
+    """List a template's additional reference images."""
+    template = template_service.get_template(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail=f"Template '{template_id}' not found")
+    return template.reference_images
+
+
+@router.post("/templates/{template_id}/references", response_model=ReferenceImage, status_code=201)
+async def add_template_reference(
+    template_id: str,
+    file: UploadFile = File(..., description="Additional reference image (e.g. different lighting)"),
+    label: Optional[str] = Form(None),
+):
+    """Add another reference image to a template.
+
+    At check-in the reference whose overall appearance is closest to the
+    uploaded photo is used for per-slot comparison.
+    """
+    if not template_service.get_template(template_id):
+        raise HTTPException(status_code=404, detail=f"Template '{template_id}' not found")
+
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    try:
+        contents = await file.read()
+        return await cv_executor.run(template_service.add_reference_image, template_id, contents, label)
+    except ExecutorSaturated as e:
+        raise _executor_busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/templates/{template_id}/references/{reference_id}/image")
+async def get_template_reference_image(template_id: str, reference_id: str):
+    """Get one of a template's reference images ('default' is the primary image)."""
+    image_path = template_service.get_reference_image_path(template_id, reference_id)
+    if not image_path:
+        raise HTTPException(status_code=404, detail=f"Reference '{reference_id}' not found")
+
+    return FileResponse(image_path, media_type="image/png")
+
+
+@router.delete("/templates/{template_id}/references/{reference_id}")
+async def delete_template_reference(template_id: str, reference_id: str):
+    """Remove an additional reference image from a template."""
+    deleted = template_service.delete_reference_image(template_id, reference_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Reference '{reference_id}' not found")
+    return {"message": f"Reference '{reference_id}' deleted"}
+
+
 @router.get("/templates/{template_id}/aruco-markers")
 async def detect_template_aruco_markers(template_id: str):
     """Detect ArUco markers in a template's reference image."""
-    from ..cv.registration import ToolkitRegistration
-    from ..core.config import settings
-
     image_path = template_service.get_image_path(template_id)
     if not image_path:
         raise HTTPException(status_code=404, detail=f"No image found for template '{template_id}'")
 
-    try:
+    def detect() -> dict:
+        from ..cv.registration import get_registration
+        from ..utils.image_utils import load_image
+
         image = load_image(str(image_path))
-        registration = ToolkitRegistration(
+        registration = get_registration(
             dictionary=settings.aruco_dictionary,
             marker_ids=settings.aruco_marker_ids,
             canonical_size=(settings.aruco_canonical_width, settings.aruco_canonical_height),
@@ -160,6 +372,11 @@ async def detect_template_aruco_markers(template_id: str):
                 "height": settings.aruco_canonical_height
             }
         }
+
+    try:
+        return await cv_executor.run(detect)
+    except ExecutorSaturated as e:
+        raise _executor_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to detect markers: {e}")
 
@@ -206,12 +423,14 @@ async def create_toolkit(request: CreateToolkitRequest):
 
 @router.put("/toolkits/{toolkit_id}", response_model=Toolkit)
 async def update_toolkit(toolkit_id: str, toolkit: Toolkit):
-    """Update a toolkit instance."""
+    """Update a toolkit instance (409 if it changed since the client read it)."""
     if toolkit_id != toolkit.toolkit_id:
         raise HTTPException(status_code=400, detail="toolkit_id in URL must match toolkit_id in body")
     try:
         updated = toolkit_instance_service.update_toolkit(toolkit)
         return updated
+    except ToolkitConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -227,14 +446,266 @@ async def delete_toolkit(toolkit_id: str):
 
 # ==================== CHECK-IN / CHECK-OUT ====================
 
-@router.post("/toolkits/{toolkit_id}/checkin", response_model=CheckInResponse)
+# How often a waiting check-in polls for a client disconnect
+DISCONNECT_POLL_SECONDS = 0.1
+# Read size when copying a spooled multipart upload into its buffer
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Raw request bodies accepted as check-in images
+RAW_IMAGE_CONTENT_TYPES = ("application/octet-stream", "image/")
+# When the annotated image is rendered: on first request, or during the check-in
+RenderMode = Literal["lazy", "eager"]
+
+
+def _upload_too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {limit // 2**20} MB limit")
+
+
+async def _read_upload(file: UploadFile, limit: Optional[int] = None) -> tuple[bytearray, str]:
+    """Copy a multipart upload into one buffer, hashing it on the way.
+
+    Starlette has already spooled the part; it is read back in chunks into a
+    buffer that is decoded in place, instead of through an intermediate
+    ``bytes`` object, and hashed without another pass.
+
+    Args:
+        limit: Largest upload accepted in bytes (defaults to ``upload_max_mb``)
+
+    Returns:
+        Tuple of (image data, SHA-256 hex digest)
+
+    Raises:
+        HTTPException: 413 if the upload is over the limit
+    """
+    if limit is None:
+        limit = settings.upload_max_mb * 1024 * 1024
+    if file.size is not None and file.size > limit:
+        raise _upload_too_large(limit)
+
+    buffer = bytearray()
+    digest = hashlib.sha256()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        if len(buffer) + len(chunk) > limit:
+            raise _upload_too_large(limit)
+        buffer += chunk
+        digest.update(chunk)
+    return buffer, digest.hexdigest()
+
+
+async def _receive_body(request: Request, limit: Optional[int] = None) -> tuple[bytearray, str]:
+    """Stream a raw request body into one buffer, hashing it on the way.
+
+    The buffer grows as data arrives (a bytearray over-allocates, so this
+    is amortized), so a declared Content-Length reserves nothing before the
+    bytes are actually received. The upload is cut off with 413 as soon as
+    it passes the limit, before the rest is received.
+
+    Args:
+        limit: Largest body accepted in bytes (defaults to ``upload_max_mb``)
+
+    Returns:
+        Tuple of (image data, SHA-256 hex digest)
+
+    Raises:
+        HTTPException: 413 if the body is too large, 400 if it is empty or
+            doesn't match its Content-Length
+    """
+    if limit is None:
+        limit = settings.upload_max_mb * 1024 * 1024
+    declared = request.headers.get("content-length")
+    expected = int(declared) if declared and declared.isdigit() else None
+    if expected is not None and expected > limit:
+        raise _upload_too_large(limit)
+
+    buffer = bytearray()
+    digest = hashlib.sha256()
+    received = 0
+    async for chunk in request.stream():
+        end = received + len(chunk)
+        if end > limit:
+            raise _upload_too_large(limit)
+        if expected is not None and end > expected:
+            raise HTTPException(status_code=400, detail="Request body is longer than its Content-Length")
+        buffer += chunk
+        digest.update(chunk)
+        received = end
+
+    if received == 0:
+        raise HTTPException(status_code=400, detail="Request body is empty")
+    if expected is not None and received != expected:
+        raise HTTPException(status_code=400, detail="Request body is shorter than its Content-Length")
+    return buffer, digest.hexdigest()
+
+
+def _process_checkin(
+    toolkit_id: str,
+    contents: Union["ImageData", dict[str, "ImageData"]],
+    notes: Optional[str],
+    checked_in_by: Optional[str],
+    deadline: Optional[Deadline] = None,
+    content_hash: Optional[str] = None,
+    lazy_annotation: Optional[bool] = None,
+) -> CheckInResponse:
+    """Decode an upload and run the check-in (blocking; runs on the CV executor).
+
+    Args:
+        contents: Uploaded image, or one image per layer (layer_id → bytes)
+            for a multi-layer toolkit
+        content_hash: SHA-256 of a single image if already computed while
+            receiving it
+        lazy_annotation: Render the annotated image on first request (None =
+            ``annotation_rendering``)
+
+    Raises:
+        ImageTooLarge: If the upload can't fit the per-request memory limit
+        MemoryBudgetExceeded: If in-flight check-ins leave no room for this one
+    """
+    from ..core.models import Degradation, MemoryReport
+    from ..utils.image_utils import load_image
+
+    deadline = deadline or Deadline()
+    deadline.check()
+
+    layered = isinstance(contents, dict)
+    if layered:
+        digest = hashlib.sha256()
+        for layer_id in sorted(contents):
+            digest.update(f"{layer_id}:{hashlib.sha256(contents[layer_id]).hexdigest()}\n".encode("utf-8"))
+        content_hash = digest.hexdigest()
+    elif content_hash is None:
+        content_hash = hashlib.sha256(contents).hexdigest()
+
+    # Duplicate submission of the same photo: replay without decoding
+    cached = toolkit_instance_service.get_cached_checkin(toolkit_id, content_hash)
+    if cached:
+        return cached
+
+    # Size the check-in from the image headers before decoding anything
+    if layered:
+        plans = {
+            layer_id: memory_budget.plan(
+                data,
+                toolkit_instance_service.get_canonical_size(toolkit_id, layer_id),
+                toolkit_instance_service.get_decode_target(toolkit_id, layer_id),
+            )
+            for layer_id, data in contents.items()
+        }
+        plan = memory_budget.combine(list(plans.values()))
+    else:
+        plan = memory_budget.plan(
+            contents,
+            toolkit_instance_service.get_canonical_size(toolkit_id),
+            toolkit_instance_service.get_decode_target(toolkit_id),
+        )
+    # Decoding at reduced resolution down to the template's own resolution is
+    # free; only going below it to fit the memory budget costs accuracy
+    if plan.downscaled:
+        deadline.degrade(Degradation.DOWNSCALED)
+
+    with memory_budget.reserve(plan.estimated_bytes):
+        meter = MemoryMeter()
+        deadline.checkpoints.append(meter.sample)
+
+        if layered:
+            image = {
+                layer_id: load_image(data, reduce_factor=plans[layer_id].reduce_factor)
+                for layer_id, data in contents.items()
+            }
+        else:
+            image = load_image(contents, reduce_factor=plan.reduce_factor)
+        meter.sample()
+        response = toolkit_instance_service.check_in(
+            toolkit_id=toolkit_id,
+            image=image,
+            notes=notes,
+            checked_in_by=checked_in_by,
+            content_hash=content_hash,
+            deadline=deadline,
+            lazy_annotation=lazy_annotation,
+        )
+        meter.sample()
+
+    memory_budget.record(plan, meter)
+    # Copy: the response object may also sit in the replay cache
+    return response.model_copy(update={"memory": MemoryReport(
+        image_width=plan.width,
+        image_height=plan.height,
+        decode_scale=plan.reduce_factor,
+        estimated_bytes=plan.estimated_bytes,
+        peak_rss_delta_bytes=meter.peak_delta,
+    )})
+
+
+async def _cancel_on_disconnect(request: Request, deadline: Deadline) -> None:
+    """Cancel the deadline as soon as the client goes away."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    deadline.cancel()
+
+
+async def _run_sync_checkin(
+    request: Request,
+    toolkit_id: str,
+    contents: Union["ImageData", dict[str, "ImageData"]],
+    notes: Optional[str],
+    checked_in_by: Optional[str],
+    timeout_ms: Optional[int],
+    content_hash: Optional[str] = None,
+    render: Optional[RenderMode] = None,
+) -> CheckInResponse:
+    """Run a synchronous check-in against its latency budget and map failures to HTTP errors."""
+    if timeout_ms is not None:
+        deadline = Deadline(timeout_ms / 1000)
+    else:
+        deadline = Deadline(settings.checkin_deadline_seconds or None)
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, deadline))
+
+    try:
+        lazy_annotation = render == "lazy" if render is not None else None
+        return await cv_executor.run(
+            _process_checkin, toolkit_id, contents, notes, checked_in_by, deadline, content_hash, lazy_annotation
+        )
+
+    except ExecutorSaturated as e:
+        raise _executor_busy(e)
+    except CheckInAborted as e:
+        raise HTTPException(status_code=499 if e.disconnected else 504, detail=str(e))
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Check-in failed: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Check-in failed: {e}")
+    finally:
+        watcher.cancel()
+
+
+@router.post("/toolkits/{toolkit_id}/checkin", response_model=Union[CheckInResponse, CheckInJob])
 async def checkin_toolkit(
     toolkit_id: str,
+    request: Request,
+    response: Response,
     file: UploadFile = File(..., description="Image file of the toolkit"),
     notes: Optional[str] = Form(None),
     checked_in_by: Optional[str] = Form(None),
+    mode: Literal["sync", "async"] = "sync",
+    render: Optional[RenderMode] = None,
+    x_request_timeout_ms: Optional[int] = Header(None, gt=0),
 ):
-    """Check in a toolkit by analyzing an uploaded image."""
+    """Check in a toolkit by analyzing an uploaded image.
+
+    With ``?mode=async`` the upload is queued for a worker and a job is
+    returned immediately (202); poll ``GET /api/jobs/{job_id}`` for the result.
+
+    The annotated image is rendered when its URL is first requested, unless
+    ``?render=eager`` (or ``annotation_rendering``) asks for it to be
+    rendered during the check-in.
+
+    Synchronous check-ins run against a latency budget taken from the
+    ``X-Request-Timeout-Ms`` header (or ``checkin_deadline_seconds``). When
+    it runs low, cheaper modes are used and listed in ``degradations``. The
+    check-in is abandoned with 504 once the budget is spent, or with 499 if
+    the client disconnects.
+    """
     # Validate toolkit exists
     toolkit = toolkit_instance_service.get_toolkit(toolkit_id)
     if not toolkit:
@@ -244,23 +715,293 @@ async def checkin_toolkit(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
 
-    try:
-        contents = await file.read()
-        image = load_image(contents)
+    contents, content_hash = await _read_upload(file)
 
-        result = toolkit_instance_service.check_in(
-            toolkit_id=toolkit_id,
-            image=image,
-            notes=notes,
-            checked_in_by=checked_in_by,
-        )
+    if mode == "async":
+        return await _enqueue_checkin(response, toolkit_id, contents, notes, checked_in_by)
+    return await _run_sync_checkin(
+        request, toolkit_id, contents, notes, checked_in_by, x_request_timeout_ms, content_hash, render
+    )
 
-        return result
 
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Check-in failed: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Check-in failed: {e}")
+async def _enqueue_checkin(
+    response: Response,
+    toolkit_id: str,
+    contents: "ImageData",
+    notes: Optional[str],
+    checked_in_by: Optional[str],
+) -> CheckInJob:
+    """Queue an upload for a worker and answer 202 with the job."""
+    # Queue writes are short blocking I/O; keep them off the bounded CV executor
+    job = await run_in_threadpool(job_queue.enqueue, toolkit_id, contents, notes, checked_in_by)
+    response.status_code = 202
+    response.headers["Location"] = f"/api/jobs/{job.job_id}"
+    return job
+
+
+@router.post("/toolkits/{toolkit_id}/checkin/raw", response_model=Union[CheckInResponse, CheckInJob])
+async def checkin_toolkit_raw(
+    toolkit_id: str,
+    request: Request,
+    response: Response,
+    notes: Optional[str] = None,
+    checked_in_by: Optional[str] = None,
+    mode: Literal["sync", "async"] = "sync",
+    render: Optional[RenderMode] = None,
+    x_request_timeout_ms: Optional[int] = Header(None, gt=0),
+):
+    """Check in a toolkit with the image as the raw request body.
+
+    Send the image bytes as ``application/octet-stream`` (or its ``image/*``
+    type) with notes and checked_in_by as query parameters. The body is
+    streamed into a single buffer and hashed as it arrives, skipping
+    multipart parsing and its spool file, and is decoded in place. Uploads
+    over ``upload_max_mb`` are cut off with 413 without reading the rest.
+    Otherwise this behaves like ``POST /toolkits/{toolkit_id}/checkin``.
+    """
+    toolkit = toolkit_instance_service.get_toolkit(toolkit_id)
+    if not toolkit:
+        raise HTTPException(status_code=404, detail=f"Toolkit '{toolkit_id}' not found")
+
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith(RAW_IMAGE_CONTENT_TYPES):
+        raise HTTPException(status_code=415, detail="Send the image as application/octet-stream or image/*")
+
+    contents, content_hash = await _receive_body(request)
+
+    if mode == "async":
+        return await _enqueue_checkin(response, toolkit_id, contents, notes, checked_in_by)
+    return await _run_sync_checkin(
+        request, toolkit_id, contents, notes, checked_in_by, x_request_timeout_ms, content_hash, render
+    )
+
+
+@router.post("/toolkits/{toolkit_id}/checkin/layers", response_model=CheckInResponse)
+async def checkin_toolkit_layers(
+    toolkit_id: str,
+    request: Request,
+    files: list[UploadFile] = File(..., description="One image per layer of the toolkit"),
+    layer_ids: list[str] = Form(..., description="Layer ID for each file, in the same order"),
+    notes: Optional[str] = Form(None),
+    checked_in_by: Optional[str] = Form(None),
+    render: Optional[RenderMode] = None,
+    x_request_timeout_ms: Optional[int] = Header(None, gt=0),
+):
+    """Check in a multi-layer toolkit (e.g. a drawer chest) with one image per layer.
+
+    The layers are registered and analyzed in parallel and recorded as a
+    single check-in, so the toolkit is updated all at once or not at all.
+    Per-layer registration and annotated images are returned in ``layers``.
+    Latency budgets and error codes are as for a single-image check-in.
+    """
+    toolkit = toolkit_instance_service.get_toolkit(toolkit_id)
+    if not toolkit:
+        raise HTTPException(status_code=404, detail=f"Toolkit '{toolkit_id}' not found")
+
+    if len(layer_ids) != len(files):
+        raise HTTPException(status_code=400, detail="Provide one layer_id per file")
+    if len(set(layer_ids)) != len(layer_ids):
+        raise HTTPException(status_code=400, detail="Each layer may only have one image")
+    if any(not file.content_type or not file.content_type.startswith("image/") for file in files):
+        raise HTTPException(status_code=400, detail="Files must be images")
+
+    contents = {layer_id: (await _read_upload(file))[0] for layer_id, file in zip(layer_ids, files)}
+    return await _run_sync_checkin(
+        request, toolkit_id, contents, notes, checked_in_by, x_request_timeout_ms, render=render
+    )
+
+
+BATCH_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+class BatchCheckInItem(BaseModel):
+    index: int  # Position in the upload (file order, or sorted archive order)
+    toolkit_id: str
+    filename: Optional[str] = None
+    status_code: int  # HTTP status the equivalent single check-in would have returned
+    result: Optional[CheckInResponse] = None
+    error: Optional[str] = None
+
+
+async def _spool_upload(file: UploadFile, limit: int) -> IO[bytes]:
+    """Copy a multipart upload into a temporary file the caller closes.
+
+    Batch images are read when their check-in runs, after the endpoint has
+    returned its streaming response, and Starlette may have closed its own
+    spool file by then. The copy stays on disk (under ``upload_dir``), not
+    in memory.
+
+    Raises:
+        HTTPException: 413 if the upload is over the limit
+    """
+    if file.size is not None and file.size > limit:
+        raise _upload_too_large(limit)
+
+    spool = tempfile.TemporaryFile(dir=settings.upload_dir)
+    try:
+        written = 0
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            written += len(chunk)
+            if written > limit:
+                raise _upload_too_large(limit)
+            await run_in_threadpool(spool.write, chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _spooled_item(spool: IO[bytes]) -> Callable[[], bytes]:
+    """Loader of a batch image spooled by ``_spool_upload``."""
+    def load() -> bytes:
+        spool.seek(0)
+        return spool.read()
+    return load
+
+
+def _too_many_items(count: int) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"Batch has {count} images, the limit is {settings.batch_max_items}")
+
+
+def _too_large_item(limit: int) -> Callable[[], bytes]:
+    """Loader of a batch image over ``upload_max_mb``; it fails as a 413 item."""
+    def load() -> bytes:
+        raise ImageTooLarge(f"Image exceeds the {limit // 2**20} MB upload limit")
+    return load
+
+
+def _archive_items(data: IO[bytes]) -> list[tuple[str, str, Callable[[], bytes]]]:
+    """List the images in a zip archive as (toolkit_id, filename, loader) tuples.
+
+    Each image must be named ``<toolkit_id>.<ext>``; directories inside the
+    archive are ignored. Images are only decompressed when their check-in
+    runs, so their sizes are checked up front from the archive directory
+    (zipfile never inflates an entry past its declared size).
+
+    Raises:
+        HTTPException: 400 if the archive is not a zip file, 413 if its images
+            add up to more than ``batch_archive_max_mb``
+    """
+    try:
+        archive = zipfile.ZipFile(data)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Archive is not a valid zip file")
+
+    item_limit = settings.upload_max_mb * 1024 * 1024
+    total_limit = settings.batch_archive_max_mb * 1024 * 1024
+    items = []
+    total = 0
+    for info in sorted(archive.infolist(), key=lambda i: i.filename):
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.name.startswith(".") or "__MACOSX" in path.parts:
+            continue
+        if path.suffix.lower() not in BATCH_IMAGE_EXTENSIONS:
+            continue
+        if info.file_size > item_limit:
+            items.append((path.stem, info.filename, _too_large_item(item_limit)))
+            continue
+        total += info.file_size
+        if total > total_limit:
+            raise HTTPException(
+                status_code=413, detail=f"Archive images exceed the {settings.batch_archive_max_mb} MB limit"
+            )
+        items.append((path.stem, info.filename, lambda name=info.filename: archive.read(name)))
+    return items
+
+
+@router.post("/checkins/batch")
+async def batch_checkin(
+    files: Optional[list[UploadFile]] = File(None, description="Toolkit images"),
+    toolkit_ids: Optional[list[str]] = Form(None, description="Toolkit ID for each file, in the same order"),
+    archive: Optional[UploadFile] = File(None, description="Zip of images named <toolkit_id>.<ext>"),
+    notes: Optional[str] = Form(None),
+    checked_in_by: Optional[str] = Form(None),
+):
+    """Check in many toolkits in one request.
+
+    Send either ``files`` with a matching ``toolkit_ids`` list, or a zip
+    ``archive``. Images are analyzed concurrently on the CV executor and
+    each outcome is streamed back as one NDJSON line (BatchCheckInItem) as
+    soon as it is ready, so lines arrive in completion order.
+
+    Uploads are copied to temporary files and each image is only read into
+    memory when its check-in runs.
+    """
+    files = files or []
+    if files and (not toolkit_ids or len(toolkit_ids) != len(files)):
+        raise HTTPException(status_code=400, detail="Provide one toolkit_id per file")
+    if len(files) > settings.batch_max_items:
+        raise _too_many_items(len(files))
+
+    items: list[tuple[str, Optional[str], Callable[[], bytes]]] = []
+    spools: list[IO[bytes]] = []
+    try:
+        if archive is not None:
+            spools.append(await _spool_upload(archive, settings.batch_archive_max_mb * 1024 * 1024))
+            items.extend(_archive_items(spools[-1]))
+            if len(items) + len(files) > settings.batch_max_items:
+                raise _too_many_items(len(items) + len(files))
+
+        item_limit = settings.upload_max_mb * 1024 * 1024
+        for toolkit_id, file in zip(toolkit_ids or [], files):
+            if file.size is not None and file.size > item_limit:
+                items.append((toolkit_id, file.filename, _too_large_item(item_limit)))
+                continue
+            spools.append(await _spool_upload(file, item_limit))
+            items.append((toolkit_id, file.filename, _spooled_item(spools[-1])))
+
+        if not items:
+            raise HTTPException(status_code=400, detail="No images to check in")
+    except BaseException:
+        for spool in spools:
+            spool.close()
+        raise
+
+    # Use at most every CV worker without filling the batch wait queue, and
+    # never check in the same toolkit twice at once. Batch priority keeps
+    # interactive check-ins ahead of the bulk run.
+    slots = asyncio.Semaphore(cv_executor.max_workers)
+    toolkit_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    def run_checkin(toolkit_id: str, load: Callable[[], bytes]) -> CheckInResponse:
+        return _process_checkin(toolkit_id, load(), notes, checked_in_by)
+
+    async def run_item(index: int, toolkit_id: str, filename: Optional[str], load) -> BatchCheckInItem:
+        item = BatchCheckInItem(index=index, toolkit_id=toolkit_id, filename=filename, status_code=200)
+        async with toolkit_locks[toolkit_id], slots:
+            while True:
+                try:
+                    item.result = await cv_executor.run(run_checkin, toolkit_id, load, priority=Priority.BATCH)
+                    break
+                except ExecutorSaturated as e:
+                    # Other traffic filled the queue or memory budget: wait our turn instead of failing the item
+                    await asyncio.sleep(e.retry_after)
+                except ImageTooLarge as e:
+                    item.status_code, item.error = 413, str(e)
+                    break
+                except ValueError as e:
+                    item.status_code, item.error = 400, f"Check-in failed: {e}"
+                    break
+                except Exception as e:
+                    item.status_code, item.error = 500, f"Check-in failed: {e}"
+                    break
+        return item
+
+    async def stream():
+        tasks = [asyncio.create_task(run_item(i, *item)) for i, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                yield item.model_dump_json() + "\n"
+        finally:
+            # Client went away: drop images that haven't started yet
+            for task in tasks:
+                task.cancel()
+            for spool in spools:
+                spool.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @router.post("/toolkits/{toolkit_id}/checkout", response_model=Toolkit)
@@ -287,6 +1028,235 @@ async def get_checkin_history(toolkit_id: str, limit: int = 10):
     return history
 
 
+# ==================== JOBS ====================
+
+@router.get("/jobs/{job_id}", response_model=CheckInJob)
+async def get_job(job_id: str):
+    """Get the status (and result, once finished) of an asynchronous check-in."""
+    job = await run_in_threadpool(job_queue.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+# ==================== RESUMABLE UPLOADS ====================
+
+class CreateUploadRequest(BaseModel):
+    size: int = Field(..., gt=0, description="Total image size in bytes")
+    sha256: Optional[str] = Field(
+        None, pattern="^[0-9a-fA-F]{64}$", description="SHA-256 of the whole image, verified on finalize"
+    )
+    notes: Optional[str] = None
+    checked_in_by: Optional[str] = None
+
+
+def _get_upload_or_404(upload_id: str) -> UploadSession:
+    session = upload_sessions.get_session(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+    return session
+
+
+@router.post("/toolkits/{toolkit_id}/uploads", response_model=UploadSession, status_code=201)
+async def create_upload(toolkit_id: str, request: CreateUploadRequest, response: Response):
+    """Start a resumable check-in upload.
+
+    Send the image in chunks with ``PUT /api/uploads/{upload_id}?offset=N``,
+    then run the check-in with ``POST /api/uploads/{upload_id}/finalize``.
+    After a dropped connection, ``GET /api/uploads/{upload_id}`` lists the
+    byte ranges still ``missing``; only those need to be sent again.
+    """
+    toolkit = toolkit_instance_service.get_toolkit(toolkit_id)
+    if not toolkit:
+        raise HTTPException(status_code=404, detail=f"Toolkit '{toolkit_id}' not found")
+
+    limit = settings.upload_max_mb * 1024 * 1024
+    if request.size > limit:
+        raise _upload_too_large(limit)
+
+    session = await run_in_threadpool(
+        upload_sessions.create_session,
+        toolkit_id,
+        request.size,
+        request.sha256,
+        request.notes,
+        request.checked_in_by,
+    )
+    response.headers["Location"] = f"/api/uploads/{session.upload_id}"
+    return session
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSession)
+async def get_upload(upload_id: str):
+    """Get an upload's progress, including the byte ranges still missing."""
+    return _get_upload_or_404(upload_id)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSession)
+async def upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Store a chunk of the image (the raw request body) at byte ``offset``.
+
+    Chunks may arrive in any order and be repeated. Each one may be up to
+    ``upload_chunk_max_mb``.
+    """
+    _get_upload_or_404(upload_id)
+    chunk, _ = await _receive_body(request, settings.upload_chunk_max_mb * 1024 * 1024)
+
+    try:
+        return await run_in_threadpool(upload_sessions.write_chunk, upload_id, offset, chunk)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+    except UploadConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _replay_finalized_upload(response: Response, session: UploadSession) -> Union[CheckInResponse, CheckInJob]:
+    """Answer a repeated finalize with the job or check-in the upload produced."""
+    if session.job_id:
+        job = await run_in_threadpool(job_queue.get_job, session.job_id)
+        if job:
+            response.status_code = 202
+            response.headers["Location"] = f"/api/jobs/{job.job_id}"
+            return job
+    if session.content_hash:
+        cached = toolkit_instance_service.get_cached_checkin(session.toolkit_id, session.content_hash)
+        if cached:
+            return cached
+    raise HTTPException(status_code=409, detail=f"Upload was already checked in as '{session.checkin_id}'")
+
+
+@router.post("/uploads/{upload_id}/finalize", response_model=Union[CheckInResponse, CheckInJob])
+async def finalize_upload(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    mode: Literal["sync", "async"] = "sync",
+    render: Optional[RenderMode] = None,
+    x_request_timeout_ms: Optional[int] = Header(None, gt=0),
+):
+    """Check in the toolkit with a completely uploaded image.
+
+    Answers 409 with the ``missing`` byte ranges if chunks are outstanding.
+    Otherwise this behaves like ``POST /toolkits/{toolkit_id}/checkin``. If
+    the check-in fails the upload is kept, so finalize can be retried
+    without sending the image again. Finalizing an upload a second time
+    returns the same job or check-in result.
+    """
+    try:
+        session, contents = await run_in_threadpool(upload_sessions.begin_finalize, upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+    except UploadIncomplete as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "missing": e.missing})
+    except UploadConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if contents is None:
+        return await _replay_finalized_upload(response, session)
+
+    try:
+        if mode == "async":
+            result = await _enqueue_checkin(
+                response, session.toolkit_id, contents, session.notes, session.checked_in_by
+            )
+            produced = {"job_id": result.job_id}
+        else:
+            result = await _run_sync_checkin(
+                request,
+                session.toolkit_id,
+                contents,
+                session.notes,
+                session.checked_in_by,
+                x_request_timeout_ms,
+                session.content_hash,
+                render,
+            )
+            produced = {"checkin_id": result.checkin_id}
+    except BaseException:
+        await run_in_threadpool(upload_sessions.release_finalize, upload_id)
+        raise
+
+    await run_in_threadpool(upload_sessions.finish_finalize, upload_id, **produced)
+    return result
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Abandon an upload and delete its data."""
+    if not await run_in_threadpool(upload_sessions.delete_session, upload_id):
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+    return {"message": f"Upload '{upload_id}' deleted"}
+
+
+# ==================== ARTIFACTS ====================
+
+# Artifacts are named by their content hash, so their bytes never change
+ARTIFACT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/artifacts/{name}")
+async def get_artifact(name: str, request: Request):
+    """Serve an annotated image or thumbnail referenced by a check-in.
+
+    The name is the SHA-256 of the content, which doubles as the ETag; the
+    response may be cached forever and revalidates with 304.
+    """
+    path = artifact_store.get_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail=f"Artifact '{name}' not found")
+
+    etag = f'"{path.stem}"'
+    headers = {"ETag": etag, "Cache-Control": ARTIFACT_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=ARTIFACT_MEDIA_TYPES[path.suffix], headers=headers)
+
+
+# ==================== RENDERS ====================
+
+async def _serve_render(request: Request, render_id: str, thumbnail: bool) -> Response:
+    """Serve a lazily rendered image, rendering it on the CV executor the first time."""
+    etag = f'"{render_id}-thumbnail"' if thumbnail else f'"{render_id}"'
+    headers = {"ETag": etag, "Cache-Control": ARTIFACT_CACHE_CONTROL}
+    if etag in [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    path = annotation_renderer.find_rendered(render_id, thumbnail)
+    # Batch priority keeps renders behind live check-ins; a full queue means waiting
+    # rather than a 503, which a browser would show as a broken image
+    while path is None:
+        try:
+            path = await cv_executor.run(annotation_renderer.render, render_id, thumbnail, priority=Priority.BATCH)
+            break
+        except ExecutorSaturated as e:
+            if await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected")
+            await asyncio.sleep(e.retry_after)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Render '{render_id}' not found")
+    return FileResponse(path, media_type=ARTIFACT_MEDIA_TYPES[path.suffix], headers=headers)
+
+
+@router.get("/renders/{render_id}")
+async def get_render(render_id: str, request: Request):
+    """Serve the annotated image of a check-in, rendering it on first request.
+
+    A render's content never changes, so it is cached like an artifact.
+    """
+    return await _serve_render(request, render_id, thumbnail=False)
+
+
+@router.get("/renders/{render_id}/thumbnail")
+async def get_render_thumbnail(render_id: str, request: Request):
+    """Serve the history thumbnail of a check-in, rendering it on first request."""
+    return await _serve_render(request, render_id, thumbnail=True)
+
+
 # ==================== DASHBOARD STATS ====================
 
 class DashboardStats(BaseModel):
@@ -334,7 +1304,7 @@ async def legacy_list_toolkits():
             "name": t.name,
             "description": t.description,
             "foam_color": t.foam_color,
-            "tools": [tool.model_dump() for tool in t.tools],
+            "tools": [tool.model_dump() for tool in t.all_tools],
         }
         for t in templates
     ]
@@ -356,10 +1326,11 @@ async def legacy_analyze(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
 
-    try:
-        from ..cv.processor import ToolkitProcessor
+    contents = await file.read()
+
+    def process() -> AnalysisResult:
+        from ..utils.image_utils import load_image
 
-        contents = await file.read()
         image = load_image(contents)
 
         toolkit_config = ToolkitConfig(
@@ -372,15 +1343,19 @@ async def legacy_analyze(
             occupied_ratio_threshold=template.occupied_ratio_threshold,
         )
 
-        processor = ToolkitProcessor()
-        result = processor.analyze(
+        # Shared stateless processor; registration objects are pooled per thread
+        return toolkit_instance_service.processor.analyze(
             image=image,
             toolkit_config=toolkit_config,
             include_annotated_image=True,
             include_debug_info=include_debug,
+            annotate_in_place=True,  # Decoded for this request only
         )
 
-        return result
+    try:
+        return await cv_executor.run(process)
 
+    except ExecutorSaturated as e:
+        raise _executor_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
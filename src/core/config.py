@@ -1,4 +1,6 @@
 from pathlib import Path
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -34,6 +36,71 @@ class Settings(BaseSettings):
     aruco_min_markers: int = 3  # Minimum markers for homography
     aruco_debug: bool = False
 
+    # Idempotent check-in cache (replays results for duplicate uploads)
+    checkin_cache_enabled: bool = True
+    checkin_cache_ttl_seconds: float = 300.0
+    checkin_cache_max_entries: int = 64
+    checkin_cache_phash_enabled: bool = False  # Also match near-identical re-encodes
+    checkin_cache_phash_max_distance: int = 4  # Max Hamming distance of 64-bit dHash
+    checkin_cache_phash_window_seconds: float = 10.0  # Near-duplicates are only replayed this soon after
+
+    # Incremental check-in (carry forward slots unchanged since the previous check-in)
+    incremental_checkin_enabled: bool = False
+    incremental_signature_size: int = 16  # Per-slot signature is NxN grayscale
+    incremental_change_threshold: float = 0.04  # Mean abs diff (0-1) above which a slot is re-analyzed
+
+    # Startup warm-up (preload templates and run a synthetic frame before reporting ready)
+    warmup_enabled: bool = False
+
+    # CV executor (CPU-bound work runs off the event loop on a bounded pool)
+    cv_executor_workers: int = 0  # Concurrent CV jobs (0 = CPU count; capped at 4 for the thread backend)
+    cv_executor_max_queue: int = 16  # Jobs per priority class allowed to wait; further requests get 503
+    cv_executor_retry_after_seconds: int = 2  # Retry-After hint when saturated
+    cv_interactive_reserved_workers: int = 1  # CV workers kept free of batch and background jobs
+    cv_weight_interactive: float = 8.0  # Weighted fair queuing shares of the priority classes
+    cv_weight_batch: float = 2.0
+    cv_weight_background: float = 1.0
+    cv_backend: Literal["thread", "process"] = "thread"  # "thread" (in-process) or "process" (worker farm with shared-memory frames)
+    cv_process_workers: int = 0  # Worker processes for the process backend (0 = CPU count)
+    cv_opencv_threads: int = 0  # OpenCV threads per CV process (0 = effective CPUs / concurrent jobs)
+    cv_blas_threads: int = 0  # BLAS threads per CV process (0 = effective CPUs / concurrent jobs)
+
+    # Memory admission (estimated peak memory of in-flight check-ins, from image headers)
+    memory_budget_mb: int = 0  # 0 = half the cgroup memory limit (or physical RAM)
+    memory_max_request_fraction: float = 0.5  # Larger single check-ins are downscaled or rejected
+    oversize_policy: Literal["downscale", "reject"] = "downscale"  # "downscale" (reduced-resolution decode) or "reject" (413)
+    upload_max_mb: int = 64  # Largest check-in image accepted; bigger uploads are cut off with 413
+    upload_chunk_max_mb: int = 8  # Largest chunk accepted by a resumable upload
+    upload_session_ttl_seconds: float = 86400.0  # Resumable uploads untouched for this long are deleted
+    # Decode uploads at 1/2, 1/4 or 1/8 scale when that still covers the template's reference resolution
+    reduced_decode_enabled: bool = True
+
+    # Annotated image returned with a check-in, and the history thumbnail made from it
+    annotated_image_format: Literal["jpeg", "webp", "png"] = "jpeg"  # "jpeg", "webp" or "png" (lossless; slower and several times larger)
+    annotated_image_quality: int = 90  # JPEG/WebP quality (1-100), also used for the thumbnail
+    thumbnail_width: int = 150  # History thumbnail width (smaller when the latency budget runs low)
+    artifact_store_enabled: bool = True  # Return both as /api/artifacts URLs instead of inline base64
+    artifact_retention_hours: float = 168.0  # Stored images no check-in record refers to are deleted after this (0 = kept)
+    artifact_gc_interval_seconds: float = 3600.0  # How often the server looks for such images
+    annotation_rendering: Literal["lazy", "eager"] = "lazy"  # "lazy" (rendered when first requested) or "eager" (during the check-in)
+
+    # Check-in latency budget (the X-Request-Timeout-Ms header overrides the default)
+    checkin_deadline_seconds: float = 0.0  # 0 = no budget
+    deadline_reference_seconds: float = 1.0  # Budget left needed for reference comparison, else brightness-only
+    deadline_annotation_seconds: float = 0.5  # Budget left needed to render and encode the annotated image
+    deadline_thumbnail_seconds: float = 0.1  # Below this the history thumbnail is rendered smaller
+
+    # Batch check-in
+    batch_max_items: int = 200  # Images accepted by one /api/checkins/batch request
+    batch_archive_max_mb: int = 256  # Largest batch archive, and largest total size of the images in it
+
+    # Asynchronous check-in jobs (SQLite queue consumed by `python -m src.worker`)
+    job_lease_seconds: float = 120.0  # A claimed job is handed to another worker after this long
+    job_max_attempts: int = 3  # Claims per job before it is marked failed
+    job_poll_interval_seconds: float = 1.0  # Worker sleep when the queue is empty
+    job_journal_mode: Literal["delete", "wal"] = "delete"  # SQLite journal: "delete" (works on shared data dirs) or "wal" (one host only)
+    job_retention_hours: float = 168.0  # Succeeded and failed jobs are deleted this long after finishing (0 = kept)
+
     # API settings
     api_title: str = "Toolkit Processor API"
     api_version: str = "1.0.0"
@@ -42,10 +109,11 @@ class Settings(BaseSettings):
     class Config:
         env_prefix = "TOOLKIT_"
 
+    def ensure_directories(self) -> None:
+        """Create the configured storage directories if they don't exist."""
+        self.toolkit_config_dir.mkdir(parents=True, exist_ok=True)
+        self.reference_image_dir.mkdir(parents=True, exist_ok=True)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
 
-settings = Settings()
 
-# Ensure directories exist
-settings.toolkit_config_dir.mkdir(parents=True, exist_ok=True)
-settings.reference_image_dir.mkdir(parents=True, exist_ok=True)
-settings.upload_dir.mkdir(parents=True, exist_ok=True)
+settings = Settings()
@@ -0,0 +1,99 @@
+"""Per-request latency budgets for check-ins.
+
+A Deadline travels with a check-in through the pipeline. Before an
+expensive stage, the pipeline asks whether enough budget is left
+(``allows``) and falls back to a cheaper mode otherwise, recording the
+degradation for the response. ``check`` is called at stage boundaries and
+aborts the check-in once the budget is spent or the client has gone away.
+It also runs checkpoint hooks there: the CV executor uses one to pause
+background work while interactive work is waiting, and the memory meter
+samples the process's footprint.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+from .models import Degradation
+
+
+class CheckInAborted(Exception):
+    """Raised at a stage boundary when a check-in should stop."""
+
+    def __init__(self, reason: str, disconnected: bool = False):
+        super().__init__(f"Check-in aborted: {reason}")
+        self.reason = reason
+        self.disconnected = disconnected
+
+    def __reduce__(self):
+        # Keep the attributes when raised in a worker process
+        return CheckInAborted, (self.reason, self.disconnected)
+
+
+class Deadline:
+    """Latency budget and cancellation flag of one check-in."""
+
+    def __init__(
+        self,
+        budget_seconds: Optional[float] = None,
+        checkpoint: Optional[Callable[[], None]] = None,
+    ):
+        """Initialize the deadline.
+
+        Args:
+            budget_seconds: Time allowed from now (None = unlimited)
+            checkpoint: Called at every stage boundary, before the checks
+                (e.g. cv_executor.preemption_point)
+        """
+        self.expires_at = time.monotonic() + budget_seconds if budget_seconds is not None else None
+        self.checkpoints: list[Callable[[], None]] = [checkpoint] if checkpoint else []
+        self.degradations: list[Degradation] = []
+        self._cancelled = threading.Event()
+        self._cancel_reason = "client disconnected"
+        self._lock = threading.Lock()  # Layers of one check-in degrade from several threads
+
+    def remaining(self) -> float:
+        """Seconds left in the budget (infinite if there is none)."""
+        if self.expires_at is None:
+            return math.inf
+        return self.expires_at - time.monotonic()
+
+    def cancel(self, reason: str = "client disconnected") -> None:
+        """Mark the check-in as abandoned (safe to call from any thread)."""
+        self._cancel_reason = reason
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        """Abort if the client disconnected or the budget is spent.
+
+        Raises:
+            CheckInAborted: If the check-in should stop
+        """
+        for checkpoint in self.checkpoints:
+            checkpoint()
+        if self._cancelled.is_set():
+            raise CheckInAborted(self._cancel_reason, disconnected=True)
+        if self.remaining() <= 0:
+            raise CheckInAborted("latency budget exceeded")
+
+    def allows(self, seconds: float, degradation: Degradation) -> bool:
+        """Whether ``seconds`` of budget are left for the full-quality mode.
+
+        Records ``degradation`` when they aren't, so the caller should
+        switch to its cheaper mode whenever this returns False.
+        """
+        if self.remaining() >= seconds:
+            return True
+        self.degrade(degradation)
+        return False
+
+    def degrade(self, degradation: Degradation) -> None:
+        """Record that a cheaper mode was used."""
+        with self._lock:
+            if degradation not in self.degradations:
+                self.degradations.append(degradation)
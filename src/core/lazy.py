@@ -0,0 +1,45 @@
+import threading
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class LazySingleton(Generic[T]):
+    """Proxy for a module-level singleton that is constructed on first use.
+
+    Modules keep exposing ``service = LazySingleton(Service)`` so call sites
+    stay unchanged, while importing the module no longer creates directories
+    or pulls in the CV stack.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        """Initialize the proxy.
+
+        Args:
+            factory: Callable that builds the instance (called at most once)
+        """
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def initialized(self) -> bool:
+        """True once the underlying instance has been constructed."""
+        return self._instance is not None
+
+    def get(self) -> T:
+        """Return the underlying instance, constructing it if needed."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self.get(), name, value)
@@ -62,6 +62,14 @@ class ToolkitStatus(str, Enum):
     NEVER_CHECKED = "never_checked"
 
 
+class Degradation(str, Enum):
+    """Cheaper processing mode applied to meet a check-in's latency budget."""
+    BRIGHTNESS_ONLY = "brightness_only"  # Reference comparison (SSIM) skipped
+    NO_ANNOTATION = "no_annotation"  # Annotated image not rendered
+    SMALL_THUMBNAIL = "small_thumbnail"  # History thumbnail rendered smaller
+    DOWNSCALED = "downscaled"  # Decoded below the template's resolution to fit the memory budget
+
+
 # ==================== TEMPLATE ====================
 
 class ToolDefinition(BaseModel):
@@ -91,6 +99,31 @@ class ArucoMarkerBounds(BaseModel):
         return ((self.bottom_left[1] - self.top_left[1]) + (self.bottom_right[1] - self.top_right[1])) / 2
 
 
+# Reference ID of a template's primary reference image
+DEFAULT_REFERENCE_ID = "default"
+
+
+class ReferenceImage(BaseModel):
+    """An additional reference capture of a template (e.g. different lighting)."""
+    reference_id: str = Field(..., description="Unique identifier within the template")
+    label: Optional[str] = Field(None, description="Human-readable label (e.g., 'night shift')")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class TemplateLayer(BaseModel):
+    """A separately photographed part of a toolkit (e.g. one drawer of a chest).
+
+    Each layer has its own reference image, ArUco markers and tools, and is
+    registered to its own canonical space.
+    """
+    layer_id: str = Field(..., description="Unique identifier within the template")
+    name: str = Field(..., description="Human-readable layer name (e.g., 'Drawer 2')")
+    image_width: Optional[int] = Field(None, description="Reference image width in pixels")
+    image_height: Optional[int] = Field(None, description="Reference image height in pixels")
+    tools: list[ToolDefinition] = Field(default_factory=list, description="Tools photographed in this layer")
+    aruco_bounds: Optional[ArucoMarkerBounds] = Field(None, description="ArUco marker positions in reference image")
+
+
 class ToolkitTemplate(BaseModel):
     """Template defining the layout and tools of a toolkit type."""
     template_id: str = Field(..., description="Unique identifier for this template")
@@ -106,10 +139,32 @@ class ToolkitTemplate(BaseModel):
     # ArUco marker bounds (auto-detected from reference image)
     aruco_bounds: Optional[ArucoMarkerBounds] = Field(None, description="ArUco marker positions in reference image")
 
+    # Additional reference captures; the closest one is chosen at check-in
+    reference_images: list[ReferenceImage] = Field(
+        default_factory=list, description="Additional reference images besides the primary one"
+    )
+
+    # Separately photographed layers; when present, each check-in carries one
+    # image per layer and the top-level tools, image and markers are unused
+    layers: list[TemplateLayer] = Field(
+        default_factory=list, description="Layers of a multi-image toolkit (empty for a single image)"
+    )
+
     # Detection thresholds (optional overrides)
     brightness_threshold: Optional[int] = Field(None, description="Override default brightness threshold")
     occupied_ratio_threshold: Optional[float] = Field(None, description="Override default occupied ratio")
 
+    @property
+    def all_tools(self) -> list[ToolDefinition]:
+        """Tools of the whole toolkit, across all layers."""
+        if not self.layers:
+            return self.tools
+        return [tool for layer in self.layers for tool in layer.tools]
+
+    def get_layer(self, layer_id: str) -> Optional[TemplateLayer]:
+        """Find a layer by ID."""
+        return next((layer for layer in self.layers if layer.layer_id == layer_id), None)
+
 
 class CreateTemplateRequest(BaseModel):
     """Request model for creating a new template."""
@@ -120,6 +175,7 @@ class CreateTemplateRequest(BaseModel):
     image_width: Optional[int] = None
     image_height: Optional[int] = None
     tools: list[ToolDefinition] = Field(default_factory=list)
+    layers: list[TemplateLayer] = Field(default_factory=list)
 
 
 # ==================== TOOLKIT INSTANCE ====================
@@ -146,6 +202,7 @@ class Toolkit(BaseModel):
     last_checkout: Optional[datetime] = Field(None)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = Field(0, description="Incremented on every save; updates must send the version they read")
 
 
 class CreateToolkitRequest(BaseModel):
@@ -176,6 +233,7 @@ class ToolCheckInResult(BaseModel):
     status: ToolStatus
     confidence: float = Field(..., ge=0.0, le=1.0)
     debug_info: Optional[dict] = None
+    carried_over: bool = Field(False, description="True if unchanged since the previous check-in and not re-analyzed")
 
 
 class CheckInSummary(BaseModel):
@@ -190,6 +248,17 @@ class CheckInSummary(BaseModel):
         return self.missing == 0 and self.uncertain == 0
 
 
+class LayerCheckInResult(BaseModel):
+    """Registration and reference comparison of one layer of a multi-layer check-in."""
+    layer_id: str
+    name: str
+    registration: Optional[RegistrationInfo] = Field(None, description="ArUco registration info")
+    reference_id: Optional[str] = Field(None, description="Reference image the layer was compared against")
+    image_annotated: Optional[str] = Field(
+        None, description="URL (or data URL) of the annotated image (history keeps stored URLs only)"
+    )
+
+
 class CheckInRecord(BaseModel):
     """Record of a toolkit check-in event."""
     checkin_id: str = Field(..., description="Unique ID for this check-in")
@@ -200,9 +269,16 @@ class CheckInRecord(BaseModel):
     tools: list[ToolCheckInResult] = Field(default_factory=list)
     summary: CheckInSummary
     registration: Optional[RegistrationInfo] = Field(None, description="ArUco registration info")
+    reference_id: Optional[str] = Field(None, description="Reference image the check-in was compared against")
+    layers: list[LayerCheckInResult] = Field(
+        default_factory=list, description="Per-layer details of a multi-layer check-in"
+    )
     checked_in_by: Optional[str] = Field(None, description="User who performed check-in")
     notes: Optional[str] = None
-    thumbnail: Optional[str] = Field(None, description="Base64 data URL of thumbnail image")
+    thumbnail: Optional[str] = Field(None, description="URL (or data URL) of the thumbnail image")
+    image_annotated: Optional[str] = Field(
+        None, description="URL of the annotated image (None if it was returned inline)"
+    )
 
 
 class CheckInRequest(BaseModel):
@@ -212,6 +288,17 @@ class CheckInRequest(BaseModel):
     checked_in_by: Optional[str] = None
 
 
+class MemoryReport(BaseModel):
+    """Memory planning and measured use of a check-in (for budget tuning)."""
+    image_width: Optional[int] = Field(None, description="Upload width from the image header")
+    image_height: Optional[int] = Field(None, description="Upload height from the image header")
+    decode_scale: int = Field(1, description="Downscale factor applied while decoding")
+    estimated_bytes: int = Field(..., description="Estimated peak memory the check-in was admitted with")
+    peak_rss_delta_bytes: Optional[int] = Field(
+        None, description="Measured growth of the process's resident memory (includes concurrent requests)"
+    )
+
+
 class CheckInResponse(BaseModel):
     """Response from check-in endpoint."""
     checkin_id: str
@@ -223,7 +310,71 @@ class CheckInResponse(BaseModel):
     tools: list[ToolCheckInResult]
     summary: CheckInSummary
     registration: Optional[RegistrationInfo] = Field(None, description="ArUco registration info")
-    image_annotated: Optional[str] = Field(None, description="Base64 encoded annotated image")
+    reference_id: Optional[str] = Field(None, description="Reference image the check-in was compared against")
+    layers: list[LayerCheckInResult] = Field(
+        default_factory=list, description="Per-layer details and annotated images of a multi-layer check-in"
+    )
+    image_annotated: Optional[str] = Field(
+        None, description="URL of the annotated image (/api/artifacts/..., or an inline data URL)"
+    )
+    cached: bool = Field(False, description="True if replayed from an identical recent check-in")
+    degradations: list[Degradation] = Field(
+        default_factory=list, description="Cheaper modes applied to meet the request's latency or memory budget"
+    )
+    memory: Optional[MemoryReport] = Field(None, description="Memory estimate and measured use")
+
+
+# ==================== JOBS ====================
+
+class JobStatus(str, Enum):
+    """Lifecycle of an asynchronous check-in job."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class CheckInJob(BaseModel):
+    """An asynchronous check-in queued for a worker."""
+    job_id: str
+    toolkit_id: str
+    status: JobStatus
+    created_at: datetime
+    updated_at: datetime
+    attempts: int = Field(0, description="Number of times a worker has claimed the job")
+    worker_id: Optional[str] = Field(None, description="Worker that last claimed the job")
+    result: Optional[CheckInResponse] = Field(None, description="Check-in result once succeeded")
+    error: Optional[str] = Field(None, description="Failure reason once failed")
+
+
+# ==================== CHUNKED UPLOADS ====================
+
+class UploadStatus(str, Enum):
+    """Lifecycle of a resumable check-in upload."""
+    RECEIVING = "receiving"
+    FINALIZING = "finalizing"
+    COMPLETED = "completed"
+
+
+class UploadSession(BaseModel):
+    """A check-in image uploaded in chunks that can be resumed after a failure."""
+    upload_id: str
+    toolkit_id: str
+    size: int = Field(..., description="Total image size in bytes")
+    sha256: Optional[str] = Field(None, description="Expected SHA-256 of the whole image, verified on finalize")
+    notes: Optional[str] = None
+    checked_in_by: Optional[str] = None
+    status: UploadStatus = UploadStatus.RECEIVING
+    missing: list[tuple[int, int]] = Field(
+        default_factory=list, description="Byte ranges [start, end) not received yet"
+    )
+    received_bytes: int = 0
+    created_at: datetime
+    updated_at: datetime
+    expires_at: datetime
+    checkin_id: Optional[str] = Field(None, description="Check-in recorded from the upload once finalized")
+    job_id: Optional[str] = Field(None, description="Asynchronous job the upload was queued as once finalized")
+    content_hash: Optional[str] = Field(None, description="SHA-256 of the finalized image")
 
 
 # ==================== LEGACY COMPATIBILITY ====================
@@ -265,4 +416,5 @@ class AnalysisResult(BaseModel):
     summary: AnalysisSummary
     registration: Optional[RegistrationInfo] = None
     image_annotated: Optional[str] = None
+    thumbnail: Optional[str] = Field(None, exclude=True, description="History thumbnail, encoded with image_annotated")
     error: Optional[str] = None
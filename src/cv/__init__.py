@@ -1,7 +1,7 @@
 from .processor import ToolkitProcessor
 from .detection import ToolDetector
 from .visualization import ResultVisualizer
-from .registration import ToolkitRegistration, RegistrationResult, MarkerDetectionResult
+from .registration import ToolkitRegistration, RegistrationResult, MarkerDetectionResult, get_registration
 
 __all__ = [
     "ToolkitProcessor",
@@ -10,4 +10,5 @@ __all__ = [
     "ToolkitRegistration",
     "RegistrationResult",
     "MarkerDetectionResult",
+    "get_registration",
 ]
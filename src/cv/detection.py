@@ -1,11 +1,12 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Union
 
 import cv2
 import numpy as np
 
 from ..core.config import settings
 from ..core.models import ROI, ToolStatus
+from .geometry import SlotGeometry, as_geometry
 
 
 @dataclass
@@ -22,6 +23,14 @@ class DetectionMetrics:
     normalized_diff: Optional[float] = None
 
 
+@dataclass
+class ReferenceSlot:
+    """Precomputed reference statistics for a single tool slot."""
+    gray: np.ndarray  # Masked grayscale crop of the reference ROI
+    histogram: np.ndarray  # L2-normalized 256-bin histogram (float32, shape (256,))
+    cdf: np.ndarray  # Normalized cumulative histogram (float64, shape (256,))
+
+
 @dataclass
 class DetectionResult:
     """Result of detecting a single tool slot."""
@@ -53,7 +62,7 @@ class ToolDetector:
         self.saturation_threshold = saturation_threshold or settings.saturation_threshold
         self.color_ratio_threshold = color_ratio_threshold or settings.color_ratio_threshold
 
-    def extract_roi(self, image: np.ndarray, roi: ROI) -> np.ndarray:
+    def extract_roi(self, image: np.ndarray, roi: Union[ROI, SlotGeometry]) -> np.ndarray:
         """Extract region of interest from image.
 
         For polygon ROIs, returns the bounding box crop.
@@ -67,17 +76,13 @@ class ToolDetector:
             Cropped ROI region (bounding box)
         """
         h, w = image.shape[:2]
-        x, y, roi_w, roi_h = roi.bounding_box
-
-        # Clamp ROI to image bounds
-        x1 = max(0, x)
-        y1 = max(0, y)
-        x2 = min(w, x + roi_w)
-        y2 = min(h, y + roi_h)
+        x1, y1, x2, y2 = as_geometry(roi).clamp(w, h)
 
         return image[y1:y2, x1:x2]
 
-    def extract_roi_masked(self, image: np.ndarray, roi: ROI) -> tuple[np.ndarray, np.ndarray]:
+    def extract_roi_masked(
+        self, image: np.ndarray, roi: Union[ROI, SlotGeometry]
+    ) -> tuple[np.ndarray, np.ndarray]:
         """Extract region of interest with polygon mask.
 
         For polygon ROIs, creates a mask that excludes pixels outside the polygon.
@@ -88,16 +93,11 @@ class ToolDetector:
             roi: Region of interest coordinates (rectangle or polygon)
 
         Returns:
-            Tuple of (cropped ROI region, binary mask where 255=inside polygon)
+            Tuple of (cropped ROI region, read-only binary mask where 255=inside polygon)
         """
+        geometry = as_geometry(roi)
         h, w = image.shape[:2]
-        x, y, roi_w, roi_h = roi.bounding_box
-
-        # Clamp ROI to image bounds
-        x1 = max(0, x)
-        y1 = max(0, y)
-        x2 = min(w, x + roi_w)
-        y2 = min(h, y + roi_h)
+        x1, y1, x2, y2 = geometry.clamp(w, h)
 
         # Extract bounding box region
         roi_image = image[y1:y2, x1:x2]
@@ -105,20 +105,29 @@ class ToolDetector:
         if roi_image.size == 0:
             return roi_image, np.array([])
 
-        # Create mask
-        mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+        # Mask is rasterized once per crop and cached on the geometry
+        return roi_image, geometry.mask(x1, y1, x2, y2)
 
-        if roi.is_polygon:
-            # Create polygon mask, translating points to local coordinates
-            local_points = np.array([(p[0] - x1, p[1] - y1) for p in roi.points], dtype=np.int32)
-            cv2.fillPoly(mask, [local_points], 255)
-        else:
-            # Rectangle: entire region is valid
-            mask[:] = 255
+    @staticmethod
+    def compute_cdf(image: np.ndarray) -> np.ndarray:
+        """Compute the normalized cumulative histogram of a grayscale image."""
+        hist, _ = np.histogram(image.flatten(), 256, [0, 256])
+        cdf = hist.cumsum()
+        return cdf / cdf[-1]
 
-        return roi_image, mask
+    @staticmethod
+    def compute_histogram(image: np.ndarray) -> np.ndarray:
+        """Compute the L2-normalized 256-bin histogram of a grayscale image."""
+        hist = cv2.calcHist([image], [0], None, [256], [0, 256])
+        cv2.normalize(hist, hist)
+        return hist.ravel()
 
-    def normalize_histogram(self, source: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    def normalize_histogram(
+        self,
+        source: np.ndarray,
+        reference: np.ndarray,
+        reference_cdf: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
         """Normalize source image histogram to match reference (histogram matching).
 
         This reduces the impact of lighting variations between images.
@@ -126,21 +135,13 @@ class ToolDetector:
         Args:
             source: Source image to normalize (grayscale)
             reference: Reference image to match (grayscale)
+            reference_cdf: Precomputed normalized CDF of reference (computed if None)
 
         Returns:
             Normalized source image
         """
-        # Calculate histograms
-        src_hist, _ = np.histogram(source.flatten(), 256, [0, 256])
-        ref_hist, _ = np.histogram(reference.flatten(), 256, [0, 256])
-
-        # Calculate CDFs
-        src_cdf = src_hist.cumsum()
-        ref_cdf = ref_hist.cumsum()
-
-        # Normalize CDFs
-        src_cdf = src_cdf / src_cdf[-1]
-        ref_cdf = ref_cdf / ref_cdf[-1]
+        src_cdf = self.compute_cdf(source)
+        ref_cdf = reference_cdf if reference_cdf is not None else self.compute_cdf(reference)
 
         # Create lookup table
         lookup = np.zeros(256, dtype=np.uint8)
@@ -184,21 +185,25 @@ class ToolDetector:
 
         return float(np.mean(ssim_map))
 
-    def compute_histogram_correlation(self, img1: np.ndarray, img2: np.ndarray) -> float:
+    def compute_histogram_correlation(
+        self,
+        img1: np.ndarray,
+        img2: np.ndarray,
+        hist2: Optional[np.ndarray] = None,
+    ) -> float:
         """Compute histogram correlation between two images.
 
         Args:
             img1: First image (grayscale)
             img2: Second image (grayscale)
+            hist2: Precomputed normalized histogram of img2 (computed if None)
 
         Returns:
             Correlation value between -1 and 1 (1 = identical histograms)
         """
-        hist1 = cv2.calcHist([img1], [0], None, [256], [0, 256])
-        hist2 = cv2.calcHist([img2], [0], None, [256], [0, 256])
-
-        cv2.normalize(hist1, hist1)
-        cv2.normalize(hist2, hist2)
+        hist1 = self.compute_histogram(img1)
+        if hist2 is None:
+            hist2 = self.compute_histogram(img2)
 
         return float(cv2.compareHist(hist1, hist2, cv2.HISTCMP_CORREL))
 
@@ -220,6 +225,7 @@ class ToolDetector:
         current_roi: np.ndarray,
         reference_roi: np.ndarray,
         mask: Optional[np.ndarray] = None,
+        reference_slot: Optional[ReferenceSlot] = None,
     ) -> tuple[float, float, float]:
         """Compare current ROI to reference ROI using multiple metrics.
 
@@ -227,6 +233,8 @@ class ToolDetector:
             current_roi: Current check-in ROI (BGR format)
             reference_roi: Reference template ROI (BGR format)
             mask: Optional binary mask for polygon ROIs (255=inside, 0=outside)
+            reference_slot: Precomputed reference statistics for this ROI (skips
+                reference grayscale conversion and histogram computation)
 
         Returns:
             Tuple of (ssim_score, histogram_correlation, normalized_diff)
@@ -251,28 +259,92 @@ class ToolDetector:
 
         # Convert to grayscale
         current_gray = cv2.cvtColor(current_roi, cv2.COLOR_BGR2GRAY)
-        reference_gray = cv2.cvtColor(reference_roi, cv2.COLOR_BGR2GRAY)
+        if reference_slot is not None:
+            reference_gray = reference_slot.gray
+        else:
+            reference_gray = cv2.cvtColor(reference_roi, cv2.COLOR_BGR2GRAY)
 
         # Apply mask if provided - set masked-out regions to same value in both images
         if mask is not None and mask.size > 0:
             # Set pixels outside mask to 0 in both images
             current_gray = cv2.bitwise_and(current_gray, mask)
-            reference_gray = cv2.bitwise_and(reference_gray, mask)
+            if reference_slot is None:
+                reference_gray = cv2.bitwise_and(reference_gray, mask)
 
         # Option 3: Histogram normalization - match current histogram to reference
-        current_normalized = self.normalize_histogram(current_gray, reference_gray)
+        current_normalized = self.normalize_histogram(
+            current_gray, reference_gray,
+            reference_cdf=reference_slot.cdf if reference_slot is not None else None,
+        )
 
         # Option 1: SSIM comparison (on normalized image)
         ssim_score = self.compute_ssim(current_normalized, reference_gray)
 
         # Option 2: Histogram correlation (on original images)
-        hist_corr = self.compute_histogram_correlation(current_gray, reference_gray)
+        hist_corr = self.compute_histogram_correlation(
+            current_gray, reference_gray,
+            hist2=reference_slot.histogram if reference_slot is not None else None,
+        )
 
         # Normalized difference (on normalized image)
         norm_diff = self.compute_normalized_difference(current_normalized, reference_gray)
 
         return ssim_score, hist_corr, norm_diff
 
+    def compute_reference_slot(
+        self, reference_image: np.ndarray, roi: Union[ROI, SlotGeometry]
+    ) -> Optional[ReferenceSlot]:
+        """Precompute the reference statistics used by compare_to_reference.
+
+        Args:
+            reference_image: Reference image in the same space as the ROI (BGR format)
+            roi: Region of interest for the tool slot
+
+        Returns:
+            ReferenceSlot, or None if the ROI lies outside the reference image
+        """
+        geometry = as_geometry(roi)
+        ref_roi_image, ref_mask = self.extract_roi_masked(reference_image, geometry)
+        if ref_roi_image.size == 0:
+            return None
+
+        gray = cv2.cvtColor(ref_roi_image, cv2.COLOR_BGR2GRAY)
+        if geometry.is_polygon and ref_mask.size > 0:
+            gray = cv2.bitwise_and(gray, ref_mask)
+
+        return ReferenceSlot(
+            gray=gray,
+            histogram=self.compute_histogram(gray),
+            cdf=self.compute_cdf(gray),
+        )
+
+    def compute_slot_signature(
+        self, image: np.ndarray, roi: Union[ROI, SlotGeometry], size: int = 16
+    ) -> np.ndarray:
+        """Compute a compact grayscale signature of an ROI for change detection.
+
+        Args:
+            image: Full image (BGR format)
+            roi: Region of interest for the tool slot
+            size: Signature is a size x size grayscale thumbnail
+
+        Returns:
+            uint8 array of shape (size, size), all zeros if the ROI is empty
+        """
+        roi_image = self.extract_roi(image, roi)
+        if roi_image.size == 0:
+            return np.zeros((size, size), dtype=np.uint8)
+
+        gray = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def signature_distance(sig1: np.ndarray, sig2: np.ndarray) -> float:
+        """Mean absolute difference between two slot signatures (0 = identical, 1 = inverted)."""
+        if sig1.shape != sig2.shape:
+            return 1.0
+        return float(np.mean(cv2.absdiff(sig1, sig2)) / 255.0)
+
     def compute_metrics(self, roi_image: np.ndarray, mask: Optional[np.ndarray] = None) -> DetectionMetrics:
         """Compute detection metrics for an ROI.
 
@@ -357,8 +429,9 @@ class ToolDetector:
     def detect(
         self,
         image: np.ndarray,
-        roi: ROI,
+        roi: Union[ROI, SlotGeometry],
         reference_image: Optional[np.ndarray] = None,
+        reference_slot: Optional[ReferenceSlot] = None,
     ) -> DetectionResult:
         """Detect if a tool is present in the given ROI.
 
@@ -372,21 +445,24 @@ class ToolDetector:
             image: Full image (BGR format)
             roi: Region of interest for the tool slot (rectangle or polygon)
             reference_image: Optional reference image for comparison-based detection
+            reference_slot: Optional precomputed statistics of reference_image for this ROI
 
         Returns:
             DetectionResult with status, confidence, and metrics
         """
         # Extract ROI with mask for polygon support
-        roi_image, mask = self.extract_roi_masked(image, roi)
-        metrics = self.compute_metrics(roi_image, mask if roi.is_polygon else None)
+        geometry = as_geometry(roi)
+        roi_image, mask = self.extract_roi_masked(image, geometry)
+        metrics = self.compute_metrics(roi_image, mask if geometry.is_polygon else None)
 
         # If reference image provided, use comparison-based detection
         if reference_image is not None:
-            ref_roi_image, ref_mask = self.extract_roi_masked(reference_image, roi)
+            ref_roi_image, ref_mask = self.extract_roi_masked(reference_image, geometry)
 
             if ref_roi_image.size > 0:
                 ssim_score, hist_corr, norm_diff = self.compare_to_reference(
-                    roi_image, ref_roi_image, mask if roi.is_polygon else None
+                    roi_image, ref_roi_image, mask if geometry.is_polygon else None,
+                    reference_slot=reference_slot,
                 )
                 metrics.ssim_score = ssim_score
                 metrics.histogram_correlation = hist_corr
@@ -494,7 +570,7 @@ class ToolDetector:
         )
 
     def detect_batch(
-        self, image: np.ndarray, rois: list[ROI]
+        self, image: np.ndarray, rois: list[Union[ROI, SlotGeometry]]
     ) -> list[DetectionResult]:
         """Detect tool presence for multiple ROIs.
 
@@ -0,0 +1,87 @@
+"""Compact array-backed slot geometry for the CV hot path.
+
+The pydantic ROI model is the API and storage format; its bounding_box
+property rebuilds Python lists on every access and polygon points are
+re-converted to NumPy arrays by each drawing or masking call. SlotGeometry
+converts an ROI once into int32 vertex arrays with a cached bounding box,
+area and polygon masks, and is what everything in src/cv works with.
+"""
+
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+
+from ..core.models import ROI
+
+
+class SlotGeometry:
+    """Immutable geometry of a tool slot (rectangle or polygon)."""
+
+    __slots__ = ("bbox", "points", "area", "is_polygon", "center", "_masks")
+
+    def __init__(self, bbox: tuple[int, int, int, int], points: Optional[np.ndarray] = None):
+        """Initialize geometry.
+
+        Args:
+            bbox: Bounding box (x, y, width, height)
+            points: Polygon vertices as an (N, 2) int32 array, or None for a rectangle
+        """
+        x, y, w, h = (int(v) for v in bbox)
+        self.bbox = (x, y, w, h)
+        self.is_polygon = points is not None and len(points) >= 3
+        self.points = np.ascontiguousarray(points, dtype=np.int32).reshape(-1, 2) if self.is_polygon else None
+        if self.points is not None:
+            self.points.setflags(write=False)
+        self.area = float(cv2.contourArea(self.points)) if self.is_polygon else float(w * h)
+        self.center = (x + w // 2, y + h // 2)
+        self._masks: dict[tuple[int, int, int, int], np.ndarray] = {}
+
+    @classmethod
+    def from_roi(cls, roi: ROI) -> "SlotGeometry":
+        """Convert a pydantic ROI (the only place ROI lists are walked)."""
+        if roi.is_polygon:
+            points = np.array(roi.points, dtype=np.int32).reshape(-1, 2)
+            min_x, min_y = points.min(axis=0)
+            max_x, max_y = points.max(axis=0)
+            return cls((min_x, min_y, max_x - min_x, max_y - min_y), points)
+        return cls((roi.x, roi.y, roi.width, roi.height))
+
+    @property
+    def polylines_points(self) -> np.ndarray:
+        """Polygon vertices shaped (N, 1, 2) as expected by cv2.polylines/fillPoly."""
+        return self.points.reshape((-1, 1, 2))
+
+    def clamp(self, image_width: int, image_height: int) -> tuple[int, int, int, int]:
+        """Clamp the bounding box to image bounds.
+
+        Returns:
+            (x1, y1, x2, y2) crop bounds
+        """
+        x, y, w, h = self.bbox
+        return max(0, x), max(0, y), min(image_width, x + w), min(image_height, y + h)
+
+    def mask(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        """Binary mask (255 = inside) of this slot within crop bounds.
+
+        Masks are cached per crop, so repeated calls on same-sized images
+        don't re-rasterize the polygon. The returned array is read-only.
+        """
+        key = (x1, y1, x2, y2)
+        mask = self._masks.get(key)
+        if mask is None:
+            if self.is_polygon:
+                mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+                cv2.fillPoly(mask, [(self.points - (x1, y1)).astype(np.int32)], 255)
+            else:
+                mask = np.full((y2 - y1, x2 - x1), 255, dtype=np.uint8)
+            mask.setflags(write=False)
+            self._masks[key] = mask
+        return mask
+
+
+def as_geometry(roi: Union[ROI, SlotGeometry]) -> SlotGeometry:
+    """Accept either an ROI or a SlotGeometry and return a SlotGeometry."""
+    if isinstance(roi, SlotGeometry):
+        return roi
+    return SlotGeometry.from_roi(roi)
@@ -1,22 +1,27 @@
-from typing import Optional
+from typing import Callable, Optional
 
 import numpy as np
 
 from ..core.config import settings
+from ..core.deadline import Deadline
 from ..core.models import (
     ToolkitConfig,
     ToolAnalysisResult,
     AnalysisResult,
     AnalysisSummary,
     ToolStatus,
-    ROI,
     RegistrationInfo,
+    Degradation,
 )
-from ..utils.image_utils import encode_image_base64
-from .detection import ToolDetector
-from .registration import ToolkitRegistration, RegistrationResult
+from ..utils.image_utils import encode_annotated_image
+from .detection import ToolDetector, ReferenceSlot
+from .geometry import SlotGeometry
+from .registration import ToolkitRegistration, RegistrationResult, get_registration
 from .visualization import ResultVisualizer
 
+# Thumbnail width used when the latency budget runs low
+SMALL_THUMBNAIL_WIDTH = 64
+
 
 class ToolkitProcessor:
     """Main processor for analyzing toolkit images."""
@@ -29,26 +34,32 @@ class ToolkitProcessor:
     ):
         """Initialize the processor.
 
+        The processor holds no per-request state, so one instance can serve
+        concurrent analyze() calls from several threads.
+
         Args:
             detector: Tool detector instance (creates default if None)
             visualizer: Result visualizer instance (creates default if None)
-            registration: Registration instance for ArUco marker detection (creates default if None)
+            registration: Default registration for analyze() (if None, the calling
+                thread's pooled registration from global settings is used)
         """
         self.detector = detector or ToolDetector()
         self.visualizer = visualizer or ResultVisualizer()
+        self._registration = registration
 
-        # Initialize registration with global settings
-        if registration is not None:
-            self.registration = registration
-        elif settings.aruco_enabled:
-            self.registration = ToolkitRegistration(
-                dictionary=settings.aruco_dictionary,
-                marker_ids=settings.aruco_marker_ids,
-                canonical_size=(settings.aruco_canonical_width, settings.aruco_canonical_height),
-                min_markers_for_homography=settings.aruco_min_markers,
-            )
-        else:
-            self.registration = None
+    @property
+    def registration(self) -> Optional[ToolkitRegistration]:
+        """Default registration used when analyze() isn't given one."""
+        if self._registration is not None:
+            return self._registration
+        if not settings.aruco_enabled:
+            return None
+        return get_registration(
+            dictionary=settings.aruco_dictionary,
+            marker_ids=settings.aruco_marker_ids,
+            canonical_size=(settings.aruco_canonical_width, settings.aruco_canonical_height),
+            min_markers_for_homography=settings.aruco_min_markers,
+        )
 
     def analyze(
         self,
@@ -57,6 +68,18 @@ class ToolkitProcessor:
         include_annotated_image: bool = True,
         include_debug_info: bool = False,
         reference_image: Optional[np.ndarray] = None,
+        reference_slots: Optional[dict[str, ReferenceSlot]] = None,
+        carried_results: Optional[dict[str, ToolAnalysisResult]] = None,
+        geometries: Optional[dict[str, SlotGeometry]] = None,
+        registration: Optional[ToolkitRegistration] = None,
+        register: bool = True,
+        deadline: Optional[Deadline] = None,
+        thumbnail_width: Optional[int] = None,
+        store_image: Optional[Callable[[bytes, str], str]] = None,
+        defer_annotation: Optional[
+            Callable[[np.ndarray, list[ToolAnalysisResult], list[SlotGeometry], Optional[int]], tuple[str, Optional[str]]]
+        ] = None,
+        annotate_in_place: bool = False,
     ) -> AnalysisResult:
         """Analyze an image against a toolkit configuration.
 
@@ -66,17 +89,46 @@ class ToolkitProcessor:
             include_annotated_image: Whether to include annotated image in result
             include_debug_info: Whether to include detection metrics in result
             reference_image: Optional reference image for comparison-based detection
+            reference_slots: Optional precomputed reference statistics keyed by tool_id
+            carried_results: Results to reuse for slots known to be unchanged
+                (keyed by tool_id); these slots skip detection
+            geometries: Optional precomputed slot geometries keyed by tool_id;
+                ROIs without one are converted here
+            registration: Registration for this call (defaults to self.registration)
+            register: Set False if the image is already in canonical space
+            deadline: Optional latency budget; checked between slots, and the
+                annotated image is skipped when too little is left
+            thumbnail_width: Also encode a thumbnail of the annotated image
+                this wide (None = no thumbnail)
+            store_image: Stores an encoded image (bytes, file extension) and
+                returns the URL reported for it (None = inline data URLs)
+            defer_annotation: Instead of rendering the annotated image, called
+                with the canonical frame, the slot results and geometries and
+                the thumbnail width; returns the URLs of the image and the
+                thumbnail, to be rendered later
+            annotate_in_place: Draw the annotated image on ``image`` itself
+                instead of a copy. Set it when the caller hands the array
+                over and doesn't read it afterwards (a warped frame is
+                always drawn on directly)
 
         Returns:
             AnalysisResult with tool statuses and summary
+
+        Raises:
+            CheckInAborted: If the deadline expires or is cancelled
         """
         # Step 1: Registration (ArUco marker detection and perspective correction)
         registration_info: Optional[RegistrationInfo] = None
         reg_result: Optional[RegistrationResult] = None
         working_image = image
 
-        if self.registration is not None:
-            reg_result = self.registration.register(image)
+        if not register:
+            registration = None
+        elif registration is None:
+            registration = self.registration
+
+        if registration is not None:
+            reg_result = registration.register(image)
             working_image = reg_result.warped_image if reg_result.warped_image is not None else image
             registration_info = RegistrationInfo(
                 markers_detected=reg_result.markers_detected,
@@ -92,14 +144,28 @@ class ToolkitProcessor:
         )
 
         tool_results: list[ToolAnalysisResult] = []
-        rois: list[ROI] = []
+        rois: list[SlotGeometry] = []
 
         # Step 3: Process each tool slot
         for tool in toolkit_config.tools:
+            geometry = geometries.get(tool.tool_id) if geometries else None
+            if geometry is None:
+                geometry = SlotGeometry.from_roi(tool.roi)
+            rois.append(geometry)
+
+            carried = carried_results.get(tool.tool_id) if carried_results else None
+            if carried is not None:
+                tool_results.append(carried)
+                continue
+
+            if deadline is not None:
+                deadline.check()
+
             detection = detector.detect(
                 working_image,
-                tool.roi,
+                geometry,
                 reference_image=reference_image,
+                reference_slot=reference_slots.get(tool.tool_id) if reference_slots else None,
             )
 
             debug_info = None
@@ -127,7 +193,6 @@ class ToolkitProcessor:
                 confidence=detection.confidence,
                 debug_info=debug_info,
             ))
-            rois.append(tool.roi)
 
         # Calculate summary
         present = sum(1 for r in tool_results if r.status == ToolStatus.PRESENT)
@@ -151,24 +216,42 @@ class ToolkitProcessor:
 
         # Generate annotated image
         annotated_image_b64 = None
-        if include_annotated_image:
-            annotated = self.visualizer.annotate_image(
-                working_image, tool_results, rois,
-                show_labels=True,
-                show_confidence=True,
-                show_icons=True,
-            )
-            annotated = self.visualizer.create_summary_overlay(
-                annotated, present, missing, uncertain
+        thumbnail_b64 = None
+        if include_annotated_image and deadline is not None:
+            include_annotated_image = deadline.allows(
+                settings.deadline_annotation_seconds, Degradation.NO_ANNOTATION
             )
+        if include_annotated_image:
+            if thumbnail_width is not None and deadline is not None and not deadline.allows(
+                settings.deadline_thumbnail_seconds, Degradation.SMALL_THUMBNAIL
+            ):
+                thumbnail_width = min(thumbnail_width, SMALL_THUMBNAIL_WIDTH)
 
-            # Draw registration debug info if enabled
-            if settings.aruco_debug and reg_result is not None:
-                annotated = self.registration.draw_detected_markers(
-                    annotated, reg_result.detected_markers
+            if defer_annotation is not None:
+                # Keep the frame and slot results; the image is rendered when first requested
+                annotated_image_b64, thumbnail_b64 = defer_annotation(
+                    working_image, tool_results, rois, thumbnail_width
+                )
+            else:
+                # A warped frame is ours to draw on; the caller's image only if handed over
+                annotated = self.visualizer.render_results(
+                    working_image, tool_results, rois, copy=working_image is image and not annotate_in_place
                 )
 
-            annotated_image_b64 = encode_image_base64(annotated)
+                # Draw registration debug info if enabled
+                if settings.aruco_debug and reg_result is not None:
+                    annotated = registration.draw_detected_markers(
+                        annotated, reg_result.detected_markers
+                    )
+
+                # Full image and thumbnail from the same pixels, in one pass
+                annotated_image_b64, thumbnail_b64 = encode_annotated_image(
+                    annotated,
+                    settings.annotated_image_format,
+                    settings.annotated_image_quality,
+                    thumbnail_width,
+                    store_image,
+                )
 
         return AnalysisResult(
             toolkit_id=toolkit_config.toolkit_id,
@@ -178,6 +261,7 @@ class ToolkitProcessor:
             summary=summary,
             registration=registration_info,
             image_annotated=annotated_image_b64,
+            thumbnail=thumbnail_b64,
         )
 
     def analyze_with_reference(
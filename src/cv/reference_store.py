@@ -0,0 +1,270 @@
+"""On-disk, memory-mapped reference data for template comparison.
+
+Each template reference image is registered to canonical space once and the
+derived arrays (warped reference, per-slot grayscale crops and histogram
+statistics, global descriptor) are written as uncompressed ``.npy`` files.
+Loading them with ``np.load(mmap_mode="r")`` lets every worker process share
+the same read-only page-cache pages instead of decoding and warping its own
+copy.
+
+A template may have several reference captures (e.g. day and night lighting).
+Each gets a small global descriptor so the closest one can be picked before
+any per-slot comparison runs.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from ..core.models import ToolDefinition, DEFAULT_REFERENCE_ID
+from .detection import ToolDetector, ReferenceSlot
+from .geometry import SlotGeometry
+from .registration import ToolkitRegistration
+
+
+MANIFEST_FILE = "manifest.json"
+WARPED_FILE = "warped.npy"
+HISTOGRAMS_FILE = "histograms.npy"
+CDFS_FILE = "cdfs.npy"
+DESCRIPTOR_FILE = "descriptor.npy"
+
+# Global descriptor layout: luminance histogram + tiny grayscale thumbnail
+DESCRIPTOR_HIST_BINS = 32
+DESCRIPTOR_THUMB_SIZE = (32, 24)
+
+
+def compute_global_descriptor(image: np.ndarray) -> np.ndarray:
+    """Compute a compact whole-image descriptor for reference selection.
+
+    The descriptor concatenates an L1-normalized luminance histogram with a
+    tiny grayscale thumbnail scaled so that the L1 distance between two
+    descriptors is (histogram L1 distance + mean absolute thumbnail
+    difference). The first term captures overall lighting, the second the
+    coarse layout.
+
+    Args:
+        image: Canonical-space image (BGR format)
+
+    Returns:
+        float32 descriptor vector
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    thumb = cv2.resize(gray, DESCRIPTOR_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+    hist = cv2.calcHist([thumb], [0], None, [DESCRIPTOR_HIST_BINS], [0, 256]).ravel()
+    hist /= max(float(hist.sum()), 1.0)
+
+    thumb_vec = thumb.astype(np.float32).ravel() / (255.0 * thumb.size)
+    return np.concatenate([hist, thumb_vec]).astype(np.float32)
+
+
+def descriptor_distance(d1: np.ndarray, d2: np.ndarray) -> float:
+    """L1 distance between two global descriptors (0 = identical)."""
+    return float(np.abs(d1 - d2).sum())
+
+
+@dataclass
+class ReferenceData:
+    """Canonical-space reference arrays for one reference capture of a template."""
+    key: str
+    warped: np.ndarray  # Warped reference image (BGR, read-only)
+    slots: dict[str, ReferenceSlot] = field(default_factory=dict)  # tool_id → slot data
+    descriptor: Optional[np.ndarray] = None  # Global descriptor for reference selection
+    reference_id: str = DEFAULT_REFERENCE_ID
+
+
+class ReferenceStore:
+    """Builds and memory-maps per-template reference arrays."""
+
+    def __init__(self, cache_dir: Path):
+        """Initialize the store.
+
+        Args:
+            cache_dir: Directory holding one sub-directory per template
+        """
+        self.cache_dir = cache_dir
+        self._loaded: dict[tuple[str, str], ReferenceData] = {}  # (template_id, reference_id) → data
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def compute_key(
+        source_path: Path,
+        tools: list[ToolDefinition],
+        canonical_size: tuple[int, int],
+    ) -> str:
+        """Fingerprint the inputs that the derived arrays depend on.
+
+        Args:
+            source_path: Reference image on disk
+            tools: Tool definitions with ROIs in canonical space
+            canonical_size: Canonical (width, height)
+
+        Returns:
+            Short hex digest identifying this reference build
+        """
+        stat = source_path.stat()
+        payload = {
+            "source": [source_path.name, stat.st_size, stat.st_mtime_ns],
+            "canonical_size": list(canonical_size),
+            "tools": [[t.tool_id, t.roi.model_dump(mode="json")] for t in tools],
+        }
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def get(
+        self,
+        template_id: str,
+        source_path: Path,
+        tools: list[ToolDefinition],
+        registration: ToolkitRegistration,
+        detector: Optional[ToolDetector] = None,
+        reference_id: str = DEFAULT_REFERENCE_ID,
+        key: Optional[str] = None,
+    ) -> Optional[ReferenceData]:
+        """Get reference data for a template, building it on first use.
+
+        Args:
+            template_id: Template the reference belongs to
+            source_path: Reference image on disk
+            tools: Tool definitions with ROIs in canonical space
+            registration: Registration configured with the template's canonical size
+            detector: Detector used to derive per-slot statistics
+            reference_id: Which of the template's reference captures this is
+            key: compute_key of the inputs, if the caller has it already
+
+        Returns:
+            ReferenceData backed by memory-mapped arrays, or None if the
+            reference image could not be registered
+        """
+        if key is None:
+            key = self.compute_key(source_path, tools, registration.canonical_size)
+
+        with self._lock:
+            cached = self._loaded.get((template_id, reference_id))
+            if cached is not None and cached.key == key:
+                return cached
+
+        target_dir = self.cache_dir / template_id / reference_id / key
+        if not (target_dir / MANIFEST_FILE).exists():
+            if not self._build(target_dir, source_path, tools, registration, detector or ToolDetector()):
+                return None
+
+        data = self._load(target_dir, key, reference_id)
+        with self._lock:
+            self._loaded[(template_id, reference_id)] = data
+        return data
+
+    def invalidate(self, template_id: str, reference_id: Optional[str] = None) -> None:
+        """Drop cached and on-disk reference data for a template.
+
+        Args:
+            template_id: Template to invalidate (with its layers, stored as
+                ``<template_id>/<layer_id>``, unless reference_id is given)
+            reference_id: Only invalidate this reference capture (all if None)
+        """
+        with self._lock:
+            for loaded_key in list(self._loaded):
+                owned = loaded_key[0] == template_id or (
+                    reference_id is None and loaded_key[0].startswith(f"{template_id}/")
+                )
+                if owned and reference_id in (None, loaded_key[1]):
+                    del self._loaded[loaded_key]
+
+        target = self.cache_dir / template_id
+        if reference_id is not None:
+            target = target / reference_id
+        shutil.rmtree(target, ignore_errors=True)
+
+    def _build(
+        self,
+        target_dir: Path,
+        source_path: Path,
+        tools: list[ToolDefinition],
+        registration: ToolkitRegistration,
+        detector: ToolDetector,
+    ) -> bool:
+        """Register the reference image and write its derived arrays to disk."""
+        reference_raw = cv2.imread(str(source_path))
+        if reference_raw is None:
+            return False
+
+        reg_result = registration.register(reference_raw)
+        if not reg_result.success:
+            return False
+
+        warped = np.ascontiguousarray(reg_result.warped_image)
+        slots = [
+            (tool.tool_id, detector.compute_reference_slot(warped, SlotGeometry.from_roi(tool.roi)))
+            for tool in tools
+        ]
+        slots = [(tool_id, slot) for tool_id, slot in slots if slot is not None]
+
+        # Write into a private directory and rename it into place so that
+        # concurrent workers never observe a half-written build
+        tmp_dir = target_dir.parent / f".tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            np.save(tmp_dir / WARPED_FILE, warped)
+            histograms = np.zeros((len(slots), 256), dtype=np.float32)
+            cdfs = np.zeros((len(slots), 256), dtype=np.float64)
+            for i, (_, slot) in enumerate(slots):
+                np.save(tmp_dir / f"slot_{i}.npy", np.ascontiguousarray(slot.gray))
+                histograms[i] = slot.histogram
+                cdfs[i] = slot.cdf
+            np.save(tmp_dir / HISTOGRAMS_FILE, histograms)
+            np.save(tmp_dir / CDFS_FILE, cdfs)
+            np.save(tmp_dir / DESCRIPTOR_FILE, compute_global_descriptor(warped))
+
+            with open(tmp_dir / MANIFEST_FILE, "w") as f:
+                json.dump({"tool_ids": [tool_id for tool_id, _ in slots]}, f)
+
+            try:
+                os.rename(tmp_dir, target_dir)
+            except OSError:
+                # Another worker finished the same build first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        # Remove builds for previous versions of this template
+        for stale in target_dir.parent.iterdir():
+            if stale.is_dir() and stale.name != target_dir.name and not stale.name.startswith(".tmp-"):
+                shutil.rmtree(stale, ignore_errors=True)
+
+        return True
+
+    def _load(self, target_dir: Path, key: str, reference_id: str) -> ReferenceData:
+        """Memory-map a previously built reference directory."""
+        with open(target_dir / MANIFEST_FILE, "r") as f:
+            manifest = json.load(f)
+
+        histograms = np.load(target_dir / HISTOGRAMS_FILE, mmap_mode="r")
+        cdfs = np.load(target_dir / CDFS_FILE, mmap_mode="r")
+
+        slots = {
+            tool_id: ReferenceSlot(
+                gray=np.load(target_dir / f"slot_{i}.npy", mmap_mode="r"),
+                histogram=histograms[i],
+                cdf=cdfs[i],
+            )
+            for i, tool_id in enumerate(manifest["tool_ids"])
+        }
+
+        descriptor_path = target_dir / DESCRIPTOR_FILE
+        return ReferenceData(
+            key=key,
+            warped=np.load(target_dir / WARPED_FILE, mmap_mode="r"),
+            slots=slots,
+            descriptor=np.load(descriptor_path) if descriptor_path.exists() else None,
+            reference_id=reference_id,
+        )
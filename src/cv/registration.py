@@ -1,5 +1,6 @@
 """ArUco marker detection and perspective correction for toolkit registration."""
 
+import threading
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
@@ -346,3 +347,43 @@ class ToolkitRegistration:
                 )
 
         return output
+
+
+# Per-thread pool of registration objects. cv2.aruco.ArucoDetector is not
+# documented as thread-safe and is costly to build, so each thread keeps
+# one instance per configuration and reuses it across requests.
+_pool = threading.local()
+
+
+def get_registration(
+    dictionary: str = "DICT_4X4_50",
+    marker_ids: Optional[list[int]] = None,
+    canonical_size: tuple[int, int] = (1000, 800),
+    min_markers_for_homography: int = 3,
+) -> ToolkitRegistration:
+    """Get the calling thread's pooled ToolkitRegistration for a configuration.
+
+    Args:
+        dictionary: ArUco dictionary name (e.g., "DICT_4X4_50")
+        marker_ids: Expected marker IDs [top-left, top-right, bottom-right, bottom-left]
+        canonical_size: Output image size (width, height) after perspective correction
+        min_markers_for_homography: Minimum markers needed for transformation
+
+    Returns:
+        A ToolkitRegistration owned by the calling thread
+    """
+    key = (dictionary, tuple(marker_ids or (0, 1, 2, 3)), tuple(canonical_size), min_markers_for_homography)
+    registrations = getattr(_pool, "registrations", None)
+    if registrations is None:
+        registrations = _pool.registrations = {}
+
+    registration = registrations.get(key)
+    if registration is None:
+        registration = ToolkitRegistration(
+            dictionary=dictionary,
+            marker_ids=list(key[1]),
+            canonical_size=key[2],
+            min_markers_for_homography=min_markers_for_homography,
+        )
+        registrations[key] = registration
+    return registration
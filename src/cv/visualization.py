@@ -1,13 +1,47 @@
-from typing import Optional
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Union
 
 import cv2
 import numpy as np
 
 from ..core.models import ToolAnalysisResult, ToolStatus, ROI
+from .geometry import SlotGeometry, as_geometry
+
+# Slot labels whose layout and pre-rendered backgrounds are kept (a few KB each)
+LABEL_CACHE_SIZE = 512
+# Height of the summary bar at the bottom of annotated images
+SUMMARY_HEIGHT = 80
+
+
+@dataclass
+class LabelLayer:
+    """Template-only part of a slot label: placement and pre-rendered name.
+
+    The label background is drawn from ``x`` to ``name_end`` with the name
+    on it, once per status; only the confidence suffix after the name
+    changes between check-ins.
+    """
+    x: int
+    y1: int  # Background rows (inclusive)
+    y2: int
+    text_y: int  # Baseline
+    name_width: int
+    name_end: int  # First column after the name's ink, where the suffix background starts
+    # Background plus name per status, clipped to the image; empty if the name's
+    # descenders reach past the background, since then it must be drawn over the frame
+    sprites: dict[ToolStatus, np.ndarray] = field(default_factory=dict)
+    crop: tuple[int, int, int, int] = (0, 0, 0, 0)  # Image bounds (x1, y1, x2, y2) of the sprites
 
 
 class ResultVisualizer:
-    """Visualizes analysis results on images."""
+    """Visualizes analysis results on images.
+
+    Slot labels are laid out and rendered once per template: their name
+    part (background and text) only depends on the slot's box, its name and
+    the image size, so it is cached per status and copied into place on
+    later check-ins. The summary bar background is cached per image size.
+    """
 
     # Color scheme (BGR format)
     COLORS = {
@@ -32,11 +66,14 @@ class ResultVisualizer:
         self.line_thickness = line_thickness
         self.font_scale = font_scale
         self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self._label_layers: dict[tuple, LabelLayer] = {}
+        self._summary_backgrounds: dict[tuple[int, ...], np.ndarray] = {}
+        self._cache_lock = threading.Lock()
 
     def draw_roi(
         self,
         image: np.ndarray,
-        roi: ROI,
+        roi: Union[ROI, SlotGeometry],
         status: ToolStatus,
         label: Optional[str] = None,
         confidence: Optional[float] = None,
@@ -54,58 +91,127 @@ class ResultVisualizer:
             Modified image
         """
         color = self.COLORS[status]
-        bg_color = self.LABEL_BG_COLORS[status]
 
-        # Get bounding box for label positioning
-        x1, y1, w, h = roi.bounding_box
+        geometry = as_geometry(roi)
+        x1, y1, w, h = geometry.bbox
         x2, y2 = x1 + w, y1 + h
 
         # Draw polygon or rectangle
-        if roi.is_polygon:
-            pts = np.array(roi.points, dtype=np.int32).reshape((-1, 1, 2))
-            cv2.polylines(image, [pts], True, color, self.line_thickness)
+        if geometry.is_polygon:
+            cv2.polylines(image, [geometry.polylines_points], True, color, self.line_thickness)
         else:
             cv2.rectangle(image, (x1, y1), (x2, y2), color, self.line_thickness)
 
         # Draw label if provided
         if label:
-            # Build label text
-            label_text = label
-            if confidence is not None:
-                label_text += f" ({confidence:.0%})"
-
-            # Calculate text size
-            (text_w, text_h), baseline = cv2.getTextSize(
-                label_text, self.font, self.font_scale, 1
-            )
+            self._draw_label(image, geometry, status, label, confidence)
+
+        return image
+
+    def _label_layer(self, bbox: tuple[int, int, int, int], name: str, image_size: tuple[int, int]) -> LabelLayer:
+        """Get the cached layout and name sprites of a slot label."""
+        key = (bbox, name, image_size)
+        with self._cache_lock:
+            layer = self._label_layers.get(key)
+        if layer is not None:
+            return layer
+
+        x1, y1, w, h = bbox
+        y2 = y1 + h
+        image_h, image_w = image_size
+        (name_w, text_h), _ = cv2.getTextSize(name, self.font, self.font_scale, 1)
+
+        # Position label above the box (or below if near top edge)
+        padding = 4
+        if y1 > text_h + padding * 2 + 5:
+            # Label above
+            label_y1, label_y2, text_y = y1 - text_h - padding * 2, y1, y1 - padding
+        else:
+            # Label below
+            label_y1, label_y2, text_y = y2, y2 + text_h + padding * 2, y2 + text_h + padding
+
+        layer = LabelLayer(
+            x=x1,
+            y1=label_y1,
+            y2=label_y2,
+            text_y=text_y,
+            name_width=name_w,
+            name_end=x1 + padding + name_w,
+        )
+
+        # Render the name on a canvas with a margin around the background to see where its ink goes
+        margin = text_h
+        canvas = np.zeros((label_y2 - label_y1 + 1 + 2 * margin, layer.name_end - x1 + 2 * margin), np.uint8)
+        cv2.putText(canvas, name, (margin + padding, text_y - label_y1 + margin), self.font, self.font_scale, 255, 1, cv2.LINE_AA)
+        inside = canvas[margin:-margin, margin:-margin]
+        crop = (max(0, x1), max(0, label_y1), min(image_w, layer.name_end), min(image_h, label_y2 + 1))
+        if int(inside.sum()) == int(canvas.sum()) and crop[0] < crop[2] and crop[1] < crop[3]:
+            layer.crop = crop
+            origin = (x1 - crop[0], label_y1 - crop[1])
+            for status, bg_color in self.LABEL_BG_COLORS.items():
+                sprite = np.empty((crop[3] - crop[1], crop[2] - crop[0], 3), np.uint8)
+                sprite[:] = bg_color
+                cv2.putText(
+                    sprite, name, (origin[0] + padding, text_y - crop[1]),
+                    self.font, self.font_scale, (255, 255, 255), 1, cv2.LINE_AA,
+                )
+                layer.sprites[status] = sprite
+
+        with self._cache_lock:
+            if len(self._label_layers) >= LABEL_CACHE_SIZE:
+                del self._label_layers[next(iter(self._label_layers))]
+            self._label_layers[key] = layer
+        return layer
+
+    def _draw_label(
+        self,
+        image: np.ndarray,
+        geometry: SlotGeometry,
+        status: ToolStatus,
+        name: str,
+        confidence: Optional[float] = None,
+    ) -> None:
+        """Draw a slot's label (name and optional confidence) by its box."""
+        layer = self._label_layer(geometry.bbox, name, image.shape[:2])
+        bg_color = self.LABEL_BG_COLORS[status]
+        padding = 4
 
-            # Position label above the box (or below if near top edge)
-            padding = 4
-            if y1 > text_h + padding * 2 + 5:
-                # Label above
-                label_y1 = y1 - text_h - padding * 2
-                label_y2 = y1
-                text_y = y1 - padding
-            else:
-                # Label below
-                label_y1 = y2
-                label_y2 = y2 + text_h + padding * 2
-                text_y = y2 + text_h + padding
+        suffix = f" ({confidence:.0%})" if confidence is not None else ""
+        text_w = layer.name_width
+        if suffix:
+            # getTextSize includes the stroke thickness once, not per part
+            text_w += cv2.getTextSize(suffix, self.font, self.font_scale, 1)[0][0] - 1
 
+        sprite = layer.sprites.get(status)
+        if sprite is None:
             # Draw label background
             cv2.rectangle(
                 image,
-                (x1, label_y1),
-                (x1 + text_w + padding * 2, label_y2),
+                (layer.x, layer.y1),
+                (layer.x + text_w + padding * 2, layer.y2),
                 bg_color,
                 -1,  # Filled
             )
+            text, text_x = name + suffix, layer.x + padding
+        else:
+            # Pre-rendered background and name, then the rest of the background
+            x1, y1, x2, y2 = layer.crop
+            image[y1:y2, x1:x2] = sprite
+            cv2.rectangle(
+                image,
+                (layer.name_end, layer.y1),
+                (layer.x + text_w + padding * 2, layer.y2),
+                bg_color,
+                -1,
+            )
+            text, text_x = suffix, layer.name_end - 1
 
-            # Draw label text
+        # Draw label text
+        if text:
             cv2.putText(
                 image,
-                label_text,
-                (x1 + padding, text_y),
+                text,
+                (text_x, layer.text_y),
                 self.font,
                 self.font_scale,
                 (255, 255, 255),
@@ -113,12 +219,10 @@ class ResultVisualizer:
                 cv2.LINE_AA,
             )
 
-        return image
-
     def draw_status_icon(
         self,
         image: np.ndarray,
-        roi: ROI,
+        roi: Union[ROI, SlotGeometry],
         status: ToolStatus,
     ) -> np.ndarray:
         """Draw a status icon (checkmark or X) in the center of the ROI.
@@ -132,9 +236,9 @@ class ResultVisualizer:
             Modified image
         """
         color = self.COLORS[status]
-        x, y, w, h = roi.bounding_box
-        center_x = x + w // 2
-        center_y = y + h // 2
+        geometry = as_geometry(roi)
+        _, _, w, h = geometry.bbox
+        center_x, center_y = geometry.center
 
         icon_size = min(w, h) // 4
         icon_size = max(10, min(icon_size, 30))  # Clamp size
@@ -175,11 +279,12 @@ class ResultVisualizer:
         self,
         image: np.ndarray,
         results: list[ToolAnalysisResult],
-        rois: list[ROI],
+        rois: list[Union[ROI, SlotGeometry]],
         show_labels: bool = True,
         show_confidence: bool = True,
         show_icons: bool = True,
         show_debug: bool = False,
+        copy: bool = True,
     ) -> np.ndarray:
         """Annotate an image with analysis results.
 
@@ -191,13 +296,16 @@ class ResultVisualizer:
             show_confidence: Whether to show confidence scores
             show_icons: Whether to show status icons
             show_debug: Whether to show debug metrics (B/S/E scores)
+            copy: Draw on a copy (False draws on ``image`` itself)
 
         Returns:
-            Annotated image copy
+            Annotated image
         """
-        annotated = image.copy()
+        annotated = image.copy() if copy else image
 
         for result, roi in zip(results, rois):
+            roi = as_geometry(roi)
+
             # Draw ROI box with status color
             label = result.name if show_labels else None
             confidence = result.confidence if show_confidence else None
@@ -213,10 +321,45 @@ class ResultVisualizer:
 
         return annotated
 
+    def render_results(
+        self,
+        image: np.ndarray,
+        results: list[ToolAnalysisResult],
+        rois: list[Union[ROI, SlotGeometry]],
+        copy: bool = True,
+    ) -> np.ndarray:
+        """Render the annotated check-in image: labelled slots, icons and the summary bar.
+
+        Everything is drawn into a single output buffer.
+
+        Args:
+            image: Canonical image
+            results: List of tool analysis results
+            rois: List of ROIs corresponding to results
+            copy: Draw on a copy (False draws on ``image`` itself)
+
+        Returns:
+            Annotated image
+        """
+        annotated = self.annotate_image(
+            image, results, rois,
+            show_labels=True,
+            show_confidence=True,
+            show_icons=True,
+            copy=copy,
+        )
+        counts = {status: 0 for status in ToolStatus}
+        for result in results:
+            counts[result.status] += 1
+        self._draw_summary(
+            annotated, counts[ToolStatus.PRESENT], counts[ToolStatus.MISSING], counts[ToolStatus.UNCERTAIN]
+        )
+        return annotated
+
     def _draw_debug_metrics(
         self,
         image: np.ndarray,
-        roi: ROI,
+        roi: Union[ROI, SlotGeometry],
         debug_info: dict,
     ) -> None:
         """Draw debug metrics below the ROI box.
@@ -226,7 +369,7 @@ class ResultVisualizer:
             roi: Region of interest (rectangle or polygon)
             debug_info: Dictionary with brightness_ratio, saturation_ratio, edge_density, mean_brightness
         """
-        x, y, w, h = roi.bounding_box
+        x, y, w, h = as_geometry(roi).bbox
         x1 = x
         y2 = y + h
 
@@ -288,13 +431,23 @@ class ResultVisualizer:
             Image with summary overlay
         """
         annotated = image.copy()
+        self._draw_summary(annotated, present, missing, uncertain)
+        return annotated
+
+    def _draw_summary(self, annotated: np.ndarray, present: int, missing: int, uncertain: int) -> None:
+        """Draw the summary overlay onto ``annotated`` in place."""
         h, w = annotated.shape[:2]
 
         # Create semi-transparent overlay box
-        overlay_h = 80
-        overlay = annotated[h - overlay_h:h, :].copy()
-        cv2.rectangle(overlay, (0, 0), (w, overlay_h), (40, 40, 40), -1)
-        cv2.addWeighted(overlay, 0.7, annotated[h - overlay_h:h, :], 0.3, 0, annotated[h - overlay_h:h, :])
+        overlay_h = SUMMARY_HEIGHT
+        bar = annotated[h - overlay_h:h, :]
+        with self._cache_lock:
+            overlay = self._summary_backgrounds.get(bar.shape)
+        if overlay is None:
+            overlay = np.full(bar.shape, 40, np.uint8)
+            with self._cache_lock:
+                self._summary_backgrounds[bar.shape] = overlay
+        cv2.addWeighted(overlay, 0.7, bar, 0.3, 0, bar)
 
         # Draw summary text
         total = present + missing + uncertain
@@ -319,5 +472,3 @@ class ResultVisualizer:
             annotated, counts_text,
             (20, y_pos + 35), self.font, 0.5, (200, 200, 200), 1, cv2.LINE_AA
         )
-
-        return annotated
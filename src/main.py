@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
@@ -5,12 +6,33 @@ from fastapi.responses import FileResponse
 
 from .core.config import settings
 from .api.routes import router
+from .services.artifact_store import start_artifact_gc
+from .services.cv_executor import cv_executor
+from .services.process_pool import cv_process_pool
+from .services.resource_governor import resource_governor
+from .services.warmup import start_warmup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the CV stack, create storage directories and start background work."""
+    resource_governor.apply()
+    settings.ensure_directories()
+    start_warmup()
+    start_artifact_gc()
+    yield
+    if cv_executor.initialized:
+        cv_executor.shutdown()
+    if cv_process_pool.initialized:
+        cv_process_pool.shutdown()
+
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.api_title,
     version=settings.api_version,
     description="Computer vision system for detecting tool presence in industrial toolkits",
+    lifespan=lifespan,
 )
 
 # Include API routes
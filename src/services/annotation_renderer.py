@@ -0,0 +1,251 @@
+"""Deferred rendering of annotated check-in images.
+
+Drawing the annotated image (slot outlines, labels, icons, summary bar)
+and encoding it is a sizeable share of a check-in, yet most API clients
+never look at it. With lazy rendering a check-in only stores the
+canonical frame as a JPEG (the cheapest encode, whatever format the
+annotated image is served in) and a small spec with the slot results, and
+returns URLs under ``/api/renders/``. The image and its history thumbnail
+are rendered together the first time either is requested and kept next to
+the spec, so later requests are file reads. The thumbnail is lazy too:
+shrinking the full-size annotated image to thumbnail width costs about as
+much as drawing and encoding it.
+
+Specs are named by the hash of their content, so a render URL always
+yields the same image and may be cached forever. Like artifacts, they
+are written via rename and can be created from CV worker processes.
+"""
+
+import hashlib
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from pydantic import BaseModel
+
+from ..core.config import settings
+from ..core.lazy import LazySingleton
+from ..core.models import ToolAnalysisResult, ToolStatus
+from .artifact_store import artifact_store
+
+if TYPE_CHECKING:
+    import numpy as np
+    from ..cv.geometry import SlotGeometry
+    from ..cv.visualization import ResultVisualizer
+
+RENDER_URL_PREFIX = "/api/renders/"
+RENDER_ID_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class SlotAnnotation(BaseModel):
+    """What is drawn for one slot."""
+    name: str
+    status: ToolStatus
+    confidence: float
+    bbox: tuple[int, int, int, int]
+    points: Optional[list[tuple[int, int]]] = None
+
+
+class AnnotationSpec(BaseModel):
+    """Everything needed to render a check-in's annotated image later."""
+    frame: str  # Artifact name of the canonical frame
+    slots: list[SlotAnnotation]
+    image_format: str
+    quality: Optional[int] = None
+    thumbnail_width: Optional[int] = None  # None = no thumbnail
+
+
+class AnnotationRenderer:
+    """Stores render specs and renders them on first request."""
+
+    def __init__(self, renders_dir: Optional[Path] = None):
+        """Initialize the renderer.
+
+        Args:
+            renders_dir: Directory for specs and rendered images
+        """
+        self.renders_dir = renders_dir or settings.toolkit_config_dir / "renders"
+        self.renders_dir.mkdir(parents=True, exist_ok=True)
+        self._visualizer: Optional["ResultVisualizer"] = None
+
+    @property
+    def visualizer(self) -> "ResultVisualizer":
+        if self._visualizer is None:
+            from ..cv.visualization import ResultVisualizer
+            self._visualizer = ResultVisualizer()
+        return self._visualizer
+
+    def _spec_path(self, render_id: str) -> Path:
+        return self.renders_dir / f"{render_id}.json"
+
+    def _output_path(self, render_id: str, spec: AnnotationSpec, thumbnail: bool) -> Path:
+        from ..utils.image_utils import IMAGE_FORMATS
+
+        if thumbnail:
+            return self.renders_dir / f"{render_id}.thumb.jpg"
+        return self.renders_dir / f"{render_id}{IMAGE_FORMATS[spec.image_format]}"
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def defer(
+        self,
+        frame: "np.ndarray",
+        results: list[ToolAnalysisResult],
+        rois: list["SlotGeometry"],
+        thumbnail_width: Optional[int] = None,
+    ) -> tuple[str, Optional[str]]:
+        """Store a frame and its slot results for rendering on demand.
+
+        Args:
+            frame: Canonical frame the results refer to
+            results: Slot results, in the order of ``rois``
+            rois: Slot geometries in canonical space
+            thumbnail_width: Width of the thumbnail (None = no thumbnail)
+
+        Returns:
+            Tuple of (image URL, thumbnail URL or None)
+
+        Raises:
+            ValueError: If the annotated image format is unknown
+        """
+        from ..utils.image_utils import IMAGE_FORMATS, encode_image
+
+        if settings.annotated_image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {settings.annotated_image_format}")
+
+        quality = settings.annotated_image_quality
+        spec = AnnotationSpec(
+            frame=artifact_store.put(encode_image(frame, ".jpg", quality), ".jpg"),
+            slots=[
+                SlotAnnotation(
+                    name=result.name,
+                    status=result.status,
+                    confidence=result.confidence,
+                    bbox=roi.bbox,
+                    points=roi.points.tolist() if roi.is_polygon else None,
+                )
+                for result, roi in zip(results, rois)
+            ],
+            image_format=settings.annotated_image_format,
+            quality=quality,
+            thumbnail_width=thumbnail_width,
+        )
+        spec_json = spec.model_dump_json()
+        render_id = hashlib.sha256(spec_json.encode()).hexdigest()
+        spec_path = self._spec_path(render_id)
+        try:
+            os.utime(spec_path)  # Stored again: restart its retention period
+        except FileNotFoundError:
+            self._write(spec_path, spec_json.encode())
+
+        url = RENDER_URL_PREFIX + render_id
+        return url, f"{url}/thumbnail" if thumbnail_width is not None else None
+
+    @staticmethod
+    def render_id_from_url(url: Optional[str]) -> Optional[str]:
+        """Render ID of an ``/api/renders/...`` URL (None for other URLs)."""
+        if url and url.startswith(RENDER_URL_PREFIX):
+            return url[len(RENDER_URL_PREFIX):].removesuffix("/thumbnail")
+        return None
+
+    def collect_garbage(self, keep: set[str], max_age_seconds: float) -> tuple[int, set[str]]:
+        """Delete renders that aren't kept and weren't deferred recently.
+
+        Args:
+            keep: IDs of renders still referred to
+            max_age_seconds: Renders deferred within this long are kept too
+
+        Returns:
+            Tuple of (renders deleted, artifact names of the frames the
+            remaining renders need)
+        """
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        frames = set()
+        for spec_path in self.renders_dir.glob("*.json"):
+            render_id = spec_path.stem
+            try:
+                if render_id in keep or spec_path.stat().st_mtime >= cutoff:
+                    frames.add(AnnotationSpec.model_validate_json(spec_path.read_text()).frame)
+                    continue
+                for path in self.renders_dir.glob(f"{render_id}.*"):
+                    path.unlink(missing_ok=True)
+            except (OSError, ValueError):
+                continue
+            removed += 1
+        return removed, frames
+
+    def get_spec(self, render_id: str) -> Optional[AnnotationSpec]:
+        """Get a render spec by ID (None if unknown)."""
+        if not RENDER_ID_PATTERN.fullmatch(render_id):
+            return None
+        try:
+            return AnnotationSpec.model_validate_json(self._spec_path(render_id).read_text())
+        except FileNotFoundError:
+            return None
+
+    def find_rendered(self, render_id: str, thumbnail: bool = False) -> Optional[Path]:
+        """Get the file of an already rendered image (None if not rendered yet)."""
+        spec = self.get_spec(render_id)
+        if spec is None:
+            return None
+        path = self._output_path(render_id, spec, thumbnail)
+        return path if path.exists() else None
+
+    def render(self, render_id: str, thumbnail: bool = False) -> Optional[Path]:
+        """Render an annotated image and its thumbnail unless already done.
+
+        Blocking CV work; run it on the CV executor.
+
+        Args:
+            render_id: ID from the render URL
+            thumbnail: Return the thumbnail instead of the full image
+
+        Returns:
+            File of the requested image, or None if the render (or its
+            frame, or the thumbnail) doesn't exist
+        """
+        spec = self.get_spec(render_id)
+        if spec is None or (thumbnail and spec.thumbnail_width is None):
+            return None
+        path = self._output_path(render_id, spec, thumbnail)
+        if path.exists():
+            return path
+        frame_path = artifact_store.get_path(spec.frame)
+        if frame_path is None:
+            return None
+
+        import numpy as np
+        from ..cv.geometry import SlotGeometry
+        from ..utils.image_utils import IMAGE_FORMATS, encode_image, load_image, shrink_to_width
+
+        results = [
+            ToolAnalysisResult(
+                tool_id=str(i), name=slot.name, slot_index=i, status=slot.status, confidence=slot.confidence
+            )
+            for i, slot in enumerate(spec.slots)
+        ]
+        rois = [
+            SlotGeometry(slot.bbox, np.array(slot.points, dtype=np.int32) if slot.points else None)
+            for slot in spec.slots
+        ]
+        annotated = self.visualizer.render_results(load_image(frame_path), results, rois, copy=False)
+
+        # Both outputs at once: whoever asks for one usually asks for the other
+        extension = IMAGE_FORMATS[spec.image_format]
+        self._write(self._output_path(render_id, spec, False), encode_image(annotated, extension, spec.quality))
+        if spec.thumbnail_width is not None:
+            small = shrink_to_width(annotated, spec.thumbnail_width)
+            self._write(self._output_path(render_id, spec, True), encode_image(small, ".jpg", spec.quality))
+        return path
+
+
+# Singleton instance
+annotation_renderer: AnnotationRenderer = LazySingleton(AnnotationRenderer)
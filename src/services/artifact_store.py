@@ -0,0 +1,157 @@
+"""Content-addressed store for check-in images.
+
+Annotated images and history thumbnails are written here once, named by
+the SHA-256 of their bytes, and check-in responses and history records
+refer to them by URL instead of embedding base64. Since an artifact's
+content never changes under its name, ``GET /api/artifacts/{name}`` can be
+cached by browsers indefinitely, and identical images (e.g. replayed
+duplicate check-ins) are stored once.
+
+Writes go to a temporary file that is renamed into place, so any server
+thread or CV worker process can store artifacts concurrently; racing
+writers of the same content produce the same file. Artifacts are kept
+while a check-in record refers to them, and otherwise for
+``artifact_retention_hours`` after they were last stored (see
+ToolkitInstanceService.collect_artifacts).
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import settings
+from ..core.lazy import LazySingleton
+
+ARTIFACT_URL_PREFIX = "/api/artifacts/"
+# Media type of each stored file extension
+ARTIFACT_MEDIA_TYPES = {".jpg": "image/jpeg", ".webp": "image/webp", ".png": "image/png"}
+
+ARTIFACT_NAME_PATTERN = re.compile(r"([0-9a-f]{64})(\.[a-z]+)")
+
+logger = logging.getLogger("toolkit.artifacts")
+
+
+class ArtifactStore:
+    """Stores images under the hash of their content."""
+
+    def __init__(self, artifacts_dir: Optional[Path] = None):
+        """Initialize the store.
+
+        Args:
+            artifacts_dir: Directory holding the artifacts
+        """
+        self.artifacts_dir = artifacts_dir or settings.toolkit_config_dir / "artifacts"
+        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get_path(self, name: str) -> Path:
+        # Fan out by the first hash byte to keep directories small
+        return self.artifacts_dir / name[:2] / name
+
+    def put(self, data: bytes, extension: str) -> str:
+        """Store encoded image data.
+
+        Args:
+            data: Encoded image
+            extension: File extension of its format (e.g. '.jpg')
+
+        Returns:
+            Artifact name ('{sha256}{extension}')
+
+        Raises:
+            ValueError: If the extension isn't a supported image format
+        """
+        if extension not in ARTIFACT_MEDIA_TYPES:
+            raise ValueError(f"Unsupported artifact type: {extension}")
+
+        name = hashlib.sha256(data).hexdigest() + extension
+        path = self._get_path(name)
+        try:
+            os.utime(path)  # Stored again: restart its retention period
+        except FileNotFoundError:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{name}.{uuid.uuid4().hex[:8]}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return name
+
+    def put_url(self, data: bytes, extension: str) -> str:
+        """Store encoded image data and return the URL it is served at."""
+        return ARTIFACT_URL_PREFIX + self.put(data, extension)
+
+    @staticmethod
+    def name_from_url(url: Optional[str]) -> Optional[str]:
+        """Artifact name of an ``/api/artifacts/...`` URL (None for other URLs)."""
+        if url and url.startswith(ARTIFACT_URL_PREFIX):
+            return url[len(ARTIFACT_URL_PREFIX):]
+        return None
+
+    def get_path(self, name: str) -> Optional[Path]:
+        """Get the file of an artifact (None if the name is invalid or unknown)."""
+        match = ARTIFACT_NAME_PATTERN.fullmatch(name)
+        if not match or match.group(2) not in ARTIFACT_MEDIA_TYPES:
+            return None
+        path = self._get_path(name)
+        return path if path.exists() else None
+
+    def collect_garbage(self, keep: set[str], max_age_seconds: float) -> int:
+        """Delete artifacts that aren't kept and weren't stored recently.
+
+        Args:
+            keep: Names of artifacts still referred to
+            max_age_seconds: Artifacts stored within this long are kept too
+                (their check-in may still be running)
+
+        Returns:
+            Number of files deleted
+        """
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for path in self.artifacts_dir.glob("*/*"):
+            try:
+                if path.name in keep or path.stat().st_mtime >= cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+        return removed
+
+
+def run_artifact_gc() -> None:
+    """Collect unreferenced images every ``artifact_gc_interval_seconds``, forever."""
+    from .toolkit_instance_service import toolkit_instance_service
+
+    while True:
+        time.sleep(settings.artifact_gc_interval_seconds)
+        try:
+            removed = toolkit_instance_service.collect_artifacts()
+        except Exception:
+            logger.exception("Artifact collection failed")
+            continue
+        if any(removed.values()):
+            logger.info("Deleted %(renders_removed)d renders and %(artifacts_removed)d artifacts", removed)
+
+
+def start_artifact_gc() -> Optional[threading.Thread]:
+    """Start collecting unreferenced images in a background thread.
+
+    Returns:
+        The collector thread, or None if images are kept forever
+    """
+    if settings.artifact_retention_hours <= 0:
+        return None
+
+    thread = threading.Thread(target=run_artifact_gc, name="artifact-gc", daemon=True)
+    thread.start()
+    return thread
+
+
+# Singleton instance
+artifact_store: ArtifactStore = LazySingleton(ArtifactStore)
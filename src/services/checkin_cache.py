@@ -0,0 +1,160 @@
+"""Idempotent check-in result cache keyed by upload content.
+
+Operators on flaky Wi-Fi often submit the same photo twice. Results are
+cached per (image content hash, toolkit, template version, toolkit version)
+so a duplicate within the configured window returns the stored response
+instead of re-running the analysis and writing another CheckInRecord. The
+toolkit version is the one the check-in saved: once anything else saves the
+toolkit (a checkout, another check-in), the same photo is a new check-in.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from ..core.models import CheckInResponse
+
+
+@dataclass
+class CacheEntry:
+    """A cached check-in response."""
+    toolkit_id: str
+    template_version: str
+    toolkit_version: int  # Toolkit version saved by the cached check-in
+    response: CheckInResponse
+    created_at: float  # time.monotonic() at insertion
+    phash: Optional[int] = None  # Perceptual hash of the decoded image
+
+
+class CheckInResultCache:
+    """LRU + TTL cache of check-in responses."""
+
+    def __init__(
+        self,
+        max_entries: int = 64,
+        ttl_seconds: float = 300.0,
+        phash_max_distance: Optional[int] = None,
+        phash_window_seconds: float = 10.0,
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached responses (least recently used evicted first)
+            ttl_seconds: Entries older than this are treated as misses and evicted
+            phash_max_distance: Maximum Hamming distance for perceptual-hash matches
+                (None disables near-duplicate matching)
+            phash_window_seconds: Perceptual-hash matches must be at most this old;
+                a whole-frame hash can't tell one missing small tool apart, so
+                only quick resubmissions are replayed
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.phash_max_distance = phash_max_distance
+        self.phash_window_seconds = phash_window_seconds
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, toolkit_id: str, template_version: str, toolkit_version: int) -> str:
+        """Build the cache key for an upload to a toolkit at ``toolkit_version``."""
+        return f"{toolkit_id}:{toolkit_version}:{template_version}:{content_hash}"
+
+    def get(self, key: str) -> Optional[CheckInResponse]:
+        """Look up a response by exact content key."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.response
+
+    def find_similar(
+        self,
+        toolkit_id: str,
+        template_version: str,
+        toolkit_version: int,
+        phash: int,
+    ) -> Optional[CheckInResponse]:
+        """Look up a response for a near-identical recent image of the same toolkit.
+
+        Args:
+            toolkit_id: Toolkit being checked in
+            template_version: Version of the toolkit's template
+            toolkit_version: Current version of the toolkit
+            phash: Perceptual hash of the decoded upload
+
+        Returns:
+            Closest cached response within phash_max_distance, or None
+        """
+        if self.phash_max_distance is None:
+            return None
+
+        with self._lock:
+            self._evict_expired()
+            cutoff = time.monotonic() - self.phash_window_seconds
+            best_key, best_distance = None, None
+            for key, entry in self._entries.items():
+                if entry.phash is None or entry.toolkit_id != toolkit_id:
+                    continue
+                if entry.template_version != template_version or entry.toolkit_version != toolkit_version:
+                    continue
+                if entry.created_at < cutoff:
+                    continue
+                distance = bin(entry.phash ^ phash).count("1")
+                if distance <= self.phash_max_distance and (best_distance is None or distance < best_distance):
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key].response
+
+    def put(
+        self,
+        key: str,
+        toolkit_id: str,
+        template_version: str,
+        toolkit_version: int,
+        response: CheckInResponse,
+        phash: Optional[int] = None,
+    ) -> None:
+        """Store a response, evicting the least recently used entries if full."""
+        with self._lock:
+            self._entries[key] = CacheEntry(
+                toolkit_id=toolkit_id,
+                template_version=template_version,
+                toolkit_version=toolkit_version,
+                response=response,
+                created_at=time.monotonic(),
+                phash=phash,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, toolkit_id: str) -> None:
+        """Drop all cached responses of a toolkit."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.toolkit_id == toolkit_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all cached responses."""
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self) -> None:
+        """Remove entries older than the TTL (caller holds the lock)."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            del self._entries[key]
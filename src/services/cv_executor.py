@@ -0,0 +1,334 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Optional, TypeVar
+
+from ..core.config import settings
+from ..core.lazy import LazySingleton
+
+T = TypeVar("T")
+
+# Number of recent queue-wait samples kept per priority class for the stats endpoint
+WAIT_SAMPLE_SIZE = 256
+
+
+class Priority(str, Enum):
+    """Scheduling class of CV work."""
+    INTERACTIVE = "interactive"  # An operator is waiting on the response
+    BATCH = "batch"  # Bulk uploads whose results are streamed back
+    BACKGROUND = "background"  # Nobody is waiting (warm-up, maintenance)
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the CV executor's wait queue is full."""
+
+    def __init__(self, retry_after: int, message: str = "CV executor is saturated, retry later"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(eq=False)
+class _Job:
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    priority: Priority
+    future: Future = field(default_factory=Future)
+    submitted: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _ClassState:
+    weight: float
+    queue: deque = field(default_factory=deque)
+    virtual_time: float = 0.0
+    running: int = 0
+    completed: int = 0
+    rejected: int = 0
+    waits_ms: deque = field(default_factory=lambda: deque(maxlen=WAIT_SAMPLE_SIZE))
+
+
+class CVExecutor:
+    """Bounded, priority-aware thread pool for CPU-bound CV work and blocking file I/O.
+
+    Routes are ``async def`` and run on the event loop; anything that decodes,
+    registers or analyzes images is submitted here instead so that health
+    checks and light requests stay responsive. At most ``max_workers`` jobs
+    run at once and at most ``max_queue`` more of each priority class may
+    wait; further submissions are rejected with ExecutorSaturated rather than
+    piling up.
+
+    Waiting jobs are dispatched by weighted fair queuing across priority
+    classes, and ``interactive_reserved`` workers are kept free of batch and
+    background work so an operator's check-in never waits behind a bulk run.
+    Background jobs that call ``preemption_point`` (via their Deadline, at
+    stage boundaries) also pause there while interactive work is waiting.
+
+    OpenCV and NumPy release the GIL in their heavy kernels, so threads give
+    real parallelism for the pipeline.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        retry_after_seconds: Optional[int] = None,
+        interactive_reserved: Optional[int] = None,
+    ):
+        """Initialize the executor.
+
+        Args:
+            max_workers: Concurrent jobs (defaults to the resource governor's layout:
+                settings, or the effective CPU count, capped at 4 unless the process
+                backend does the heavy lifting)
+            max_queue: Jobs of each priority class allowed to wait (defaults to settings)
+            retry_after_seconds: Retry-After hint returned when saturated
+            interactive_reserved: Workers only interactive jobs may use (defaults to
+                settings; at least one worker is always left for other classes)
+        """
+        if max_workers is None:
+            from .resource_governor import resource_governor
+            max_workers = resource_governor.layout.executor_workers
+        self.max_workers = max_workers
+        self.max_queue = max_queue if max_queue is not None else settings.cv_executor_max_queue
+        self.retry_after_seconds = (
+            retry_after_seconds if retry_after_seconds is not None else settings.cv_executor_retry_after_seconds
+        )
+        reserved = interactive_reserved if interactive_reserved is not None else settings.cv_interactive_reserved_workers
+        self.interactive_reserved = max(0, min(reserved, self.max_workers - 1))
+
+        self._classes = {
+            Priority.INTERACTIVE: _ClassState(weight=settings.cv_weight_interactive),
+            Priority.BATCH: _ClassState(weight=settings.cv_weight_batch),
+            Priority.BACKGROUND: _ClassState(weight=settings.cv_weight_background),
+        }
+        self._virtual_clock = 0.0
+        self._paused = 0  # Preempted jobs waiting to resume (they keep their thread, not their slot)
+
+        # Extra threads host preempted jobs while their slot is lent out
+        self._pool = ThreadPoolExecutor(max_workers=2 * self.max_workers, thread_name_prefix="cv")
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    # ==================== SUBMISSION ====================
+
+    def submit(self, fn: Callable[..., T], *args, priority: Priority = Priority.INTERACTIVE, **kwargs) -> "Future[T]":
+        """Queue a blocking callable and return a future for its result.
+
+        Cancelling the future before the job starts removes it from the queue.
+
+        Raises:
+            ExecutorSaturated: If the class's wait queue is full
+        """
+        job = _Job(fn, args, kwargs, priority)
+        state = self._classes[priority]
+        with self._cond:
+            if len(state.queue) >= self.max_queue:
+                state.rejected += 1
+                raise ExecutorSaturated(self.retry_after_seconds)
+            if not state.queue and state.running == 0:
+                # A class returning from idle doesn't get credit for the time it was away
+                state.virtual_time = max(state.virtual_time, self._virtual_clock)
+            state.queue.append(job)
+            self._dispatch()
+        job.future.add_done_callback(lambda f: self._discard(job) if f.cancelled() else None)
+        return job.future
+
+    async def run(self, fn: Callable[..., T], *args, priority: Priority = Priority.INTERACTIVE, **kwargs) -> T:
+        """Run a blocking callable on the executor and await its result.
+
+        Raises:
+            ExecutorSaturated: If the class's wait queue is full
+        """
+        # A job cancelled before it started (e.g. the client went away) never runs
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority, **kwargs))
+
+    def fan_out(self, fn: Callable[[Any], T], items: list) -> list[T]:
+        """Run ``fn`` over ``items`` in parallel and return the results in order.
+
+        Meant for splitting one job into parts (e.g. the layers of a
+        check-in). The other items are queued at the calling job's priority
+        while the caller runs the first one itself. The caller then takes
+        back every item no worker has started and runs it inline, so it
+        never waits on work queued behind it: fanning out from every worker
+        at once can't deadlock. Items that don't fit the queue also run
+        inline.
+        """
+        if not items:
+            return []
+        job = getattr(self._local, "job", None)
+        priority = job.priority if job is not None else Priority.INTERACTIVE
+
+        futures: list[Optional[Future]] = []
+        for item in items[1:]:
+            try:
+                futures.append(self.submit(fn, item, priority=priority))
+            except ExecutorSaturated:
+                futures.append(None)
+
+        try:
+            results = [fn(items[0])]
+            for item, future in zip(items[1:], futures):
+                if future is None or future.cancel():
+                    results.append(fn(item))
+                else:
+                    results.append(future.result())
+            return results
+        finally:
+            # On failure, parts that haven't started are dropped
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+
+    def _discard(self, job: _Job) -> None:
+        with self._cond:
+            try:
+                self._classes[job.priority].queue.remove(job)
+            except ValueError:
+                pass
+
+    # ==================== SCHEDULING ====================
+
+    def _running(self) -> int:
+        return sum(state.running for state in self._classes.values())
+
+    def _may_start(self, priority: Priority) -> bool:
+        """Whether a job of this class may take a free worker (lock held)."""
+        running = self._running()
+        if running >= self.max_workers:
+            return False
+        if priority is Priority.INTERACTIVE:
+            return True
+        shared = self.max_workers - self.interactive_reserved
+        return running - self._classes[Priority.INTERACTIVE].running < shared
+
+    def _next_class(self) -> Optional[Priority]:
+        """Class with the smallest virtual finish time that may start (lock held)."""
+        best = None
+        best_finish = 0.0
+        for priority, state in self._classes.items():
+            if not state.queue or not self._may_start(priority):
+                continue
+            finish = state.virtual_time + 1.0 / state.weight
+            if best is None or finish < best_finish:
+                best, best_finish = priority, finish
+        return best
+
+    def _dispatch(self) -> None:
+        """Start waiting jobs on free workers (lock held)."""
+        while True:
+            if self._paused and not self._classes[Priority.INTERACTIVE].queue:
+                # Preempted jobs get freed slots back before new batch/background work starts
+                self._cond.notify_all()
+                return
+
+            priority = self._next_class()
+            if priority is None:
+                return
+
+            state = self._classes[priority]
+            job = state.queue.popleft()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            state.virtual_time += 1.0 / state.weight
+            self._virtual_clock = state.virtual_time
+            state.running += 1
+            state.waits_ms.append((time.monotonic() - job.submitted) * 1000)
+            self._pool.submit(self._execute, job)
+
+    def _execute(self, job: _Job) -> None:
+        self._local.job = job
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except BaseException as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        finally:
+            self._local.job = None
+            with self._cond:
+                state = self._classes[job.priority]
+                state.running -= 1
+                state.completed += 1
+                self._dispatch()
+
+    def preemption_point(self) -> None:
+        """Let interactive work go first if the current job is background work.
+
+        Called at stage boundaries. If interactive jobs are waiting, the
+        calling background job gives up its worker slot and blocks until
+        none are waiting and a slot is free again. A no-op on any other
+        thread or class.
+        """
+        job = getattr(self._local, "job", None)
+        if job is None or job.priority is not Priority.BACKGROUND:
+            return
+
+        with self._cond:
+            interactive = self._classes[Priority.INTERACTIVE]
+            if not interactive.queue or self._paused >= self.max_workers:
+                return
+
+            state = self._classes[job.priority]
+            state.running -= 1
+            self._paused += 1
+            self._dispatch()
+            self._cond.wait_for(lambda: not interactive.queue and self._may_start(job.priority))
+            self._paused -= 1
+            state.running += 1
+
+    # ==================== MONITORING ====================
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth and recent queue-wait times, overall and per class."""
+
+        def percentile(waits: list[float], p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 2)
+
+        with self._cond:
+            classes = {}
+            all_waits: list[float] = []
+            for priority, state in self._classes.items():
+                waits = sorted(state.waits_ms)
+                all_waits.extend(waits)
+                classes[priority.value] = {
+                    "weight": state.weight,
+                    "running": state.running,
+                    "queued": len(state.queue),
+                    "completed": state.completed,
+                    "rejected": state.rejected,
+                    "wait_ms_p50": percentile(waits, 0.5),
+                    "wait_ms_p95": percentile(waits, 0.95),
+                }
+            paused = self._paused
+
+        all_waits.sort()
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "interactive_reserved": self.interactive_reserved,
+            "running": sum(c["running"] for c in classes.values()),
+            "queued": sum(c["queued"] for c in classes.values()),
+            "paused": paused,
+            "completed": sum(c["completed"] for c in classes.values()),
+            "rejected": sum(c["rejected"] for c in classes.values()),
+            "wait_ms_p50": percentile(all_waits, 0.5),
+            "wait_ms_p95": percentile(all_waits, 0.95),
+            "wait_ms_max": round(all_waits[-1], 2) if all_waits else None,
+            "classes": classes,
+        }
+
+    def shutdown(self) -> None:
+        """Stop accepting work and wait for running jobs."""
+        self._pool.shutdown(wait=True)
+
+
+# Singleton instance
+cv_executor: CVExecutor = LazySingleton(CVExecutor)
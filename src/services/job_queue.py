@@ -0,0 +1,317 @@
+"""Durable local queue for asynchronous check-ins.
+
+Jobs live in a SQLite database next to the other toolkit data, and the
+uploaded image bytes are stored as files beside it. Workers (``python -m
+src.worker``) claim jobs with a time-limited lease and renew it while the
+check-in runs; a job whose worker crashed becomes claimable again once its
+lease expires. Updates to a claimed job only take effect for the worker
+holding the claim, so a worker that lost its lease can't overwrite the
+outcome of the one that took the job over.
+
+Any process that can see the data directory can enqueue or consume jobs.
+The database must be on a filesystem with working POSIX locks. With the
+default rollback journal (``job_journal_mode = "delete"``) that includes
+data directories shared between hosts; WAL is faster but needs shared
+memory, so only use it when every worker runs on the same host.
+
+Finished jobs are kept for ``job_retention_hours`` so clients can fetch the
+outcome, then deleted the next time a job is queued.
+"""
+
+import json
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ..core.config import settings
+from ..core.lazy import LazySingleton
+from ..core.models import CheckInJob, CheckInResponse, JobStatus
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    toolkit_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs (status, updated_at);
+"""
+
+
+class JobQueue:
+    """SQLite-backed queue of check-in jobs."""
+
+    def __init__(self, queue_dir: Optional[Path] = None):
+        """Initialize the queue.
+
+        Args:
+            queue_dir: Directory for the database and stored uploads
+        """
+        self.queue_dir = queue_dir or settings.toolkit_config_dir / "jobs"
+        self.uploads_dir = self.queue_dir / "uploads"
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.queue_dir / "jobs.db"
+
+        with self._connect() as conn:
+            conn.execute(f"PRAGMA journal_mode={settings.job_journal_mode.upper()}")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per operation keeps this thread- and process-safe
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_upload_path(self, job_id: str) -> Path:
+        return self.uploads_dir / f"{job_id}.bin"
+
+    def enqueue(
+        self,
+        toolkit_id: str,
+        image_data: bytes,
+        notes: Optional[str] = None,
+        checked_in_by: Optional[str] = None,
+    ) -> CheckInJob:
+        """Store an upload and queue it for check-in.
+
+        Args:
+            toolkit_id: Toolkit to check in
+            image_data: Raw uploaded image bytes
+            notes: Optional operator notes
+            checked_in_by: Optional user performing the check-in
+
+        Returns:
+            The queued job
+        """
+        self.purge_finished()
+
+        job_id = f"job_{uuid.uuid4().hex[:16]}"
+        upload_path = self.get_upload_path(job_id)
+        tmp_path = upload_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(image_data)
+        tmp_path.replace(upload_path)
+
+        now = datetime.utcnow().isoformat()
+        params = json.dumps({"notes": notes, "checked_in_by": checked_in_by})
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, toolkit_id, status, params, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, toolkit_id, JobStatus.QUEUED.value, params, now, now),
+            )
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[CheckInJob]:
+        """Get a job by ID."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def get_params(self, job_id: str) -> dict:
+        """Get the check-in parameters (notes, checked_in_by) a job was queued with."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT params FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["params"]) if row else {}
+
+    def claim(self, worker_id: str, lease_seconds: Optional[float] = None) -> Optional[CheckInJob]:
+        """Atomically claim the oldest runnable job.
+
+        Runnable means queued, or running with an expired lease (its worker
+        is presumed dead). Jobs that have used up job_max_attempts are
+        failed instead of being handed out again.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            lease_seconds: How long the claim is valid (defaults to settings)
+
+        Returns:
+            The claimed job, or None if nothing is runnable
+        """
+        lease = lease_seconds if lease_seconds is not None else settings.job_lease_seconds
+        now = datetime.utcnow()
+        now_iso = now.isoformat()
+
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so two workers can't claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                exhausted = [
+                    r["job_id"] for r in conn.execute(
+                        "SELECT job_id FROM jobs WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                        (JobStatus.RUNNING.value, now_iso, settings.job_max_attempts),
+                    )
+                ]
+                conn.executemany(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ?, lease_expires_at = NULL "
+                    "WHERE job_id = ?",
+                    [(JobStatus.FAILED.value, "Worker lease expired too many times", now_iso, job_id)
+                     for job_id in exhausted],
+                )
+                row = conn.execute(
+                    "SELECT job_id FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (JobStatus.QUEUED.value, JobStatus.RUNNING.value, now_iso),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+                        "lease_expires_at = ?, updated_at = ? WHERE job_id = ?",
+                        (JobStatus.RUNNING.value, worker_id,
+                         (now + timedelta(seconds=lease)).isoformat(), now_iso, row["job_id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        # Failed for good: nobody will read these uploads again
+        for job_id in exhausted:
+            self.get_upload_path(job_id).unlink(missing_ok=True)
+        return self.get_job(row["job_id"]) if row is not None else None
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: Optional[float] = None) -> bool:
+        """Extend a worker's claim on a running job.
+
+        Args:
+            job_id: Claimed job
+            worker_id: Worker holding the claim
+            lease_seconds: New lease from now (defaults to settings)
+
+        Returns:
+            False if the worker no longer holds the claim (it lapsed and the
+            job was claimed again, or the job was finished)
+        """
+        lease = lease_seconds if lease_seconds is not None else settings.job_lease_seconds
+        now = datetime.utcnow()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = ?",
+                ((now + timedelta(seconds=lease)).isoformat(), now.isoformat(),
+                 job_id, worker_id, JobStatus.RUNNING.value),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: CheckInResponse) -> bool:
+        """Mark a job as succeeded, store its result and drop the upload.
+
+        Returns:
+            False if the worker no longer holds the claim (nothing is changed)
+        """
+        return self._finish(job_id, worker_id, JobStatus.SUCCEEDED, result=result.model_dump_json())
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = False) -> bool:
+        """Mark a job as failed, or put it back in the queue.
+
+        Args:
+            job_id: Job to update
+            worker_id: Worker holding the claim
+            error: Failure reason
+            retry: Requeue the job if it has attempts left
+
+        Returns:
+            False if the worker no longer holds the claim (nothing is changed)
+        """
+        job = self.get_job(job_id)
+        if retry and job is not None and job.attempts < settings.job_max_attempts:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, worker_id = NULL, lease_expires_at = NULL, "
+                    "updated_at = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+                    (JobStatus.QUEUED.value, error, datetime.utcnow().isoformat(),
+                     job_id, worker_id, JobStatus.RUNNING.value),
+                )
+                return cursor.rowcount == 1
+        return self._finish(job_id, worker_id, JobStatus.FAILED, error=error)
+
+    def _finish(
+        self,
+        job_id: str,
+        worker_id: str,
+        status: JobStatus,
+        result: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires_at = NULL, "
+                "updated_at = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (status.value, result, error, datetime.utcnow().isoformat(),
+                 job_id, worker_id, JobStatus.RUNNING.value),
+            )
+            claimed = cursor.rowcount == 1
+        if not claimed:
+            return False  # Claimed by another worker meanwhile; its upload is still in use
+        self.get_upload_path(job_id).unlink(missing_ok=True)
+        return True
+
+    def purge_finished(self, max_age_seconds: Optional[float] = None) -> int:
+        """Delete succeeded and failed jobs that finished long enough ago.
+
+        Args:
+            max_age_seconds: Minimum time since the job finished
+                (defaults to job_retention_hours; 0 or less keeps all jobs)
+
+        Returns:
+            Number of jobs deleted
+        """
+        if max_age_seconds is None:
+            max_age_seconds = settings.job_retention_hours * 3600
+        if max_age_seconds <= 0:
+            return 0
+
+        cutoff = (datetime.utcnow() - timedelta(seconds=max_age_seconds)).isoformat()
+        finished = (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                job_ids = [
+                    r["job_id"] for r in conn.execute(
+                        "SELECT job_id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*finished, cutoff)
+                    )
+                ]
+                conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        # Normally gone already; left behind if a process died right after finishing the job
+        for job_id in job_ids:
+            self.get_upload_path(job_id).unlink(missing_ok=True)
+        return len(job_ids)
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> CheckInJob:
+        return CheckInJob(
+            job_id=row["job_id"],
+            toolkit_id=row["toolkit_id"],
+            status=JobStatus(row["status"]),
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+            attempts=row["attempts"],
+            worker_id=row["worker_id"],
+            result=CheckInResponse.model_validate_json(row["result"]) if row["result"] else None,
+            error=row["error"],
+        )
+
+
+# Singleton instance
+job_queue: JobQueue = LazySingleton(JobQueue)
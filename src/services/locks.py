@@ -0,0 +1,59 @@
+"""Per-key locks shared by threads and processes.
+
+Check-ins can run on several server threads, in CV worker processes and in
+standalone job workers at the same time. A KeyedLock serializes work on one
+key (a toolkit ID) across all of them: a ``threading.Lock`` per key inside
+the process, plus an exclusive ``fcntl.flock`` on a per-key lock file across
+processes. Like the job queue, this needs a filesystem with working POSIX
+locks. On platforms without ``fcntl`` only the in-process lock is taken.
+"""
+
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class KeyedLock:
+    """Exclusive, non-reentrant lock per key."""
+
+    def __init__(self, lock_dir: Path):
+        """Initialize the lock set.
+
+        Args:
+            lock_dir: Directory holding one lock file per key
+        """
+        self.lock_dir = lock_dir
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self._locks: dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _thread_lock(self, key: str) -> threading.Lock:
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """Hold the lock for ``key`` for the duration of the block.
+
+        Threads of this process queue on the in-process lock first, so at
+        most one file descriptor per key is ever blocked in flock.
+        """
+        with self._thread_lock(key):
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_dir / f"{key}.lock", "a") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
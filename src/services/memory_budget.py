@@ -0,0 +1,285 @@
+"""Memory-budget admission for check-ins.
+
+Peak memory of a check-in is dominated by full-resolution buffers: the
+encoded upload, the decoded frame and what ArUco detection derives from
+it. After registration everything is canonical-sized: the warped frame,
+the annotation copies, the encoded annotated image and its base64 text.
+The peak is estimated from the image header before anything is decoded,
+and check-ins are admitted while the sum of in-flight estimates fits the
+budget. Oversized uploads are decoded at reduced resolution, or
+rejected, depending on ``oversize_policy``. Only JPEGs are reduced inside
+the decoder; other formats still pass through a full-size frame, so
+reduction doesn't bring their peak down much.
+
+Actual use is measured as growth of the process's resident set, sampled at
+stage boundaries. It is process-wide, so concurrent check-ins inflate each
+other's numbers. For tuning, compare it with the estimate under light load.
+"""
+
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from ..core.config import settings
+from ..core.lazy import LazySingleton
+from .cv_executor import ExecutorSaturated
+
+# Bytes per pixel: 3 (BGR) for the decoded frame, plus grayscale and
+# thresholded copies made by ArUco marker detection
+FRAME_BYTES_PER_PIXEL = 6.0
+# Bytes per pixel of the full-size frame that non-JPEG formats are decoded
+# to before being shrunk to a reduced resolution
+FULL_DECODE_BYTES_PER_PIXEL = 3.0
+# Bytes per canonical pixel: warped frame, two annotation copies, the
+# encoded annotated image and its base64 text (PNG at worst)
+CANONICAL_BYTES_PER_PIXEL = 13.0
+# Decoded-to-encoded size ratio assumed when the header can't be read
+FALLBACK_EXPANSION = 12
+# Number of recent measured/estimated ratios kept for the stats endpoint
+RATIO_SAMPLE_SIZE = 256
+
+
+class MemoryBudgetExceeded(ExecutorSaturated):
+    """Raised when in-flight check-ins leave no room for another one."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after, "Memory budget is exhausted, retry later")
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload can't fit the memory budget even downscaled."""
+
+
+@dataclass
+class MemoryPlan:
+    """How a check-in will be decoded and what it is expected to cost."""
+    width: Optional[int]
+    height: Optional[int]
+    reduce_factor: int
+    estimated_bytes: int
+    downscaled: bool = False  # Reduced below the target resolution to fit the budget
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemoryMeter:
+    """Tracks the peak RSS growth over a check-in (sampled at stage boundaries)."""
+
+    def __init__(self):
+        self.baseline = current_rss()
+        self.peak = self.baseline
+
+    def sample(self) -> None:
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    @property
+    def peak_delta(self) -> Optional[int]:
+        if self.baseline is None or self.peak is None:
+            return None
+        return self.peak - self.baseline
+
+
+def estimate_checkin_bytes(
+    encoded_bytes: int,
+    size: Optional[tuple[int, int]],
+    canonical_size: tuple[int, int],
+    reduce_factor: int = 1,
+    scaled_decode: bool = True,
+) -> int:
+    """Estimate the peak memory of one check-in.
+
+    Args:
+        encoded_bytes: Size of the upload
+        size: (width, height) from the image header, or None if unknown
+        canonical_size: (width, height) of the template's canonical space
+        reduce_factor: Downscale applied while decoding
+        scaled_decode: Whether the decoder itself works at the reduced size
+            (JPEG); other formats are decoded at full size and then shrunk
+
+    Returns:
+        Estimated peak bytes
+    """
+    if size is None:
+        # Unknown format: no reduction inside the decoder can be assumed
+        frame = encoded_bytes * FALLBACK_EXPANSION
+    else:
+        width, height = size
+        frame = (width // reduce_factor) * (height // reduce_factor) * FRAME_BYTES_PER_PIXEL
+        if reduce_factor > 1 and not scaled_decode:
+            frame += width * height * FULL_DECODE_BYTES_PER_PIXEL
+    canonical = canonical_size[0] * canonical_size[1] * CANONICAL_BYTES_PER_PIXEL
+    return int(encoded_bytes + frame + canonical)
+
+
+class MemoryBudget:
+    """Admits check-ins while their estimated peak memory fits a global budget."""
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        """Initialize the budget.
+
+        Args:
+            budget_bytes: Memory allowed for in-flight check-ins (defaults to the
+                resource governor's layout)
+        """
+        if budget_bytes is None:
+            from .resource_governor import resource_governor
+            budget_bytes = resource_governor.layout.memory_budget_bytes
+        self.budget_bytes = budget_bytes
+        self.max_request_bytes = int(budget_bytes * settings.memory_max_request_fraction)
+
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self._in_flight = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._downscaled = 0
+        self._too_large = 0
+        self._ratios: deque[float] = deque(maxlen=RATIO_SAMPLE_SIZE)
+
+    def plan(
+        self,
+        data: bytes,
+        canonical_size: tuple[int, int],
+        target_size: Optional[tuple[int, int]] = None,
+    ) -> MemoryPlan:
+        """Choose a decode resolution for an upload and estimate its cost.
+
+        Args:
+            data: Encoded upload
+            canonical_size: (width, height) of the template's canonical space
+            target_size: (width, height) the upload is needed at; it is decoded
+                at the largest reduction that still covers this
+
+        Returns:
+            The plan (downscaled if it had to go below the target to fit)
+
+        Raises:
+            ImageTooLarge: If the upload is over the per-request limit and
+                can't or may not be downscaled to fit
+        """
+        from PIL import Image
+        from ..utils.image_utils import REDUCED_DECODE_FLAGS, choose_reduce_factor, read_image_header
+
+        try:
+            header = read_image_header(data)
+        except Image.DecompressionBombError as e:
+            with self._lock:
+                self._too_large += 1
+            raise ImageTooLarge(f"Image has too many pixels to process: {e}")
+        size = (header.width, header.height) if header else None
+        width, height = size if size else (None, None)
+        scaled_decode = header is not None and header.scaled_decode
+
+        base = choose_reduce_factor(size, target_size) if size and target_size else 1
+        factors = [factor for factor in REDUCED_DECODE_FLAGS if factor >= base]
+        if settings.oversize_policy != "downscale":
+            factors = factors[:1]
+        for factor in factors:
+            estimate = estimate_checkin_bytes(len(data), size, canonical_size, factor, scaled_decode)
+            if estimate <= self.max_request_bytes:
+                if factor > base:
+                    with self._lock:
+                        self._downscaled += 1
+                return MemoryPlan(width, height, factor, estimate, downscaled=factor > base)
+
+        with self._lock:
+            self._too_large += 1
+        dimensions = f"{width}x{height}" if size else f"{len(data)}-byte"
+        raise ImageTooLarge(
+            f"A {dimensions} image needs about {estimate // 2**20} MB to process, "
+            f"more than the {self.max_request_bytes // 2**20} MB allowed per check-in"
+        )
+
+    def combine(self, plans: list[MemoryPlan]) -> MemoryPlan:
+        """Plan for uploads processed together (e.g. the layers of one check-in).
+
+        Each upload is held to the per-request limit by ``plan``; together
+        they only have to fit the whole budget.
+
+        Raises:
+            ImageTooLarge: If they could never be admitted together
+        """
+        total = MemoryPlan(
+            width=None,
+            height=None,
+            reduce_factor=max(p.reduce_factor for p in plans),
+            estimated_bytes=sum(p.estimated_bytes for p in plans),
+            downscaled=any(p.downscaled for p in plans),
+        )
+        if total.estimated_bytes > self.budget_bytes:
+            with self._lock:
+                self._too_large += 1
+            raise ImageTooLarge(
+                f"{len(plans)} images need about {total.estimated_bytes // 2**20} MB to process, "
+                f"more than the {self.budget_bytes // 2**20} MB memory budget"
+            )
+        return total
+
+    @contextmanager
+    def reserve(self, nbytes: int) -> Iterator[None]:
+        """Hold ``nbytes`` of the budget for the duration of the block.
+
+        Raises:
+            MemoryBudgetExceeded: If in-flight check-ins leave too little room
+        """
+        with self._lock:
+            if self._reserved + nbytes > self.budget_bytes:
+                self._rejected += 1
+                raise MemoryBudgetExceeded(settings.cv_executor_retry_after_seconds)
+            self._reserved += nbytes
+            self._in_flight += 1
+            self._admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._reserved -= nbytes
+                self._in_flight -= 1
+
+    def record(self, plan: MemoryPlan, meter: MemoryMeter) -> None:
+        """Keep the measured/estimated ratio of a finished check-in for stats."""
+        delta = meter.peak_delta
+        if delta is not None and plan.estimated_bytes:
+            with self._lock:
+                self._ratios.append(delta / plan.estimated_bytes)
+
+    def stats(self) -> dict:
+        """Budget usage and how measured peaks compare with estimates."""
+        with self._lock:
+            ratios = sorted(self._ratios)
+            stats = {
+                "budget_bytes": self.budget_bytes,
+                "max_request_bytes": self.max_request_bytes,
+                "reserved_bytes": self._reserved,
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "downscaled": self._downscaled,
+                "too_large": self._too_large,
+            }
+
+        def percentile(p: float) -> Optional[float]:
+            if not ratios:
+                return None
+            return round(ratios[min(len(ratios) - 1, int(p * len(ratios)))], 3)
+
+        stats["measured_to_estimated_p50"] = percentile(0.5)
+        stats["measured_to_estimated_p95"] = percentile(0.95)
+        return stats
+
+
+# Singleton instance
+memory_budget: MemoryBudget = LazySingleton(MemoryBudget)
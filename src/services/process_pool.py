@@ -0,0 +1,328 @@
+"""Process-pool backend for the CV stage of check-ins.
+
+Threads already overlap the OpenCV kernels, but detection bookkeeping and
+result assembly hold the GIL. With ``cv_backend = "process"`` the CV stage
+(registration, reference selection, analysis) runs in a farm of worker
+processes instead:
+
+- Decoded frames are handed over through ``multiprocessing.shared_memory``;
+  only the segment name, shape and dtype are pickled, and the worker maps
+  the parent's buffer directly.
+- Each worker keeps its own template_service, so compiled templates stay
+  warm and reference arrays are memory-mapped from the shared on-disk
+  reference store.
+- Results come back as a few small NumPy arrays (status codes, confidences,
+  a debug-metric matrix) and are rebuilt into pydantic models in the parent.
+- A check-in's remaining latency budget is passed along and the worker
+  degrades against it. Client disconnects are not forwarded; the parent
+  checks for them once the worker returns.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Optional
+
+from ..core.config import settings
+from ..core.deadline import Deadline
+from ..core.lazy import LazySingleton
+from ..core.models import (
+    AnalysisResult,
+    AnalysisSummary,
+    Degradation,
+    RegistrationInfo,
+    Toolkit,
+    ToolkitTemplate,
+    ToolAnalysisResult,
+    ToolStatus,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+    from .template_service import CompiledTemplate
+    from .toolkit_instance_service import FrameAnalysis
+
+
+STATUS_CODES = {ToolStatus.PRESENT: 0, ToolStatus.MISSING: 1, ToolStatus.UNCERTAIN: 2}
+STATUS_BY_CODE = {code: status for status, code in STATUS_CODES.items()}
+
+# Debug metrics packed as matrix columns (NaN = not reported for that slot)
+DEBUG_KEYS = (
+    "brightness_ratio",
+    "saturation_ratio",
+    "edge_density",
+    "mean_brightness",
+    "mean_saturation",
+    "ssim_score",
+    "histogram_correlation",
+    "normalized_diff",
+    "change_score",
+)
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment owned (and unlinked) by the parent.
+
+    Spawned workers share the parent's resource tracker, so on versions
+    without ``track`` the extra registration is a no-op and the parent's
+    unlink clears it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def pack_analysis(analysis: AnalysisResult) -> dict:
+    """Pack an AnalysisResult into compact arrays for the trip back to the parent."""
+    import numpy as np
+
+    count = len(analysis.tools)
+    statuses = np.empty(count, dtype=np.int8)
+    confidences = np.empty(count, dtype=np.float64)
+    carried = np.zeros(count, dtype=bool)
+    debug = np.full((count, len(DEBUG_KEYS)), np.nan, dtype=np.float64)
+    has_debug = np.zeros(count, dtype=bool)
+
+    for i, tool in enumerate(analysis.tools):
+        statuses[i] = STATUS_CODES[tool.status]
+        confidences[i] = tool.confidence
+        carried[i] = tool.carried_over
+        if tool.debug_info is not None:
+            has_debug[i] = True
+            for j, key in enumerate(DEBUG_KEYS):
+                if key in tool.debug_info:
+                    debug[i, j] = tool.debug_info[key]
+
+    registration = analysis.registration
+    return {
+        "status": analysis.status,
+        "statuses": statuses,
+        "confidences": confidences,
+        "carried": carried,
+        "debug": debug,
+        "has_debug": has_debug,
+        "registration": (
+            registration.markers_detected,
+            registration.homography_applied,
+            registration.fallback_reason,
+        ) if registration else None,
+        "image_annotated": analysis.image_annotated,
+        "thumbnail": analysis.thumbnail,
+    }
+
+
+def unpack_analysis(packed: dict, compiled: "CompiledTemplate") -> AnalysisResult:
+    """Rebuild an AnalysisResult from packed arrays.
+
+    Tool ids, names and slot indices come from the compiled template, whose
+    tool order the worker's results follow.
+    """
+    import numpy as np
+
+    toolkit_config = compiled.toolkit_config
+    tools = []
+    for i, tool in enumerate(toolkit_config.tools):
+        debug_info = None
+        if packed["has_debug"][i]:
+            row = packed["debug"][i]
+            debug_info = {key: float(row[j]) for j, key in enumerate(DEBUG_KEYS) if not np.isnan(row[j])}
+        tools.append(ToolAnalysisResult(
+            tool_id=tool.tool_id,
+            name=tool.name,
+            slot_index=tool.slot_index,
+            status=STATUS_BY_CODE[int(packed["statuses"][i])],
+            confidence=float(packed["confidences"][i]),
+            debug_info=debug_info,
+            carried_over=bool(packed["carried"][i]),
+        ))
+
+    statuses = packed["statuses"]
+    registration = None
+    if packed["registration"] is not None:
+        markers_detected, homography_applied, fallback_reason = packed["registration"]
+        registration = RegistrationInfo(
+            markers_detected=markers_detected,
+            markers_expected=4,
+            homography_applied=homography_applied,
+            fallback_reason=fallback_reason,
+        )
+
+    return AnalysisResult(
+        toolkit_id=toolkit_config.toolkit_id,
+        toolkit_name=toolkit_config.name,
+        status=packed["status"],
+        tools=tools,
+        summary=AnalysisSummary(
+            total_tools=len(tools),
+            present=int(np.count_nonzero(statuses == STATUS_CODES[ToolStatus.PRESENT])),
+            missing=int(np.count_nonzero(statuses == STATUS_CODES[ToolStatus.MISSING])),
+            uncertain=int(np.count_nonzero(statuses == STATUS_CODES[ToolStatus.UNCERTAIN])),
+        ),
+        registration=registration,
+        image_annotated=packed["image_annotated"],
+        thumbnail=packed["thumbnail"],
+    )
+
+
+# ==================== WORKER SIDE ====================
+
+def _init_worker(opencv_threads: int, blas_threads: int) -> None:
+    """Import the CV stack and compile known templates once per worker."""
+    from .resource_governor import apply_thread_limits
+
+    # Each worker's share of the CPUs: parallelism comes mostly from the processes.
+    # Set before the CV stack loads so OpenCV and BLAS size their pools from it.
+    apply_thread_limits(opencv_threads, blas_threads)
+
+    from .template_service import template_service
+
+    for template in template_service.list_templates():
+        try:
+            for compiled in template_service.compile_all(template):
+                template_service.get_all_reference_data(compiled)
+        except Exception:
+            continue  # Broken templates fail on use, not at worker start
+
+
+def _analyze_in_worker(
+    template_json: str,
+    toolkit_json: str,
+    frame_name: str,
+    frame_shape: tuple[int, ...],
+    frame_dtype: str,
+    budget_seconds: Optional[float] = None,
+    layer_id: Optional[str] = None,
+    lazy_annotation: bool = False,
+) -> tuple[dict, Optional[str], Optional[dict], list[str]]:
+    """Worker entry point: analyze a frame that lives in shared memory."""
+    import numpy as np
+    from .template_service import template_service
+    from .toolkit_instance_service import toolkit_instance_service
+
+    template = ToolkitTemplate.model_validate_json(template_json)
+    toolkit = Toolkit.model_validate_json(toolkit_json)
+    compiled = template_service.compile_template(template, layer_id)
+    deadline = Deadline(budget_seconds)
+
+    shm = _attach_shared_memory(frame_name)
+    image = None
+    try:
+        image = np.ndarray(frame_shape, dtype=np.dtype(frame_dtype), buffer=shm.buf)
+        frame = toolkit_instance_service.analyze_frame(toolkit, compiled, image, deadline, lazy_annotation)
+    finally:
+        image = None  # Release the buffer export before closing the mapping
+        try:
+            shm.close()
+        except BufferError:
+            pass  # A traceback still references the frame; closed when it is collected
+
+    degradations = [d.value for d in deadline.degradations]
+    return pack_analysis(frame.analysis), frame.reference_id, frame.signatures, degradations
+
+
+# ==================== PARENT SIDE ====================
+
+class CVProcessPool:
+    """Farm of warm worker processes running the CV stage of check-ins."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """Initialize the pool (workers are spawned on first use).
+
+        Args:
+            max_workers: Worker processes (defaults to settings, 0 = effective CPU count)
+        """
+        from .resource_governor import resource_governor
+
+        layout = resource_governor.layout
+        if max_workers is None:
+            max_workers = settings.cv_process_workers or layout.effective_cpus
+        self.max_workers = max_workers
+        self._thread_limits = (layout.opencv_threads, layout.blas_threads)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: the server process has threads, so forking it is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=self._thread_limits,
+                    )
+        return self._executor
+
+    def analyze_frame(
+        self,
+        toolkit: Toolkit,
+        compiled: "CompiledTemplate",
+        image: "np.ndarray",
+        deadline: Optional[Deadline] = None,
+        lazy_annotation: bool = False,
+    ) -> "FrameAnalysis":
+        """Run ToolkitInstanceService.analyze_frame in a worker process.
+
+        Blocks the calling thread (a CV executor thread) until the worker is
+        done. Degradations applied by the worker are added to ``deadline``.
+
+        Raises:
+            ValueError: If the ArUco markers could not be registered
+            CheckInAborted: If the deadline expired in the worker
+        """
+        import numpy as np
+        from .toolkit_instance_service import FrameAnalysis
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        try:
+            # Single memcpy into the shared segment; nothing else crosses the pipe
+            shared = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+            shared[...] = image
+            del shared
+
+            future = self.executor.submit(
+                _analyze_in_worker,
+                compiled.template.model_dump_json(),
+                toolkit.model_dump_json(),
+                shm.name,
+                image.shape,
+                image.dtype.str,
+                deadline.remaining() if deadline is not None and deadline.expires_at is not None else None,
+                compiled.layer_id,
+                lazy_annotation,
+            )
+            packed, reference_id, signatures, degradations = future.result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        if deadline is not None:
+            for degradation in degradations:
+                deadline.degrade(Degradation(degradation))
+
+        return FrameAnalysis(
+            analysis=unpack_analysis(packed, compiled),
+            reference_id=reference_id,
+            signatures=signatures,
+        )
+
+    def warm(self) -> None:
+        """Start all workers now instead of on the first check-in."""
+        futures = [self.executor.submit(os.getpid) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Singleton instance
+cv_process_pool: CVProcessPool = LazySingleton(CVProcessPool)
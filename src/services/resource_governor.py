@@ -0,0 +1,230 @@
+"""CPU and memory layout for the CV stack.
+
+Concurrent check-ins, OpenCV's internal thread pool and BLAS threads all
+draw from the same CPUs. Left alone each sizes itself to the whole host (or
+ignores the container's CPU quota), and together they oversubscribe the
+machine, which hurts tail latency. The governor works out how many CPUs this
+process may actually use (affinity mask and cgroup quota), sizes the CV
+executor and process pool from that, and gives each concurrent job an equal
+share of OpenCV and BLAS threads. It also derives the memory budget for
+in-flight check-ins from the cgroup memory limit (or physical RAM).
+
+Thread counts are applied through environment variables read when OpenCV
+and the BLAS libraries load (so nothing heavy is imported here), and
+directly if those modules are already loaded.
+"""
+
+import logging
+import math
+import os
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import settings
+from ..core.lazy import LazySingleton
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # Optional: only needed to re-limit BLAS after NumPy has loaded
+    threadpool_limits = None
+
+logger = logging.getLogger("toolkit.resources")
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# Read by OpenBLAS, MKL, Accelerate and OpenMP runtimes when they load
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+# Read by OpenCV when it creates its parallel_for pool
+OPENCV_ENV_VAR = "OPENCV_FOR_THREADS_NUM"
+
+# Share of the memory limit in-flight check-ins may use by default; the rest
+# is for the interpreter, caches, memory-mapped references and headroom
+DEFAULT_MEMORY_BUDGET_FRACTION = 0.5
+FALLBACK_MEMORY_BUDGET_BYTES = 1024 * 1024 * 1024
+
+
+@dataclass
+class ResourceLayout:
+    """Effective CPU and memory budget, and the thread counts of this process."""
+    host_cpus: int
+    affinity_cpus: int
+    cgroup_cpu_limit: Optional[float]  # CPUs allowed by the cgroup quota (None = unlimited)
+    effective_cpus: int
+    backend: str
+    executor_workers: int  # Concurrent CV jobs in this process
+    process_workers: Optional[int]  # Worker processes (process backend only)
+    opencv_threads: int  # OpenCV threads per process doing CV work
+    blas_threads: int  # BLAS threads per process doing CV work
+    memory_limit_bytes: Optional[int]  # cgroup memory limit, else physical RAM (None = unknown)
+    memory_budget_bytes: int  # Estimated peak memory allowed for in-flight check-ins
+
+
+def read_cgroup_cpu_limit(root: Path = CGROUP_ROOT) -> Optional[float]:
+    """CPU limit from the cgroup quota (v2 ``cpu.max`` or v1 CFS files).
+
+    Returns:
+        Allowed CPUs (may be fractional), or None if there is no quota
+    """
+    try:
+        quota, period = (root / "cpu.max").read_text().split()[:2]
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    for v1_dir in (root / "cpu", root / "cpu,cpuacct"):
+        try:
+            quota = int((v1_dir / "cpu.cfs_quota_us").read_text())
+            period = int((v1_dir / "cpu.cfs_period_us").read_text())
+        except (OSError, ValueError):
+            continue
+        return quota / period if quota > 0 and period > 0 else None
+
+    return None
+
+
+def read_cgroup_memory_limit(root: Path = CGROUP_ROOT) -> Optional[int]:
+    """Memory limit from the cgroup (v2 ``memory.max`` or v1 ``limit_in_bytes``).
+
+    Returns:
+        Limit in bytes, or None if there is none
+    """
+    for path in (root / "memory.max", root / "memory" / "memory.limit_in_bytes"):
+        try:
+            value = path.read_text().strip()
+        except OSError:
+            continue
+        if value == "max":
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            continue
+        # cgroup v1 reports "unlimited" as a huge page-aligned number
+        return limit if limit < 1 << 60 else None
+    return None
+
+
+def physical_memory() -> Optional[int]:
+    """Installed RAM in bytes (None if the platform doesn't say)."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def affinity_cpu_count() -> int:
+    """CPUs this process may be scheduled on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def compute_layout(concurrent_jobs: Optional[int] = None) -> ResourceLayout:
+    """Work out worker counts and per-job thread counts from settings and the host.
+
+    Args:
+        concurrent_jobs: CV jobs this process runs at once (defaults to the
+            CV executor's worker count)
+
+    Returns:
+        The layout to apply
+    """
+    host_cpus = os.cpu_count() or 1
+    affinity_cpus = affinity_cpu_count()
+    cgroup_limit = read_cgroup_cpu_limit()
+    effective = affinity_cpus
+    if cgroup_limit is not None:
+        effective = min(effective, max(1, math.ceil(cgroup_limit)))
+
+    backend = settings.cv_backend
+    executor_workers = settings.cv_executor_workers
+    if not executor_workers:
+        # The thread backend gains little past 4 concurrent frames; the process
+        # backend's executor threads just wait on the worker farm
+        executor_workers = effective if backend == "process" else min(4, effective)
+
+    process_workers = None
+    if backend == "process":
+        process_workers = settings.cv_process_workers or effective
+        # Each worker process analyzes one frame at a time
+        jobs = process_workers
+    else:
+        jobs = concurrent_jobs or executor_workers
+
+    share = max(1, effective // jobs)
+
+    memory_limit = read_cgroup_memory_limit() or physical_memory()
+    if settings.memory_budget_mb:
+        memory_budget = settings.memory_budget_mb * 1024 * 1024
+    elif memory_limit:
+        memory_budget = int(memory_limit * DEFAULT_MEMORY_BUDGET_FRACTION)
+    else:
+        memory_budget = FALLBACK_MEMORY_BUDGET_BYTES
+
+    return ResourceLayout(
+        host_cpus=host_cpus,
+        affinity_cpus=affinity_cpus,
+        cgroup_cpu_limit=cgroup_limit,
+        effective_cpus=effective,
+        backend=backend,
+        executor_workers=executor_workers,
+        process_workers=process_workers,
+        opencv_threads=settings.cv_opencv_threads or share,
+        blas_threads=settings.cv_blas_threads or share,
+        memory_limit_bytes=memory_limit,
+        memory_budget_bytes=memory_budget,
+    )
+
+
+def apply_thread_limits(opencv_threads: int, blas_threads: int) -> None:
+    """Limit OpenCV and BLAS threads for this process and the ones it spawns."""
+    os.environ[OPENCV_ENV_VAR] = str(opencv_threads)
+    for name in BLAS_ENV_VARS:
+        os.environ[name] = str(blas_threads)
+
+    # Already loaded: the environment is no longer consulted
+    if "cv2" in sys.modules:
+        sys.modules["cv2"].setNumThreads(opencv_threads)
+    if "numpy" in sys.modules and threadpool_limits is not None:
+        threadpool_limits(limits=blas_threads, user_api="blas")
+
+
+class ResourceGovernor:
+    """Computes and applies the process's resource layout."""
+
+    def __init__(self, concurrent_jobs: Optional[int] = None):
+        """Initialize the governor.
+
+        Args:
+            concurrent_jobs: CV jobs this process runs at once (defaults to the
+                CV executor's worker count; 1 for a standalone job worker)
+        """
+        self.layout = compute_layout(concurrent_jobs)
+        self.applied = False
+
+    def apply(self) -> ResourceLayout:
+        """Apply the thread limits (idempotent) and log the layout."""
+        if not self.applied:
+            apply_thread_limits(self.layout.opencv_threads, self.layout.blas_threads)
+            self.applied = True
+            logger.info("CPU layout: %s", self.describe())
+        return self.layout
+
+    def describe(self) -> dict:
+        """Layout as a plain dict (for logs and the API)."""
+        return asdict(self.layout)
+
+
+# Singleton instance
+resource_governor: ResourceGovernor = LazySingleton(ResourceGovernor)
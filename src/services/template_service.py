@@ -1,14 +1,65 @@
 import json
 import base64
+import hashlib
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
-
-import cv2
-import numpy as np
+from typing import TYPE_CHECKING, Optional, Union
 
 from ..core.config import settings
-from ..core.models import ToolkitTemplate, CreateTemplateRequest, ToolDefinition, ArucoMarkerBounds
+from ..core.lazy import LazySingleton
+from ..core.models import (
+    ToolkitTemplate,
+    CreateTemplateRequest,
+    ToolDefinition,
+    ArucoMarkerBounds,
+    ToolkitConfig,
+    ROI,
+    ReferenceImage,
+    TemplateLayer,
+    DEFAULT_REFERENCE_ID,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+    from ..cv.geometry import SlotGeometry
+    from ..cv.reference_store import ReferenceStore, ReferenceData
+    from ..cv.registration import ToolkitRegistration
+
+
+@dataclass
+class CompiledTemplate:
+    """A template transformed into canonical (registered) space for analysis."""
+    template: ToolkitTemplate
+    version: str  # Content fingerprint of the template this was compiled from
+    canonical_size: tuple[int, int]
+    toolkit_config: ToolkitConfig  # Tools with ROIs in canonical space
+    geometries: dict[str, "SlotGeometry"] = field(default_factory=dict)  # tool_id → canonical geometry
+    layer_id: Optional[str] = None  # Layer this was compiled from (None for a single-image template)
+    # reference_id → (image path, reference-store key), filled on first use
+    reference_keys: dict[str, tuple[Path, str]] = field(default_factory=dict)
+
+    @property
+    def store_id(self) -> str:
+        """Key of this template (or layer) in the reference store."""
+        if self.layer_id is None:
+            return self.template.template_id
+        return f"{self.template.template_id}/{self.layer_id}"
+
+    @property
+    def registration(self) -> "ToolkitRegistration":
+        """Registration into this template's canonical space (pooled per thread)."""
+        from ..cv.registration import get_registration
+
+        return get_registration(
+            dictionary=settings.aruco_dictionary,
+            marker_ids=settings.aruco_marker_ids,
+            canonical_size=self.canonical_size,
+            min_markers_for_homography=settings.aruco_min_markers,
+        )
 
 
 class TemplateService:
@@ -17,8 +68,20 @@ class TemplateService:
     def __init__(self, config_dir: Optional[Path] = None):
         self.config_dir = config_dir or settings.toolkit_config_dir / "templates"
         self.images_dir = self.config_dir / "images"
+        self.cache_dir = self.config_dir / "cache"
         self.config_dir.mkdir(parents=True, exist_ok=True)
         self.images_dir.mkdir(parents=True, exist_ok=True)
+        self._reference_store: Optional["ReferenceStore"] = None
+        self._compiled: dict[tuple[str, Optional[str]], CompiledTemplate] = {}  # (template_id, layer_id) → compiled
+        self._compiled_lock = threading.Lock()
+
+    @property
+    def reference_store(self) -> "ReferenceStore":
+        """Memory-mapped reference store (created on first use)."""
+        if self._reference_store is None:
+            from ..cv.reference_store import ReferenceStore
+            self._reference_store = ReferenceStore(self.cache_dir)
+        return self._reference_store
 
     def _get_config_path(self, template_id: str) -> Path:
         return self.config_dir / f"{template_id}.json"
@@ -26,6 +89,12 @@ class TemplateService:
     def _get_image_path(self, template_id: str) -> Path:
         return self.images_dir / f"{template_id}.png"
 
+    def _get_reference_image_path(self, template_id: str, reference_id: str) -> Path:
+        return self.images_dir / template_id / f"{reference_id}.png"
+
+    def _get_layer_image_path(self, template_id: str, layer_id: str) -> Path:
+        return self.images_dir / template_id / "layers" / f"{layer_id}.png"
+
     def list_templates(self) -> list[ToolkitTemplate]:
         """List all available templates."""
         templates = []
@@ -54,13 +123,6 @@ class TemplateService:
         if config_path.exists():
             raise ValueError(f"Template '{request.template_id}' already exists")
 
-        # Auto-assign slot_index if not set
-        tools = []
-        for i, tool in enumerate(request.tools):
-            tool_data = tool.model_dump()
-            tool_data["slot_index"] = i
-            tools.append(ToolDefinition(**tool_data))
-
         now = datetime.utcnow()
         template = ToolkitTemplate(
             template_id=request.template_id,
@@ -69,11 +131,14 @@ class TemplateService:
             foam_color=request.foam_color,
             image_width=request.image_width,
             image_height=request.image_height,
-            tools=tools,
+            tools=request.tools,
+            layers=request.layers,
             created_at=now,
             updated_at=now,
         )
 
+        # Auto-assign slot_index if not set
+        self._normalize_tools(template)
         self._save_template(template)
         return template
 
@@ -83,24 +148,53 @@ class TemplateService:
         if not config_path.exists():
             raise ValueError(f"Template '{template.template_id}' not found")
 
-        # Preserve aruco_bounds from existing template if not provided
+        # Preserve aruco_bounds and reference images from existing template if not provided
+        existing = self.get_template(template.template_id)
         if template.aruco_bounds is None:
-            existing = self.get_template(template.template_id)
             if existing and existing.aruco_bounds:
                 template.aruco_bounds = existing.aruco_bounds
+        if "reference_images" not in template.model_fields_set and existing:
+            template.reference_images = existing.reference_images
+        for layer in template.layers:
+            existing_layer = existing.get_layer(layer.layer_id) if existing else None
+            if layer.aruco_bounds is None and existing_layer:
+                layer.aruco_bounds = existing_layer.aruco_bounds
+                layer.image_width = layer.image_width or existing_layer.image_width
+                layer.image_height = layer.image_height or existing_layer.image_height
 
         # Ensure slot_index values are consistent
-        tools = []
-        for i, tool in enumerate(template.tools):
-            tool_data = tool.model_dump()
-            tool_data["slot_index"] = i
-            tools.append(ToolDefinition(**tool_data))
-        template.tools = tools
+        self._normalize_tools(template)
 
         template.updated_at = datetime.utcnow()
         self._save_template(template)
         return template
 
+    @staticmethod
+    def _normalize_tools(template: ToolkitTemplate) -> None:
+        """Validate layers and number tool slots (across all layers).
+
+        Raises:
+            ValueError: If layer or tool IDs repeat, or a layered template
+                also has top-level tools
+        """
+        if template.layers and template.tools:
+            raise ValueError("A template with layers defines its tools per layer")
+        layer_ids = [layer.layer_id for layer in template.layers]
+        if len(set(layer_ids)) != len(layer_ids):
+            raise ValueError("Layer IDs must be unique within a template")
+        tool_ids = [tool.tool_id for tool in template.all_tools]
+        if template.layers and len(set(tool_ids)) != len(tool_ids):
+            raise ValueError("Tool IDs must be unique across the layers of a template")
+
+        def numbered(tools: list[ToolDefinition], start: int) -> list[ToolDefinition]:
+            return [tool.model_copy(update={"slot_index": start + i}) for i, tool in enumerate(tools)]
+
+        template.tools = numbered(template.tools, 0)
+        start = 0
+        for layer in template.layers:
+            layer.tools = numbered(layer.tools, start)
+            start += len(layer.tools)
+
     def delete_template(self, template_id: str) -> bool:
         """Delete a template and its image."""
         config_path = self._get_config_path(template_id)
@@ -109,10 +203,13 @@ class TemplateService:
 
         config_path.unlink()
 
-        # Also delete the image if it exists
+        # Also delete the images if they exist
         image_path = self._get_image_path(template_id)
         if image_path.exists():
             image_path.unlink()
+        shutil.rmtree(self.images_dir / template_id, ignore_errors=True)
+
+        self.reference_store.invalidate(template_id)
 
         return True
 
@@ -129,48 +226,88 @@ class TemplateService:
         with open(image_path, "wb") as f:
             f.write(image_data)
 
+        self.reference_store.invalidate(template_id, DEFAULT_REFERENCE_ID)
+
         # Try to detect ArUco markers and update template
-        self._detect_and_save_aruco_bounds(template_id, image_path)
+        detected = self._detect_aruco_bounds(image_path)
+        template = self.get_template(template_id)
+        if template:
+            if detected:
+                template.aruco_bounds, template.image_width, template.image_height = detected
+            # A new image is a new template version (see get_reference_data)
+            template.updated_at = datetime.utcnow()
+            self._save_template(template)
+
+        return image_path
+
+    def save_layer_image(self, template_id: str, layer_id: str, image_data: bytes) -> Path:
+        """Save a layer's reference image and detect its ArUco markers.
+
+        Raises:
+            ValueError: If the template or layer doesn't exist
+        """
+        template = self.get_template(template_id)
+        if not template:
+            raise ValueError(f"Template '{template_id}' not found")
+        if not template.get_layer(layer_id):
+            raise ValueError(f"Layer '{layer_id}' not found in template '{template_id}'")
+
+        image_path = self._get_layer_image_path(template_id, layer_id)
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(image_path, "wb") as f:
+            f.write(image_data)
+
+        self.reference_store.invalidate(f"{template_id}/{layer_id}")
+
+        detected = self._detect_aruco_bounds(image_path)
+        template = self.get_template(template_id)
+        layer = template.get_layer(layer_id) if template else None
+        if layer:
+            if detected:
+                layer.aruco_bounds, layer.image_width, layer.image_height = detected
+            template.updated_at = datetime.utcnow()
+            self._save_template(template)
 
         return image_path
 
-    def _detect_and_save_aruco_bounds(self, template_id: str, image_path: Path) -> None:
-        """Detect ArUco markers in image and save bounds to template."""
+    def _detect_aruco_bounds(self, image_path: Path) -> Optional[tuple[ArucoMarkerBounds, int, int]]:
+        """Detect the ArUco markers of a reference image.
+
+        Returns:
+            Tuple of (bounds, image width, image height), or None unless all
+            4 markers were found
+        """
         try:
-            from ..cv.registration import ToolkitRegistration
+            import cv2
+            from ..cv.registration import get_registration
 
             # Load image
             image = cv2.imread(str(image_path))
             if image is None:
-                return
+                return None
 
             # Detect markers
-            registration = ToolkitRegistration(
+            registration = get_registration(
                 dictionary=settings.aruco_dictionary,
                 marker_ids=settings.aruco_marker_ids,
             )
             markers = registration.detect_markers(image)
 
-            # If all 4 markers found, save bounds
-            if markers.all_found:
-                bounds = ArucoMarkerBounds(
-                    top_left=(markers.centers[0][0], markers.centers[0][1]),
-                    top_right=(markers.centers[1][0], markers.centers[1][1]),
-                    bottom_right=(markers.centers[2][0], markers.centers[2][1]),
-                    bottom_left=(markers.centers[3][0], markers.centers[3][1]),
-                )
-
-                # Update template with bounds
-                template = self.get_template(template_id)
-                if template:
-                    template.aruco_bounds = bounds
-                    template.image_width = image.shape[1]
-                    template.image_height = image.shape[0]
-                    self._save_template(template)
+            # Bounds are only usable if all 4 markers were found
+            if not markers.all_found:
+                return None
+            bounds = ArucoMarkerBounds(
+                top_left=(markers.centers[0][0], markers.centers[0][1]),
+                top_right=(markers.centers[1][0], markers.centers[1][1]),
+                bottom_right=(markers.centers[2][0], markers.centers[2][1]),
+                bottom_left=(markers.centers[3][0], markers.centers[3][1]),
+            )
+            return bounds, image.shape[1], image.shape[0]
 
         except Exception as e:
             # Don't fail image save if ArUco detection fails
             print(f"Warning: Could not detect ArUco markers: {e}")
+            return None
 
     def save_image_base64(self, template_id: str, base64_data: str) -> Path:
         """Save template reference image from base64 string."""
@@ -190,6 +327,285 @@ class TemplateService:
         """Check if a template has a reference image."""
         return self._get_image_path(template_id).exists()
 
+    def get_layer_image_path(self, template_id: str, layer_id: str) -> Optional[Path]:
+        """Get the path to a layer's reference image if it exists."""
+        image_path = self._get_layer_image_path(template_id, layer_id)
+        return image_path if image_path.exists() else None
+
+    @staticmethod
+    def get_version(template: ToolkitTemplate) -> str:
+        """Content fingerprint of a template, stable across processes."""
+        return hashlib.sha256(template.model_dump_json().encode("utf-8")).hexdigest()[:16]
+
+    def compile_template(self, template: ToolkitTemplate, layer_id: Optional[str] = None) -> CompiledTemplate:
+        """Transform a template's (or one of its layers') ROIs into canonical space.
+
+        Compiled templates are cached per template version, so repeated
+        check-ins reuse the same canonical tool list and slot geometries.
+
+        Args:
+            template: Template to compile
+            layer_id: Layer to compile (required for layered templates)
+
+        Raises:
+            ValueError: If the template or layer has no ArUco bounds, or the
+                layer doesn't match the template
+        """
+        source: Union[ToolkitTemplate, TemplateLayer] = template
+        name = template.name
+        if layer_id is not None:
+            layer = template.get_layer(layer_id)
+            if layer is None:
+                raise ValueError(f"Layer '{layer_id}' not found in template '{template.template_id}'")
+            source = layer
+            name = f"{template.name} / {layer.name}"
+        elif template.layers:
+            raise ValueError(
+                f"Template '{template.template_id}' has layers; check in one image per layer"
+            )
+
+        if not source.aruco_bounds:
+            raise ValueError(
+                f"{'Layer' if layer_id else 'Template'} '{layer_id or template.template_id}' "
+                "does not have ArUco markers configured. "
+                "Please upload a reference image with ArUco markers."
+            )
+
+        version = self.get_version(template)
+        with self._compiled_lock:
+            compiled = self._compiled.get((template.template_id, layer_id))
+        if compiled is not None and compiled.version == version:
+            return compiled
+
+        # Canonical size is the marker-bounded content area of the reference image
+        bounds = source.aruco_bounds
+        content_width = bounds.content_width
+        content_height = bounds.content_height
+        canonical_width = int(content_width)
+        canonical_height = int(content_height)
+
+        from ..cv.geometry import SlotGeometry
+
+        # Transform ROIs from template image space to canonical space
+        tl_x, tl_y = bounds.top_left
+        scale_x = canonical_width / content_width
+        scale_y = canonical_height / content_height
+
+        tools_to_use = []
+        for tool in source.tools:
+            # Transform polygon points if present
+            transformed_points = None
+            if tool.roi.is_polygon:
+                transformed_points = [
+                    (
+                        max(0, int((p[0] - tl_x) * scale_x)),
+                        max(0, int((p[1] - tl_y) * scale_y))
+                    )
+                    for p in tool.roi.points
+                ]
+
+            # Translate ROI origin relative to TL marker, then scale
+            new_x = int((tool.roi.x - tl_x) * scale_x)
+            new_y = int((tool.roi.y - tl_y) * scale_y)
+            new_width = int(tool.roi.width * scale_x)
+            new_height = int(tool.roi.height * scale_y)
+
+            transformed_roi = ROI(
+                x=max(0, new_x),
+                y=max(0, new_y),
+                width=new_width,
+                height=new_height,
+                points=transformed_points,
+            )
+            transformed_tool = ToolDefinition(
+                tool_id=tool.tool_id,
+                name=tool.name,
+                slot_index=tool.slot_index,
+                roi=transformed_roi,
+                description=tool.description,
+            )
+            tools_to_use.append(transformed_tool)
+
+        # Convert template to legacy ToolkitConfig for CV processing
+        toolkit_config = ToolkitConfig(
+            toolkit_id=template.template_id,
+            name=name,
+            description=template.description,
+            foam_color=template.foam_color,
+            tools=tools_to_use,
+            brightness_threshold=template.brightness_threshold,
+            occupied_ratio_threshold=template.occupied_ratio_threshold,
+        )
+
+        compiled = CompiledTemplate(
+            template=template,
+            version=version,
+            canonical_size=(canonical_width, canonical_height),
+            toolkit_config=toolkit_config,
+            geometries={tool.tool_id: SlotGeometry.from_roi(tool.roi) for tool in tools_to_use},
+            layer_id=layer_id,
+        )
+        with self._compiled_lock:
+            self._compiled[(template.template_id, layer_id)] = compiled
+        return compiled
+
+    def compile_all(self, template: ToolkitTemplate) -> list[CompiledTemplate]:
+        """Compile a template, or each of its layers, skipping parts without ArUco bounds."""
+        if not template.layers:
+            return [self.compile_template(template)] if template.aruco_bounds else []
+        return [
+            self.compile_template(template, layer.layer_id)
+            for layer in template.layers
+            if layer.aruco_bounds
+        ]
+
+    # ==================== REFERENCE IMAGES ====================
+
+    def add_reference_image(
+        self,
+        template_id: str,
+        image_data: bytes,
+        label: Optional[str] = None,
+    ) -> ReferenceImage:
+        """Add another reference capture to a template.
+
+        The image must show the template's ArUco markers so it can be
+        registered to the same canonical space as the primary reference.
+
+        Raises:
+            ValueError: If the template doesn't exist, has no ArUco bounds yet,
+                or the markers can't be found in the image
+        """
+        import cv2
+        import numpy as np
+
+        template = self.get_template(template_id)
+        if not template:
+            raise ValueError(f"Template '{template_id}' not found")
+
+        compiled = self.compile_template(template)
+        image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Failed to decode reference image")
+        reg_result = compiled.registration.register(image)
+        if not reg_result.success:
+            raise ValueError(f"Cannot register reference image: {reg_result.fallback_reason}")
+
+        reference = ReferenceImage(reference_id=f"ref_{uuid.uuid4().hex[:8]}", label=label)
+        image_path = self._get_reference_image_path(template_id, reference.reference_id)
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(image_path, "wb") as f:
+            f.write(image_data)
+
+        template.reference_images.append(reference)
+        template.updated_at = datetime.utcnow()
+        self._save_template(template)
+        return reference
+
+    def delete_reference_image(self, template_id: str, reference_id: str) -> bool:
+        """Remove an additional reference capture from a template."""
+        template = self.get_template(template_id)
+        if not template:
+            return False
+
+        remaining = [r for r in template.reference_images if r.reference_id != reference_id]
+        if len(remaining) == len(template.reference_images):
+            return False
+
+        template.reference_images = remaining
+        template.updated_at = datetime.utcnow()
+        self._save_template(template)
+
+        self._get_reference_image_path(template_id, reference_id).unlink(missing_ok=True)
+        self.reference_store.invalidate(template_id, reference_id)
+        return True
+
+    def get_reference_image_path(self, template_id: str, reference_id: str) -> Optional[Path]:
+        """Get the path of a reference capture (the primary one for 'default')."""
+        if reference_id == DEFAULT_REFERENCE_ID:
+            return self.get_image_path(template_id)
+        image_path = self._get_reference_image_path(template_id, reference_id)
+        return image_path if image_path.exists() else None
+
+    def get_reference_data(
+        self,
+        compiled: CompiledTemplate,
+        reference_id: str = DEFAULT_REFERENCE_ID,
+    ) -> Optional["ReferenceData"]:
+        """Get memory-mapped canonical reference data for a compiled template.
+
+        The image path and reference-store key are worked out once per
+        compiled template. Replacing a reference image bumps the template's
+        version, which compiles it afresh.
+
+        Args:
+            compiled: Compiled template
+            reference_id: Reference capture to load (primary image by default)
+
+        Returns:
+            ReferenceData, or None if the reference image is missing or unusable
+        """
+        source = compiled.reference_keys.get(reference_id)
+        if source is None:
+            template_id = compiled.template.template_id
+            if compiled.layer_id is not None:
+                # Layers have a single reference capture
+                image_path = None
+                if reference_id == DEFAULT_REFERENCE_ID:
+                    image_path = self.get_layer_image_path(template_id, compiled.layer_id)
+            else:
+                image_path = self.get_reference_image_path(template_id, reference_id)
+            if not image_path:
+                return None
+
+            from ..cv.reference_store import ReferenceStore
+
+            key = ReferenceStore.compute_key(image_path, compiled.toolkit_config.tools, compiled.canonical_size)
+            source = compiled.reference_keys[reference_id] = (image_path, key)
+
+        image_path, key = source
+        return self.reference_store.get(
+            compiled.store_id, image_path, compiled.toolkit_config.tools, compiled.registration,
+            reference_id=reference_id, key=key,
+        )
 
-# Singleton instance
-template_service = TemplateService()
+    def get_all_reference_data(self, compiled: CompiledTemplate) -> list["ReferenceData"]:
+        """Get reference data for every usable reference capture of a template (or layer)."""
+        reference_ids = [DEFAULT_REFERENCE_ID]
+        if compiled.layer_id is None:
+            reference_ids += [r.reference_id for r in compiled.template.reference_images]
+        references = [self.get_reference_data(compiled, reference_id) for reference_id in reference_ids]
+        return [r for r in references if r is not None]
+
+    def select_reference(
+        self,
+        compiled: CompiledTemplate,
+        working_image: "np.ndarray",
+    ) -> Optional["ReferenceData"]:
+        """Pick the reference capture closest to a registered check-in image.
+
+        Compares a tiny global descriptor (luminance histogram + thumbnail),
+        so the cost does not grow with the number of slots.
+
+        Args:
+            compiled: Compiled template
+            working_image: Check-in image in canonical space
+
+        Returns:
+            Closest ReferenceData, or None if the template has no usable reference
+        """
+        references = self.get_all_reference_data(compiled)
+        if len(references) <= 1:
+            return references[0] if references else None
+
+        from ..cv.reference_store import compute_global_descriptor, descriptor_distance
+
+        descriptor = compute_global_descriptor(working_image)
+        candidates = [r for r in references if r.descriptor is not None]
+        if not candidates:
+            return references[0]
+        return min(candidates, key=lambda r: descriptor_distance(descriptor, r.descriptor))
+
+
+# Singleton instance (constructed on first use)
+template_service: TemplateService = LazySingleton(TemplateService)
@@ -1,12 +1,14 @@
 import json
+import re
 import uuid
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
-
-import numpy as np
+from typing import TYPE_CHECKING, Optional, Union
 
 from ..core.config import settings
+from ..core.deadline import Deadline
+from ..core.lazy import LazySingleton
 from ..core.models import (
     Toolkit,
     ToolkitStatus,
@@ -17,14 +19,45 @@ from ..core.models import (
     CheckInSummary,
     ToolCheckInResult,
     CheckInResponse,
-    ToolkitConfig,
-    ToolDefinition,
-    ROI,
     RegistrationInfo,
+    ToolAnalysisResult,
+    AnalysisResult,
+    Degradation,
+    LayerCheckInResult,
+    TemplateLayer,
+    ToolkitTemplate,
 )
-from .template_service import template_service
-from ..cv.processor import ToolkitProcessor
-from ..utils.image_utils import encode_image_base64, create_thumbnail
+from .annotation_renderer import annotation_renderer
+from .artifact_store import artifact_store
+from .template_service import CompiledTemplate, template_service
+from .checkin_cache import CheckInResultCache
+from .locks import KeyedLock
+
+if TYPE_CHECKING:
+    import numpy as np
+    from ..cv.processor import ToolkitProcessor
+
+# Degradations that lower the quality of slot statuses; those must not be carried forward
+DEGRADED_DETECTION = {Degradation.BRIGHTNESS_ONLY, Degradation.DOWNSCALED}
+
+
+class ToolkitConflictError(Exception):
+    """Raised when a toolkit was modified since the caller read it."""
+
+    def __init__(self, toolkit_id: str, expected_version: int, current_version: int):
+        super().__init__(
+            f"Toolkit '{toolkit_id}' was modified concurrently "
+            f"(expected version {expected_version}, current version {current_version})"
+        )
+        self.current_version = current_version
+
+
+@dataclass
+class FrameAnalysis:
+    """Output of the CV stage of a check-in."""
+    analysis: AnalysisResult
+    reference_id: Optional[str] = None  # Reference capture the frame was compared against
+    signatures: Optional[dict[str, "np.ndarray"]] = None  # Slot signatures to persist (incremental mode)
 
 
 class ToolkitInstanceService:
@@ -33,9 +66,29 @@ class ToolkitInstanceService:
     def __init__(self, data_dir: Optional[Path] = None):
         self.data_dir = data_dir or settings.toolkit_config_dir / "toolkits"
         self.checkins_dir = settings.toolkit_config_dir / "checkins"
+        self.signatures_dir = settings.toolkit_config_dir / "signatures"
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.checkins_dir.mkdir(parents=True, exist_ok=True)
-        self.processor = ToolkitProcessor()
+        self.signatures_dir.mkdir(parents=True, exist_ok=True)
+        # Serializes read-modify-write of a toolkit across threads and processes
+        self.locks = KeyedLock(settings.toolkit_config_dir / "locks")
+        self._processor: Optional["ToolkitProcessor"] = None
+        self.result_cache = CheckInResultCache(
+            max_entries=settings.checkin_cache_max_entries,
+            ttl_seconds=settings.checkin_cache_ttl_seconds,
+            phash_max_distance=(
+                settings.checkin_cache_phash_max_distance if settings.checkin_cache_phash_enabled else None
+            ),
+            phash_window_seconds=settings.checkin_cache_phash_window_seconds,
+        )
+
+    @property
+    def processor(self) -> "ToolkitProcessor":
+        """Shared, stateless CV processor (the OpenCV stack is imported on first use)."""
+        if self._processor is None:
+            from ..cv.processor import ToolkitProcessor
+            self._processor = ToolkitProcessor()
+        return self._processor
 
     def _get_toolkit_path(self, toolkit_id: str) -> Path:
         return self.data_dir / f"{toolkit_id}.json"
@@ -43,6 +96,9 @@ class ToolkitInstanceService:
     def _get_checkin_path(self, checkin_id: str) -> Path:
         return self.checkins_dir / f"{checkin_id}.json"
 
+    def _get_signatures_path(self, toolkit_id: str) -> Path:
+        return self.signatures_dir / f"{toolkit_id}.npz"
+
     # ==================== TOOLKIT CRUD ====================
 
     def list_toolkits(self) -> list[Toolkit]:
@@ -74,11 +130,6 @@ class ToolkitInstanceService:
         if not template:
             raise ValueError(f"Template '{request.template_id}' not found")
 
-        # Check toolkit ID doesn't exist
-        toolkit_path = self._get_toolkit_path(request.toolkit_id)
-        if toolkit_path.exists():
-            raise ValueError(f"Toolkit '{request.toolkit_id}' already exists")
-
         # Initialize tool states from template
         tool_states = [
             ToolState(
@@ -87,7 +138,7 @@ class ToolkitInstanceService:
                 status=ToolStatus.UNKNOWN,
                 confidence=0.0,
             )
-            for tool in template.tools
+            for tool in template.all_tools
         ]
 
         now = datetime.utcnow()
@@ -103,47 +154,171 @@ class ToolkitInstanceService:
             updated_at=now,
         )
 
-        self._save_toolkit(toolkit)
+        with self.locks.lock(request.toolkit_id):
+            # Check toolkit ID doesn't exist
+            if self._get_toolkit_path(request.toolkit_id).exists():
+                raise ValueError(f"Toolkit '{request.toolkit_id}' already exists")
+            self._save_toolkit(toolkit)
         return toolkit
 
     def update_toolkit(self, toolkit: Toolkit) -> Toolkit:
-        """Update a toolkit instance."""
-        toolkit_path = self._get_toolkit_path(toolkit.toolkit_id)
-        if not toolkit_path.exists():
-            raise ValueError(f"Toolkit '{toolkit.toolkit_id}' not found")
-
-        toolkit.updated_at = datetime.utcnow()
-        self._save_toolkit(toolkit)
+        """Update a toolkit instance.
+
+        Args:
+            toolkit: New toolkit state; its version must be the version the
+                caller read
+
+        Raises:
+            ValueError: If the toolkit does not exist
+            ToolkitConflictError: If the toolkit was saved since it was read
+        """
+        with self.locks.lock(toolkit.toolkit_id):
+            current = self.get_toolkit(toolkit.toolkit_id)
+            if not current:
+                raise ValueError(f"Toolkit '{toolkit.toolkit_id}' not found")
+            if toolkit.version != current.version:
+                raise ToolkitConflictError(toolkit.toolkit_id, toolkit.version, current.version)
+
+            toolkit.updated_at = datetime.utcnow()
+            self._save_toolkit(toolkit)
         return toolkit
 
     def delete_toolkit(self, toolkit_id: str) -> bool:
         """Delete a toolkit instance."""
-        toolkit_path = self._get_toolkit_path(toolkit_id)
-        if not toolkit_path.exists():
-            return False
-
-        toolkit_path.unlink()
+        with self.locks.lock(toolkit_id):
+            toolkit_path = self._get_toolkit_path(toolkit_id)
+            if not toolkit_path.exists():
+                return False
+
+            toolkit_path.unlink()
+            self._get_signatures_path(toolkit_id).unlink(missing_ok=True)
+            # Its history goes too, so the images it refers to can be collected
+            for checkin_path in self._get_checkin_paths(toolkit_id):
+                checkin_path.unlink(missing_ok=True)
+        # A toolkit re-created under this ID starts over at the same versions
+        self.result_cache.invalidate(toolkit_id)
         return True
 
     def _save_toolkit(self, toolkit: Toolkit) -> Path:
-        """Save toolkit to disk."""
+        """Save toolkit to disk, bumping its version.
+
+        Callers must hold the toolkit's lock. The file is replaced
+        atomically, so readers never see a partial write.
+        """
+        toolkit.version += 1
         toolkit_path = self._get_toolkit_path(toolkit.toolkit_id)
-        with open(toolkit_path, "w") as f:
+        tmp_path = toolkit_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
             json.dump(toolkit.model_dump(mode="json"), f, indent=2, default=str)
+        tmp_path.replace(toolkit_path)
         return toolkit_path
 
     # ==================== CHECK-IN ====================
 
+    def get_canonical_size(self, toolkit_id: str, layer_id: Optional[str] = None) -> tuple[int, int]:
+        """Canonical (width, height) check-ins of this toolkit (or layer) are warped to.
+
+        Falls back to the configured default if the toolkit, layer or ArUco
+        bounds are missing (check_in then reports the real problem).
+        """
+        toolkit = self.get_toolkit(toolkit_id)
+        template = template_service.get_template(toolkit.template_id) if toolkit else None
+        source = template.get_layer(layer_id) if template and layer_id is not None else template
+        if source and source.aruco_bounds:
+            bounds = source.aruco_bounds
+            return int(bounds.content_width), int(bounds.content_height)
+        return settings.aruco_canonical_width, settings.aruco_canonical_height
+
+    def get_decode_target(self, toolkit_id: str, layer_id: Optional[str] = None) -> Optional[tuple[int, int]]:
+        """Resolution uploads of this toolkit (or layer) are needed at.
+
+        This is the size of the template's reference image: an upload framed
+        like it and decoded at least this large keeps its marker-bounded
+        content at the canonical size or above, so nothing is lost by
+        decoding a larger photo at reduced resolution.
+
+        Returns:
+            (width, height), or None to decode at full resolution (reduced
+            decoding disabled, or the reference size is unknown)
+        """
+        if not settings.reduced_decode_enabled:
+            return None
+        toolkit = self.get_toolkit(toolkit_id)
+        template = template_service.get_template(toolkit.template_id) if toolkit else None
+        source = template.get_layer(layer_id) if template and layer_id is not None else template
+        if source and source.image_width and source.image_height:
+            return source.image_width, source.image_height
+        return None
+
+    def get_cached_checkin(self, toolkit_id: str, content_hash: str) -> Optional[CheckInResponse]:
+        """Return the stored result of an identical recent upload, if any.
+
+        Lets callers skip decoding entirely when an operator re-submits the
+        same photo.
+
+        Args:
+            toolkit_id: Toolkit being checked in
+            content_hash: SHA-256 hex digest of the uploaded bytes
+
+        Returns:
+            Replayed CheckInResponse (with cached=True), or None
+        """
+        if not settings.checkin_cache_enabled:
+            return None
+
+        toolkit = self.get_toolkit(toolkit_id)
+        if not toolkit:
+            return None
+        template = template_service.get_template(toolkit.template_id)
+        if not template:
+            return None
+
+        key = self.result_cache.make_key(
+            content_hash, toolkit_id, template_service.get_version(template), toolkit.version
+        )
+        cached = self.result_cache.get(key)
+        return cached.model_copy(update={"cached": True}) if cached else None
+
     def check_in(
         self,
         toolkit_id: str,
-        image: np.ndarray,
+        image: Union["np.ndarray", dict[str, "np.ndarray"]],
         notes: Optional[str] = None,
         checked_in_by: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        lazy_annotation: Optional[bool] = None,
     ) -> CheckInResponse:
-        """Perform a check-in for a toolkit."""
-        from ..cv.registration import ToolkitRegistration
-        from ..core.config import settings
+        """Perform a check-in for a toolkit.
+
+        For a multi-layer template the layers are registered and analyzed in
+        parallel on the CV executor, then merged into one check-in record and
+        a single toolkit update.
+
+        Args:
+            toolkit_id: Toolkit to check in
+            image: Decoded upload (BGR format), or one decoded upload per layer
+                (layer_id → image) for a multi-layer template
+            notes: Optional operator notes
+            checked_in_by: Optional user performing the check-in
+            content_hash: SHA-256 hex digest of the uploaded bytes; enables
+                replaying the result for duplicate submissions
+            deadline: Optional latency budget; cheaper modes are used when it
+                runs low and listed in the response's degradations
+            lazy_annotation: Render the annotated image on first request
+                instead of during the check-in (None = ``annotation_rendering``)
+
+        Returns:
+            CheckInResponse (cached=True if replayed from a recent identical upload)
+
+        Raises:
+            CheckInAborted: If the deadline expires or is cancelled before the
+                toolkit is updated
+        """
+        from ..utils.image_utils import compute_dhash
+
+        deadline = deadline or Deadline()
+        deadline.check()  # The budget may have run out while queued
 
         # Get toolkit and template
         toolkit = self.get_toolkit(toolkit_id)
@@ -154,127 +329,45 @@ class ToolkitInstanceService:
         if not template:
             raise ValueError(f"Template '{toolkit.template_id}' not found")
 
-        # Require ArUco bounds on template
-        if not template.aruco_bounds:
-            raise ValueError(
-                f"Template '{template.template_id}' does not have ArUco markers configured. "
-                "Please upload a reference image with ArUco markers."
+        layered = isinstance(image, dict)
+        if layered:
+            self._check_layer_images(template, image)
+        elif template.layers:
+            raise ValueError(f"Template '{template.template_id}' has layers; upload one image per layer")
+
+        # Replay the result of a duplicate submission instead of re-analyzing,
+        # as long as nothing has saved the toolkit since (e.g. a checkout)
+        template_version = template_service.get_version(template)
+        phash = None
+        if settings.checkin_cache_enabled:
+            if content_hash:
+                cached = self.result_cache.get(
+                    self.result_cache.make_key(content_hash, toolkit_id, template_version, toolkit.version)
+                )
+                if cached:
+                    return cached.model_copy(update={"cached": True})
+            if settings.checkin_cache_phash_enabled and not layered:
+                phash = compute_dhash(image)
+                cached = self.result_cache.find_similar(toolkit_id, template_version, toolkit.version, phash)
+                if cached:
+                    return cached.model_copy(update={"cached": True})
+
+        if lazy_annotation is None:
+            lazy_annotation = settings.annotation_rendering == "lazy"
+
+        # Registration, reference selection and analysis; layers run in parallel
+        if layered:
+            from .cv_executor import cv_executor
+            frames = cv_executor.fan_out(
+                lambda layer: self._analyze_layer(
+                    toolkit, template, layer, image[layer.layer_id], deadline, lazy_annotation
+                ),
+                template.layers,
             )
-
-        # Set up registration with template-specific canonical size
-        bounds = template.aruco_bounds
-        content_width = bounds.content_width
-        content_height = bounds.content_height
-        canonical_width = int(content_width)
-        canonical_height = int(content_height)
-
-        registration = ToolkitRegistration(
-            dictionary=settings.aruco_dictionary,
-            marker_ids=settings.aruco_marker_ids,
-            canonical_size=(canonical_width, canonical_height),
-            min_markers_for_homography=settings.aruco_min_markers,
-        )
-
-        # Detect ArUco markers FIRST - fail if not found
-        reg_result = registration.register(image)
-
-        if not reg_result.success:
-            markers_found = reg_result.markers_detected
-            reason = reg_result.fallback_reason or "Unknown error"
-            raise ValueError(
-                f"Cannot process check-in: {reason}. "
-                f"Found {markers_found}/4 ArUco markers. "
-                "Please ensure all 4 corner markers are visible in the image."
-            )
-
-        # Use the warped (perspective-corrected) image for detection
-        working_image = reg_result.warped_image
-
-        # Build registration info for response
-        registration_info = RegistrationInfo(
-            markers_detected=reg_result.markers_detected,
-            markers_expected=4,
-            homography_applied=reg_result.success,
-            fallback_reason=reg_result.fallback_reason,
-        )
-
-        # Transform ROIs from template image space to canonical space
-        tl_x, tl_y = bounds.top_left
-        scale_x = canonical_width / content_width
-        scale_y = canonical_height / content_height
-
-        tools_to_use = []
-        for tool in template.tools:
-            # Transform polygon points if present
-            transformed_points = None
-            if tool.roi.is_polygon:
-                transformed_points = [
-                    (
-                        max(0, int((p[0] - tl_x) * scale_x)),
-                        max(0, int((p[1] - tl_y) * scale_y))
-                    )
-                    for p in tool.roi.points
-                ]
-
-            # Translate ROI origin relative to TL marker, then scale
-            new_x = int((tool.roi.x - tl_x) * scale_x)
-            new_y = int((tool.roi.y - tl_y) * scale_y)
-            new_width = int(tool.roi.width * scale_x)
-            new_height = int(tool.roi.height * scale_y)
-
-            transformed_roi = ROI(
-                x=max(0, new_x),
-                y=max(0, new_y),
-                width=new_width,
-                height=new_height,
-                points=transformed_points,
-            )
-            transformed_tool = ToolDefinition(
-                tool_id=tool.tool_id,
-                name=tool.name,
-                slot_index=tool.slot_index,
-                roi=transformed_roi,
-                description=tool.description,
-            )
-            tools_to_use.append(transformed_tool)
-
-        # Convert template to legacy ToolkitConfig for CV processing
-        toolkit_config = ToolkitConfig(
-            toolkit_id=template.template_id,
-            name=template.name,
-            description=template.description,
-            foam_color=template.foam_color,
-            tools=tools_to_use,
-            brightness_threshold=template.brightness_threshold,
-            occupied_ratio_threshold=template.occupied_ratio_threshold,
-        )
-
-        # Load and warp reference image for comparison-based detection
-        reference_warped = None
-        reference_image_path = template_service.get_image_path(template.template_id)
-        if reference_image_path:
-            import cv2
-            reference_raw = cv2.imread(str(reference_image_path))
-            if reference_raw is not None:
-                # Warp reference image to canonical space using its ArUco markers
-                ref_reg_result = registration.register(reference_raw)
-                if ref_reg_result.success:
-                    reference_warped = ref_reg_result.warped_image
-
-        # Disable processor's own registration (we already did it)
-        self.processor.registration = None
-
-        # Run CV analysis on the WARPED image with reference comparison
-        analysis = self.processor.analyze(
-            image=working_image,
-            toolkit_config=toolkit_config,
-            include_annotated_image=True,
-            include_debug_info=True,
-            reference_image=reference_warped,
-        )
-
-        # Override registration info with our result
-        analysis.registration = registration_info
+        else:
+            # Transform template into canonical space (cached per template version)
+            compiled = template_service.compile_template(template)
+            frames = [self._run_cv_stage(toolkit, compiled, image, deadline, lazy_annotation)]
 
         # Convert results (include debug info for diagnostics)
         tool_results = [
@@ -284,17 +377,43 @@ class ToolkitInstanceService:
                 status=r.status,
                 confidence=r.confidence,
                 debug_info=r.debug_info,
+                carried_over=r.carried_over,
             )
-            for r in analysis.tools
+            for frame in frames
+            for r in frame.analysis.tools
         ]
 
+        summaries = [frame.analysis.summary for frame in frames]
         summary = CheckInSummary(
-            total_tools=analysis.summary.total_tools,
-            present=analysis.summary.present,
-            missing=analysis.summary.missing,
-            uncertain=analysis.summary.uncertain,
+            total_tools=sum(s.total_tools for s in summaries),
+            present=sum(s.present for s in summaries),
+            missing=sum(s.missing for s in summaries),
+            uncertain=sum(s.uncertain for s in summaries),
         )
 
+        # A single image reports at the top level, layers report individually
+        if layered:
+            layers = [
+                LayerCheckInResult(
+                    layer_id=layer.layer_id,
+                    name=layer.name,
+                    registration=frame.analysis.registration,
+                    reference_id=frame.reference_id,
+                    image_annotated=frame.analysis.image_annotated,
+                )
+                for layer, frame in zip(template.layers, frames)
+            ]
+            registration, reference_id, image_annotated = None, None, None
+        else:
+            layers = []
+            registration = frames[0].analysis.registration
+            reference_id = frames[0].reference_id
+            image_annotated = frames[0].analysis.image_annotated
+
+        signatures = None
+        if all(frame.signatures is not None for frame in frames):
+            signatures = {tool_id: sig for frame in frames for tool_id, sig in frame.signatures.items()}
+
         # Determine toolkit status
         if summary.missing > 0:
             new_status = ToolkitStatus.INCOMPLETE
@@ -303,33 +422,44 @@ class ToolkitInstanceService:
         else:
             new_status = ToolkitStatus.CHECKED_IN
 
-        # Update toolkit state
-        now = datetime.utcnow()
-        toolkit.status = new_status
-        toolkit.last_checkin = now
-        toolkit.updated_at = now
-
-        # Update tool states
-        for result in tool_results:
-            for tool_state in toolkit.tool_states:
-                if tool_state.tool_id == result.tool_id:
-                    tool_state.status = result.status
-                    tool_state.confidence = result.confidence
-                    if result.status == ToolStatus.PRESENT:
-                        tool_state.last_seen = now
-                    break
-
-        self._save_toolkit(toolkit)
-
-        # Create check-in record with thumbnail
-        checkin_id = f"ci_{toolkit_id}_{now.strftime('%Y%m%d_%H%M%S')}"
-        thumbnail = None
-        if analysis.image_annotated:
-            try:
-                thumbnail = create_thumbnail(analysis.image_annotated, max_width=150)
-            except Exception:
-                pass  # Thumbnail is optional, continue without it
-
+        # History thumbnail of the single image, or of the first layer (encoded with the annotation)
+        thumbnail = next((f.analysis.thumbnail for f in frames if f.analysis.thumbnail), None)
+
+        # Last chance to give up before anything is persisted
+        deadline.check()
+
+        # The CV stage above ran unlocked; only the state update is serialized.
+        # Re-read the toolkit so changes saved meanwhile (another check-in, a
+        # checkout) are kept rather than overwritten with the stale copy.
+        with self.locks.lock(toolkit_id):
+            toolkit = self.get_toolkit(toolkit_id)
+            if not toolkit:
+                raise ValueError(f"Toolkit '{toolkit_id}' not found")
+
+            now = datetime.utcnow()
+            toolkit.status = new_status
+            toolkit.last_checkin = now
+            toolkit.updated_at = now
+
+            # Update tool states
+            for result in tool_results:
+                for tool_state in toolkit.tool_states:
+                    if tool_state.tool_id == result.tool_id:
+                        tool_state.status = result.status
+                        tool_state.confidence = result.confidence
+                        if result.status == ToolStatus.PRESENT:
+                            tool_state.last_seen = now
+                        break
+
+            self._save_toolkit(toolkit)
+            if DEGRADED_DETECTION.intersection(deadline.degradations):
+                # Next check-in analyzes every slot again at full quality
+                self._get_signatures_path(toolkit_id).unlink(missing_ok=True)
+            elif signatures is not None:
+                self._save_signatures(toolkit_id, template_version, signatures)
+
+        # Random suffix: several check-ins of one toolkit can land in the same second
+        checkin_id = f"ci_{toolkit_id}_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
         checkin_record = CheckInRecord(
             checkin_id=checkin_id,
             toolkit_id=toolkit_id,
@@ -338,14 +468,22 @@ class ToolkitInstanceService:
             status=new_status,
             tools=tool_results,
             summary=summary,
-            registration=analysis.registration,
+            registration=registration,
+            reference_id=reference_id,
+            # Inline annotated images are too large for the history; stored ones are
+            # kept as long as a record refers to them, so the URLs handed out stay valid
+            layers=[
+                layer.model_copy(update={"image_annotated": self._stored_url(layer.image_annotated)})
+                for layer in layers
+            ],
             checked_in_by=checked_in_by,
             notes=notes,
             thumbnail=thumbnail,
+            image_annotated=self._stored_url(image_annotated),
         )
         self._save_checkin(checkin_record)
 
-        return CheckInResponse(
+        response = CheckInResponse(
             checkin_id=checkin_id,
             toolkit_id=toolkit_id,
             toolkit_name=toolkit.name,
@@ -354,37 +492,278 @@ class ToolkitInstanceService:
             status=new_status,
             tools=tool_results,
             summary=summary,
-            registration=analysis.registration,
-            image_annotated=analysis.image_annotated,
+            registration=registration,
+            reference_id=reference_id,
+            layers=layers,
+            image_annotated=image_annotated,
+            degradations=list(deadline.degradations),
         )
 
-    def checkout(self, toolkit_id: str, location: Optional[str] = None) -> Toolkit:
-        """Mark a toolkit as checked out."""
-        toolkit = self.get_toolkit(toolkit_id)
-        if not toolkit:
-            raise ValueError(f"Toolkit '{toolkit_id}' not found")
+        # Degraded results are not replayed: a retry with more time should get the full analysis.
+        # Keyed by the version this check-in saved, which is what a duplicate will find.
+        if settings.checkin_cache_enabled and (content_hash or phash is not None) and not deadline.degradations:
+            # Without a content hash the entry is only reachable through find_similar
+            key = self.result_cache.make_key(
+                content_hash or f"phash:{phash:016x}", toolkit_id, template_version, toolkit.version
+            )
+            self.result_cache.put(key, toolkit_id, template_version, toolkit.version, response, phash=phash)
+
+        return response
+
+    @staticmethod
+    def _check_layer_images(template: ToolkitTemplate, images: dict[str, "np.ndarray"]) -> None:
+        """Require exactly one image per layer of the template.
+
+        Raises:
+            ValueError: If a layer has no image or an image matches no layer
+        """
+        if not template.layers:
+            raise ValueError(f"Template '{template.template_id}' has no layers; upload a single image")
+        layer_ids = {layer.layer_id for layer in template.layers}
+        missing = [layer.layer_id for layer in template.layers if layer.layer_id not in images]
+        unknown = sorted(set(images) - layer_ids)
+        if missing:
+            raise ValueError(f"No image for layer(s): {', '.join(missing)}")
+        if unknown:
+            raise ValueError(f"Unknown layer(s) in template '{template.template_id}': {', '.join(unknown)}")
+
+    def _run_cv_stage(
+        self,
+        toolkit: Toolkit,
+        compiled: CompiledTemplate,
+        image: "np.ndarray",
+        deadline: Deadline,
+        lazy_annotation: bool = False,
+    ) -> FrameAnalysis:
+        """Run analyze_frame in-process or on the worker farm, depending on the backend."""
+        if settings.cv_backend == "process":
+            from .process_pool import cv_process_pool
+            return cv_process_pool.analyze_frame(toolkit, compiled, image, deadline, lazy_annotation)
+        return self.analyze_frame(toolkit, compiled, image, deadline, lazy_annotation)
+
+    def _analyze_layer(
+        self,
+        toolkit: Toolkit,
+        template: ToolkitTemplate,
+        layer: TemplateLayer,
+        image: "np.ndarray",
+        deadline: Deadline,
+        lazy_annotation: bool = False,
+    ) -> FrameAnalysis:
+        """Compile one layer and run the CV stage on its image.
+
+        Raises:
+            ValueError: If the layer can't be compiled or registered (the
+                message names the layer)
+        """
+        try:
+            compiled = template_service.compile_template(template, layer.layer_id)
+            return self._run_cv_stage(toolkit, compiled, image, deadline, lazy_annotation)
+        except ValueError as e:
+            raise ValueError(f"Layer '{layer.name}': {e}") from e
+
+    def analyze_frame(
+        self,
+        toolkit: Toolkit,
+        compiled: CompiledTemplate,
+        image: "np.ndarray",
+        deadline: Optional[Deadline] = None,
+        lazy_annotation: bool = False,
+    ) -> FrameAnalysis:
+        """Run the CV stage of a check-in on a decoded frame.
+
+        Registers the frame to canonical space, picks the closest reference,
+        carries forward unchanged slots (if enabled) and analyzes the rest.
+        Has no side effects beyond storing images, so it can run in a worker
+        process. When the deadline runs low, reference comparison and
+        annotation are skipped (recorded in ``deadline.degradations``).
+        With ``lazy_annotation`` the annotated image is left for the
+        annotation renderer, unless the artifact store is off or
+        ``aruco_debug`` needs the registration result for its overlay.
+
+        Raises:
+            ValueError: If the ArUco markers could not be registered
+            CheckInAborted: If the deadline expires or is cancelled
+        """
+        # Detect ArUco markers FIRST - fail if not found
+        reg_result = compiled.registration.register(image)
 
-        now = datetime.utcnow()
-        toolkit.status = ToolkitStatus.CHECKED_OUT
-        toolkit.last_checkout = now
-        toolkit.updated_at = now
-        if location:
-            toolkit.location = location
+        if not reg_result.success:
+            markers_found = reg_result.markers_detected
+            reason = reg_result.fallback_reason or "Unknown error"
+            raise ValueError(
+                f"Cannot process check-in: {reason}. "
+                f"Found {markers_found}/4 ArUco markers. "
+                "Please ensure all 4 corner markers are visible in the image."
+            )
 
-        self._save_toolkit(toolkit)
+        # Use the warped (perspective-corrected) image for detection
+        working_image = reg_result.warped_image
+
+        # Closest memory-mapped canonical reference (built once per template version);
+        # brightness-only detection if there's no time left for the comparison
+        reference = None
+        if deadline is not None:
+            deadline.check()
+        if deadline is None or deadline.allows(settings.deadline_reference_seconds, Degradation.BRIGHTNESS_ONLY):
+            reference = template_service.select_reference(compiled, working_image)
+
+        # Carry forward slots that look unchanged since the previous check-in
+        signatures = None
+        carried_results = None
+        if settings.incremental_checkin_enabled:
+            signatures, carried_results = self._find_unchanged_slots(
+                toolkit, compiled, working_image, compiled.version
+            )
+
+        # Run CV analysis on the WARPED image with reference comparison
+        analysis = self.processor.analyze(
+            image=working_image,
+            toolkit_config=compiled.toolkit_config,
+            include_annotated_image=True,
+            include_debug_info=True,
+            reference_image=reference.warped if reference else None,
+            reference_slots=reference.slots if reference else None,
+            carried_results=carried_results,
+            geometries=compiled.geometries,
+            register=False,  # Already registered above
+            deadline=deadline,
+            thumbnail_width=settings.thumbnail_width,
+            store_image=artifact_store.put_url if settings.artifact_store_enabled else None,
+            defer_annotation=annotation_renderer.defer if self._defers_annotation(lazy_annotation) else None,
+            annotate_in_place=True,  # The warped frame is ours and isn't read afterwards
+        )
+
+        # Override registration info with our result
+        analysis.registration = RegistrationInfo(
+            markers_detected=reg_result.markers_detected,
+            markers_expected=4,
+            homography_applied=reg_result.success,
+            fallback_reason=reg_result.fallback_reason,
+        )
+
+        return FrameAnalysis(
+            analysis=analysis,
+            reference_id=reference.reference_id if reference else None,
+            signatures=signatures,
+        )
+
+    @staticmethod
+    def _stored_url(url: Optional[str]) -> Optional[str]:
+        """The URL of a stored image, or None for an inline data URL."""
+        return None if url is None or url.startswith("data:") else url
+
+    @staticmethod
+    def _defers_annotation(lazy_annotation: bool) -> bool:
+        # Lazy renders are served from the artifact store; the marker debug overlay can't be deferred
+        return lazy_annotation and settings.artifact_store_enabled and not settings.aruco_debug
+
+    def _load_signatures(self, toolkit_id: str, template_version: str) -> dict[str, "np.ndarray"]:
+        """Load per-slot signatures from the previous check-in.
+
+        Returns an empty dict if there are none or they were computed against
+        a different template version.
+        """
+        import numpy as np
+
+        path = self._get_signatures_path(toolkit_id)
+        if not path.exists():
+            return {}
+        try:
+            with np.load(path) as data:
+                if str(data["__template_version__"]) != template_version:
+                    return {}
+                return {key: data[key] for key in data.files if key != "__template_version__"}
+        except Exception:
+            return {}
+
+    def _save_signatures(self, toolkit_id: str, template_version: str, signatures: dict[str, "np.ndarray"]) -> None:
+        """Persist per-slot signatures for the next check-in."""
+        import numpy as np
+
+        path = self._get_signatures_path(toolkit_id)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, __template_version__=np.array(template_version), **signatures)
+        tmp_path.replace(path)
+
+    def _find_unchanged_slots(
+        self,
+        toolkit: Toolkit,
+        compiled: CompiledTemplate,
+        working_image: "np.ndarray",
+        template_version: str,
+    ) -> tuple[dict[str, "np.ndarray"], dict[str, ToolAnalysisResult]]:
+        """Run the cheap per-slot change test against the previous check-in.
+
+        A slot is carried forward when its signature is within
+        incremental_change_threshold of the last fully analyzed signature and
+        its previous status was definite (present or missing). Carried slots
+        keep their old signature so that slow drift is still caught.
+
+        Returns:
+            Tuple of (signatures to persist, carried results keyed by tool_id)
+        """
+        detector = self.processor.detector
+        previous = self._load_signatures(toolkit.toolkit_id, template_version)
+        states = {state.tool_id: state for state in toolkit.tool_states}
+
+        signatures = {}
+        carried = {}
+        for tool in compiled.toolkit_config.tools:
+            current = detector.compute_slot_signature(
+                working_image, compiled.geometries[tool.tool_id], size=settings.incremental_signature_size
+            )
+            signatures[tool.tool_id] = current
+
+            state = states.get(tool.tool_id)
+            old = previous.get(tool.tool_id)
+            if old is None or state is None or state.status not in (ToolStatus.PRESENT, ToolStatus.MISSING):
+                continue
+
+            distance = detector.signature_distance(current, old)
+            if distance <= settings.incremental_change_threshold:
+                signatures[tool.tool_id] = old
+                carried[tool.tool_id] = ToolAnalysisResult(
+                    tool_id=tool.tool_id,
+                    name=tool.name,
+                    slot_index=tool.slot_index,
+                    status=state.status,
+                    confidence=state.confidence,
+                    debug_info={"change_score": round(distance, 4)},
+                    carried_over=True,
+                )
+
+        return signatures, carried
+
+    def checkout(self, toolkit_id: str, location: Optional[str] = None) -> Toolkit:
+        """Mark a toolkit as checked out."""
+        with self.locks.lock(toolkit_id):
+            toolkit = self.get_toolkit(toolkit_id)
+            if not toolkit:
+                raise ValueError(f"Toolkit '{toolkit_id}' not found")
+
+            now = datetime.utcnow()
+            toolkit.status = ToolkitStatus.CHECKED_OUT
+            toolkit.last_checkout = now
+            toolkit.updated_at = now
+            if location:
+                toolkit.location = location
+
+            self._save_toolkit(toolkit)
+        self.result_cache.invalidate(toolkit_id)
         return toolkit
 
     def _save_checkin(self, record: CheckInRecord) -> Path:
-        """Save check-in record to disk."""
+        """Save check-in record to disk (never overwrites an existing record)."""
         checkin_path = self._get_checkin_path(record.checkin_id)
-        with open(checkin_path, "w") as f:
+        with open(checkin_path, "x") as f:
             json.dump(record.model_dump(mode="json"), f, indent=2, default=str)
         return checkin_path
 
     def get_checkin_history(self, toolkit_id: str, limit: int = 10) -> list[CheckInRecord]:
         """Get check-in history for a toolkit."""
         records = []
-        for checkin_file in self.checkins_dir.glob(f"ci_{toolkit_id}_*.json"):
+        for checkin_file in self._get_checkin_paths(toolkit_id):
             try:
                 with open(checkin_file, "r") as f:
                     data = json.load(f)
@@ -396,6 +775,47 @@ class ToolkitInstanceService:
         records.sort(key=lambda r: r.timestamp, reverse=True)
         return records[:limit]
 
+    def _get_checkin_paths(self, toolkit_id: str) -> list[Path]:
+        """Check-in record files of a toolkit (not of toolkits whose ID it prefixes)."""
+        pattern = re.compile(rf"ci_{re.escape(toolkit_id)}_\d{{8}}_\d{{6}}(_[0-9a-f]{{8}})?\.json")
+        return [
+            path for path in self.checkins_dir.glob(f"ci_{toolkit_id}_*.json")
+            if pattern.fullmatch(path.name)
+        ]
 
-# Singleton instance
-toolkit_instance_service = ToolkitInstanceService()
+    def collect_artifacts(self) -> dict:
+        """Delete stored images that no check-in record refers to any more.
+
+        Records keep the URLs their check-in returned (annotated images and
+        the thumbnail), so a URL stays valid, and may be cached as
+        immutable, for as long as its check-in is in the history. Images
+        left behind by aborted or failed check-ins, or by deleted toolkits,
+        are deleted once they are older than ``artifact_retention_hours``.
+
+        Returns:
+            Number of renders and artifacts deleted
+        """
+        keep_artifacts: set[str] = set()
+        keep_renders: set[str] = set()
+        for checkin_file in self.checkins_dir.glob("ci_*.json"):
+            try:
+                with open(checkin_file, "r") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            urls = [record.get("thumbnail"), record.get("image_annotated")]
+            urls += [layer.get("image_annotated") for layer in record.get("layers") or []]
+            for url in urls:
+                if name := artifact_store.name_from_url(url):
+                    keep_artifacts.add(name)
+                elif render_id := annotation_renderer.render_id_from_url(url):
+                    keep_renders.add(render_id)
+
+        max_age = settings.artifact_retention_hours * 3600
+        renders_removed, frames = annotation_renderer.collect_garbage(keep_renders, max_age)
+        artifacts_removed = artifact_store.collect_garbage(keep_artifacts | frames, max_age)
+        return {"renders_removed": renders_removed, "artifacts_removed": artifacts_removed}
+
+
+# Singleton instance (constructed on first use)
+toolkit_instance_service: ToolkitInstanceService = LazySingleton(ToolkitInstanceService)
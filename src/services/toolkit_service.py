@@ -3,6 +3,7 @@ from pathlib import Path
 from typing import Optional
 
 from ..core.config import settings
+from ..core.lazy import LazySingleton
 from ..core.models import ToolkitConfig, CreateToolkitRequest
 
 
@@ -136,5 +137,5 @@ class ToolkitService:
         return True
 
 
-# Singleton instance
-toolkit_service = ToolkitService()
+# Singleton instance (constructed on first use)
+toolkit_service: ToolkitService = LazySingleton(ToolkitService)
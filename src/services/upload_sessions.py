@@ -0,0 +1,310 @@
+"""Resumable chunked uploads of check-in images.
+
+Stations on weak networks can upload a check-in image in pieces: create a
+session with the image's total size, PUT chunks at their byte offsets (in
+any order, repeated chunks are harmless), then finalize it to run the
+check-in. The partial image lives in a preallocated file under the toolkit
+data directory and the session records which byte ranges are still
+missing, so after a dropped connection the client fetches the session and
+resends only those.
+
+Sessions are JSON files beside their data, updated under a KeyedLock so
+any server thread or process can take a chunk. Finalizing claims the
+session for FINALIZE_LEASE_SECONDS, so concurrent finalize calls can't
+check the same image in twice while a claim left by a crashed server
+lapses. A finalized session is kept (without its data) until it expires,
+so a retried finalize replays the result instead of failing. Sessions
+expire ``upload_session_ttl_seconds`` after their last update.
+"""
+
+import hashlib
+import re
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import settings
+from ..core.lazy import LazySingleton
+from ..core.models import UploadSession, UploadStatus
+from .locks import KeyedLock
+
+# A finalize claim older than this is presumed abandoned by a crashed server
+FINALIZE_LEASE_SECONDS = 300.0
+# Read size when loading a complete upload for its check-in
+READ_CHUNK_BYTES = 1024 * 1024
+
+UPLOAD_ID_PATTERN = re.compile(r"up_[0-9a-f]{16}")
+
+
+class UploadNotFound(Exception):
+    """Raised when an upload session doesn't exist or has expired."""
+
+
+class UploadConflict(Exception):
+    """Raised when an upload is in the wrong state for the operation."""
+
+
+class UploadIncomplete(Exception):
+    """Raised when finalizing an upload that still has missing byte ranges."""
+
+    def __init__(self, missing: list[tuple[int, int]]):
+        super().__init__(f"Upload is missing {sum(end - start for start, end in missing)} bytes")
+        self.missing = missing
+
+
+def subtract_range(ranges: list[tuple[int, int]], start: int, end: int) -> list[tuple[int, int]]:
+    """Remove [start, end) from a sorted list of disjoint [start, end) ranges."""
+    result = []
+    for range_start, range_end in ranges:
+        if range_end <= start or range_start >= end:
+            result.append((range_start, range_end))
+            continue
+        if range_start < start:
+            result.append((range_start, start))
+        if range_end > end:
+            result.append((end, range_end))
+    return result
+
+
+class UploadSessionService:
+    """Stores resumable uploads and tracks the byte ranges they still miss."""
+
+    def __init__(self, sessions_dir: Optional[Path] = None):
+        """Initialize the service.
+
+        Args:
+            sessions_dir: Directory for session files and partial data
+        """
+        self.sessions_dir = sessions_dir or settings.toolkit_config_dir / "uploads"
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.locks = KeyedLock(self.sessions_dir / "locks")
+
+    def _session_path(self, upload_id: str) -> Path:
+        return self.sessions_dir / f"{upload_id}.json"
+
+    def _data_path(self, upload_id: str) -> Path:
+        return self.sessions_dir / f"{upload_id}.part"
+
+    def _lock(self, upload_id: str):
+        # Striped on the ID's last hex digit: bounded lock files however many uploads come and go
+        return self.locks.lock(f"upload-{upload_id[-1]}")
+
+    def _load(self, upload_id: str) -> UploadSession:
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+            raise UploadNotFound(upload_id)
+        try:
+            session = UploadSession.model_validate_json(self._session_path(upload_id).read_text())
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id)
+        if session.expires_at <= datetime.utcnow():
+            self._remove(upload_id)
+            raise UploadNotFound(upload_id)
+        return session
+
+    def _save(self, session: UploadSession) -> None:
+        now = datetime.utcnow()
+        session.updated_at = now
+        session.expires_at = now + timedelta(seconds=settings.upload_session_ttl_seconds)
+        path = self._session_path(session.upload_id)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(session.model_dump_json())
+        tmp_path.replace(path)
+
+    def _remove(self, upload_id: str) -> None:
+        self._session_path(upload_id).unlink(missing_ok=True)
+        self._data_path(upload_id).unlink(missing_ok=True)
+
+    def create_session(
+        self,
+        toolkit_id: str,
+        size: int,
+        sha256: Optional[str] = None,
+        notes: Optional[str] = None,
+        checked_in_by: Optional[str] = None,
+    ) -> UploadSession:
+        """Start an upload of ``size`` bytes.
+
+        Args:
+            toolkit_id: Toolkit the image will be checked in to
+            size: Total image size in bytes
+            sha256: Expected SHA-256 of the whole image, verified on finalize
+            notes: Optional operator notes for the check-in
+            checked_in_by: Optional user performing the check-in
+
+        Returns:
+            The new session, with the whole image missing
+
+        Raises:
+            ValueError: If the size is not positive
+        """
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+        self.purge_expired()
+
+        upload_id = f"up_{uuid.uuid4().hex[:16]}"
+        with open(self._data_path(upload_id), "wb") as f:
+            f.truncate(size)  # Sparse until the chunks arrive
+
+        now = datetime.utcnow()
+        session = UploadSession(
+            upload_id=upload_id,
+            toolkit_id=toolkit_id,
+            size=size,
+            sha256=sha256.lower() if sha256 else None,
+            notes=notes,
+            checked_in_by=checked_in_by,
+            missing=[(0, size)],
+            created_at=now,
+            updated_at=now,
+            expires_at=now,
+        )
+        with self._lock(upload_id):
+            self._save(session)
+        return session
+
+    def get_session(self, upload_id: str) -> Optional[UploadSession]:
+        """Get an upload session by ID (None if unknown or expired)."""
+        try:
+            return self._load(upload_id)
+        except UploadNotFound:
+            return None
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes) -> UploadSession:
+        """Store a chunk of the image at ``offset``.
+
+        Returns:
+            The updated session
+
+        Raises:
+            UploadNotFound: If the session doesn't exist or has expired
+            UploadConflict: If the upload is being or has been finalized
+            ValueError: If the chunk doesn't fit inside the image
+        """
+        with self._lock(upload_id):
+            session = self._load(upload_id)
+            if session.status != UploadStatus.RECEIVING:
+                raise UploadConflict(f"Upload is {session.status.value} and no longer accepts chunks")
+            end = offset + len(data)
+            if offset < 0 or end > session.size:
+                raise ValueError(f"Chunk [{offset}, {end}) is outside the {session.size}-byte upload")
+
+            with open(self._data_path(upload_id), "r+b") as f:
+                f.seek(offset)
+                f.write(data)
+
+            session.missing = subtract_range(session.missing, offset, end)
+            session.received_bytes = session.size - sum(e - s for s, e in session.missing)
+            self._save(session)
+            return session
+
+    def begin_finalize(self, upload_id: str) -> tuple[UploadSession, Optional[bytearray]]:
+        """Claim a complete upload for its check-in and load the image.
+
+        Returns:
+            Tuple of (session, image data). The data is None if the upload
+            was finalized before; the session then names the check-in or job.
+
+        Raises:
+            UploadNotFound: If the session doesn't exist or has expired
+            UploadIncomplete: If byte ranges are still missing
+            UploadConflict: If another request is finalizing the upload
+            ValueError: If the image doesn't match the declared SHA-256. The
+                received data is discarded and must be uploaded again.
+        """
+        with self._lock(upload_id):
+            session = self._load(upload_id)
+            if session.status == UploadStatus.COMPLETED:
+                return session, None
+            if session.status == UploadStatus.FINALIZING:
+                claimed_for = (datetime.utcnow() - session.updated_at).total_seconds()
+                if claimed_for < FINALIZE_LEASE_SECONDS:
+                    raise UploadConflict("Upload is already being finalized")
+            if session.missing:
+                raise UploadIncomplete(session.missing)
+
+            data = bytearray(session.size)
+            digest = hashlib.sha256()
+            with open(self._data_path(upload_id), "rb", buffering=0) as f:
+                view = memoryview(data)
+                read = 0
+                while read < session.size:
+                    count = f.readinto(view[read:read + READ_CHUNK_BYTES])
+                    if not count:
+                        raise UploadConflict("Upload data is truncated")
+                    digest.update(view[read:read + count])
+                    read += count
+                del view
+
+            content_hash = digest.hexdigest()
+            if session.sha256 and content_hash != session.sha256:
+                # Back to receiving, even if this took over a lapsed claim
+                session.status = UploadStatus.RECEIVING
+                session.missing = [(0, session.size)]
+                session.received_bytes = 0
+                self._save(session)
+                raise ValueError("Upload doesn't match its SHA-256; upload it again")
+
+            session.status = UploadStatus.FINALIZING
+            session.content_hash = content_hash
+            self._save(session)
+            return session, data
+
+    def finish_finalize(
+        self,
+        upload_id: str,
+        checkin_id: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ) -> None:
+        """Record the check-in (or job) made from an upload and drop its data."""
+        with self._lock(upload_id):
+            try:
+                session = self._load(upload_id)
+            except UploadNotFound:
+                return  # Deleted while its check-in ran
+            session.status = UploadStatus.COMPLETED
+            session.checkin_id = checkin_id
+            session.job_id = job_id
+            self._save(session)
+            self._data_path(upload_id).unlink(missing_ok=True)
+
+    def release_finalize(self, upload_id: str) -> None:
+        """Give up a finalize claim after a failed check-in so it can be retried."""
+        with self._lock(upload_id):
+            try:
+                session = self._load(upload_id)
+            except UploadNotFound:
+                return
+            if session.status == UploadStatus.FINALIZING:
+                session.status = UploadStatus.RECEIVING
+                self._save(session)
+
+    def delete_session(self, upload_id: str) -> bool:
+        """Abandon an upload and delete its data.
+
+        Returns:
+            True if the session existed
+        """
+        with self._lock(upload_id):
+            try:
+                self._load(upload_id)
+            except UploadNotFound:
+                return False
+            self._remove(upload_id)
+            return True
+
+    def purge_expired(self) -> int:
+        """Delete expired sessions and their data.
+
+        Returns:
+            Number of sessions deleted
+        """
+        removed = 0
+        for path in self.sessions_dir.glob("up_*.json"):
+            if self.get_session(path.stem) is None:  # Loading an expired session removes it
+                removed += 1
+        return removed
+
+
+# Singleton instance
+upload_sessions: UploadSessionService = LazySingleton(UploadSessionService)
@@ -0,0 +1,167 @@
+"""Startup warm-up: preload templates and exercise the CV pipeline once.
+
+The first check-in after a deploy otherwise pays for importing the ArUco
+module, building detectors, starting OpenCV's thread pool and parsing every
+template from disk. Warm-up does that work in the background at startup, and
+/api/ready reports ready only once it has finished. It runs on the CV
+executor at background priority, so check-ins that arrive meanwhile go first.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import TYPE_CHECKING, Optional
+
+from ..core.config import settings
+from ..core.deadline import Deadline
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class WarmupStatus(str, Enum):
+    """Lifecycle of the warm-up phase."""
+    PENDING = "pending"
+    RUNNING = "running"
+    READY = "ready"
+    FAILED = "failed"
+
+
+@dataclass
+class WarmupState:
+    """Progress of the warm-up phase for this worker process."""
+    status: WarmupStatus = WarmupStatus.PENDING
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    templates_compiled: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def ready(self) -> bool:
+        return self.status == WarmupStatus.READY
+
+
+def make_synthetic_frame(registration) -> "np.ndarray":
+    """Render a frame with the four registration markers around the canonical area.
+
+    Marker centers are placed so that they map exactly onto the canonical
+    corners, which lets the frame flow through registration like a real photo.
+    """
+    import cv2
+    import numpy as np
+
+    width, height = registration.canonical_size
+    marker_size = max(40, min(width, height) // 8)
+    margin = marker_size
+    quiet = marker_size // 5
+
+    frame = np.full((height + 2 * margin, width + 2 * margin, 3), 40, dtype=np.uint8)
+    centers = [(0, 0), (width, 0), (width, height), (0, height)]
+    for marker_id, (cx, cy) in zip(registration.marker_ids, centers):
+        marker = cv2.aruco.generateImageMarker(registration.aruco_dict, marker_id, marker_size)
+        x = margin + cx - marker_size // 2
+        y = margin + cy - marker_size // 2
+        frame[y - quiet:y + marker_size + quiet, x - quiet:x + marker_size + quiet] = 255
+        frame[y:y + marker_size, x:x + marker_size] = marker[:, :, None]
+    return frame
+
+
+def warm_template(template) -> None:
+    """Compile a template (each layer of it) and run synthetic frames through the check-in pipeline."""
+    from .template_service import template_service
+
+    for compiled in template_service.compile_all(template):
+        _warm_compiled(compiled)
+
+
+def _warm_compiled(compiled) -> None:
+    """Run a synthetic frame through the check-in pipeline of one compiled template."""
+    from .cv_executor import cv_executor
+    from .template_service import template_service
+    from .toolkit_instance_service import toolkit_instance_service
+
+    frame = make_synthetic_frame(compiled.registration)
+    reg_result = compiled.registration.register(frame)
+    reference = template_service.select_reference(compiled, reg_result.warped_image)
+
+    # Same processor check-ins use; pauses between slots while check-ins wait
+    toolkit_instance_service.processor.analyze(
+        image=reg_result.warped_image,
+        toolkit_config=compiled.toolkit_config,
+        include_annotated_image=True,
+        include_debug_info=True,
+        reference_image=reference.warped if reference else None,
+        reference_slots=reference.slots if reference else None,
+        geometries=compiled.geometries,
+        register=False,
+        deadline=Deadline(checkpoint=cv_executor.preemption_point),
+        thumbnail_width=settings.thumbnail_width,
+        annotate_in_place=True,
+    )
+
+
+def run_warmup(state: Optional[WarmupState] = None) -> WarmupState:
+    """Compile all templates and run a synthetic frame through the pipeline.
+
+    Args:
+        state: State object to update (defaults to the process-wide state)
+
+    Returns:
+        The updated WarmupState
+    """
+    state = state or warmup_state
+    state.status = WarmupStatus.RUNNING
+    state.started_at = datetime.utcnow()
+    started = time.perf_counter()
+
+    try:
+        from .cv_executor import cv_executor, Priority
+        from .template_service import template_service
+
+        for template in template_service.list_templates():
+            if not template_service.compile_all(template):
+                continue
+            try:
+                cv_executor.submit(warm_template, template, priority=Priority.BACKGROUND).result()
+                state.templates_compiled += 1
+            except Exception as e:
+                state.errors.append(f"{template.template_id}: {e}")
+
+        # Spawn the worker farm so its processes compile templates before traffic arrives
+        if settings.cv_backend == "process":
+            from .process_pool import cv_process_pool
+            cv_process_pool.warm()
+
+        state.status = WarmupStatus.READY
+    except Exception as e:
+        state.errors.append(str(e))
+        state.status = WarmupStatus.FAILED
+    finally:
+        state.finished_at = datetime.utcnow()
+        state.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    return state
+
+
+def start_warmup() -> Optional[threading.Thread]:
+    """Start warm-up in a background thread if enabled.
+
+    When warm-up is disabled the worker is reported ready immediately.
+
+    Returns:
+        The warm-up thread, or None if warm-up is disabled
+    """
+    if not settings.warmup_enabled:
+        warmup_state.status = WarmupStatus.READY
+        return None
+
+    thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# Process-wide warm-up state
+warmup_state = WarmupState()
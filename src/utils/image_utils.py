@@ -1,16 +1,129 @@
 import base64
+import io
 from pathlib import Path
-from typing import Union
+from typing import Callable, NamedTuple, Optional, Union
 
 import cv2
 import numpy as np
 
 
-def load_image(source: Union[str, Path, bytes]) -> np.ndarray:
+# Decode flags for each supported downscale factor (JPEG is scaled inside the decoder)
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+# Leading bytes parsed for an image's dimensions (headers sit near the start)
+HEADER_PROBE_BYTES = 256 * 1024
+
+# Encoded image data: bytes, or a buffer filled while streaming an upload
+ImageData = Union[bytes, bytearray, memoryview]
+
+# File extension of each annotated-image format name
+IMAGE_FORMATS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+QUALITY_FLAGS = {".jpg": cv2.IMWRITE_JPEG_QUALITY, ".jpeg": cv2.IMWRITE_JPEG_QUALITY, ".webp": cv2.IMWRITE_WEBP_QUALITY}
+
+
+class ImageHeader(NamedTuple):
+    """Dimensions and format of an encoded image."""
+    width: int
+    height: int
+    format: str  # Pillow format name, e.g. 'JPEG' or 'PNG'
+
+    @property
+    def scaled_decode(self) -> bool:
+        """Whether reduced decoding happens inside the decoder (JPEG only).
+
+        Other formats are decoded at full size and then shrunk.
+        """
+        return self.format == "JPEG"
+
+
+def read_image_header(data: ImageData) -> Optional[ImageHeader]:
+    """Read an encoded image's dimensions and format without decoding it.
+
+    Args:
+        data: Encoded image bytes
+
+    Returns:
+        The header, or None if Pillow can't parse it
+
+    Raises:
+        PIL.Image.DecompressionBombError: If the image has far more pixels
+            than Pillow is allowed to open
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    def parse(head: bytes) -> Optional[ImageHeader]:
+        try:
+            with Image.open(io.BytesIO(head)) as image:
+                return ImageHeader(image.width, image.height, image.format or "")
+        except Image.DecompressionBombError:
+            raise
+        except (UnidentifiedImageError, OSError, ValueError):
+            return None
+
+    if isinstance(data, bytes):
+        return parse(data)  # BytesIO shares the bytes object, no copy
+
+    # A mutable buffer would be copied whole; the header only needs its start
+    view = memoryview(data)
+    header = parse(bytes(view[:HEADER_PROBE_BYTES]))
+    if header is None and len(view) > HEADER_PROBE_BYTES:
+        header = parse(bytes(view))
+    return header
+
+
+def read_image_size(data: ImageData) -> Optional[tuple[int, int]]:
+    """Read an encoded image's (width, height) from its header (None if unreadable).
+
+    Raises:
+        PIL.Image.DecompressionBombError: As for read_image_header
+    """
+    header = read_image_header(data)
+    return (header.width, header.height) if header else None
+
+
+def choose_reduce_factor(size: tuple[int, int], target_size: tuple[int, int]) -> int:
+    """Pick the largest decode downscale that keeps an image at least as large as a target.
+
+    Sides are compared longest to longest, so a photo taken in the other
+    orientation (or with an EXIF rotation still to apply) is handled too.
+
+    Args:
+        size: (width, height) of the encoded image
+        target_size: (width, height) the image is needed at
+
+    Returns:
+        1, 2, 4 or 8
+    """
+    long_side, short_side = max(size), min(size)
+    target_long, target_short = max(target_size), min(target_size)
+    factor = 1
+    for candidate in REDUCED_DECODE_FLAGS:
+        if long_side // candidate >= target_long and short_side // candidate >= target_short:
+            factor = candidate
+    return factor
+
+
+def load_image(
+    source: Union[str, Path, ImageData],
+    reduce_factor: int = 1,
+    target_size: Optional[tuple[int, int]] = None,
+) -> np.ndarray:
     """Load an image from file path or bytes.
 
     Args:
-        source: File path, Path object, or image bytes
+        source: File path, Path object, or image bytes (any buffer; decoded
+            in place without copying)
+        reduce_factor: Decode at 1/2, 1/4 or 1/8 resolution (bytes only)
+        target_size: (width, height) the image is needed at (bytes only). The
+            header is read first and the image decoded at the largest
+            reduction that still covers it (never less than reduce_factor).
+            JPEGs are then scaled inside the decoder, which is several times
+            faster and needs a fraction of the memory.
 
     Returns:
         OpenCV image array (BGR format)
@@ -18,10 +131,22 @@ def load_image(source: Union[str, Path, bytes]) -> np.ndarray:
     Raises:
         ValueError: If image cannot be loaded
     """
-    if isinstance(source, bytes):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if target_size is not None:
+            from PIL import Image
+
+            try:
+                size = read_image_size(source)
+            except Image.DecompressionBombError as e:
+                raise ValueError(f"Image is too large to decode: {e}")
+            if size is not None:
+                reduce_factor = max(reduce_factor, choose_reduce_factor(size, target_size))
+
         # Decode from bytes
         nparr = np.frombuffer(source, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image = cv2.imdecode(nparr, REDUCED_DECODE_FLAGS[reduce_factor])
+        if image is None:
+            raise ValueError(f"Failed to decode image data ({len(nparr)} bytes)")
     else:
         # Load from file path
         path = Path(source)
@@ -51,25 +176,90 @@ def save_image(image: np.ndarray, path: Union[str, Path]) -> Path:
     return path
 
 
-def encode_image_base64(image: np.ndarray, format: str = ".png") -> str:
-    """Encode an OpenCV image to base64 string.
+def encode_image(image: np.ndarray, format: str = ".png", quality: Optional[int] = None) -> bytes:
+    """Encode an OpenCV image.
 
     Args:
         image: OpenCV image array
-        format: Image format (e.g., '.png', '.jpg')
+        format: Image format (e.g., '.png', '.jpg', '.webp')
+        quality: JPEG/WebP quality (1-100; None = encoder default)
 
     Returns:
-        Base64 encoded string with data URI prefix
+        Encoded image bytes
+
+    Raises:
+        ValueError: If encoding fails
     """
-    success, buffer = cv2.imencode(format, image)
+    params = [QUALITY_FLAGS[format], quality] if quality is not None and format in QUALITY_FLAGS else []
+    success, buffer = cv2.imencode(format, image, params)
     if not success:
         raise ValueError(f"Failed to encode image to {format}")
+    return buffer.tobytes()
+
 
-    b64_string = base64.b64encode(buffer).decode("utf-8")
-    mime_type = "image/png" if format == ".png" else "image/jpeg"
+def to_data_url(data: bytes, format: str) -> str:
+    """Wrap encoded image bytes in a base64 data URL."""
+    b64_string = base64.b64encode(data).decode("utf-8")
+    mime_type = MIME_TYPES.get(format, "application/octet-stream")
     return f"data:{mime_type};base64,{b64_string}"
 
 
+def encode_image_base64(image: np.ndarray, format: str = ".png", quality: Optional[int] = None) -> str:
+    """Encode an OpenCV image to base64 string.
+
+    Args:
+        image: OpenCV image array
+        format: Image format (e.g., '.png', '.jpg', '.webp')
+        quality: JPEG/WebP quality (1-100; None = encoder default)
+
+    Returns:
+        Base64 encoded string with data URI prefix
+    """
+    return to_data_url(encode_image(image, format, quality), format)
+
+
+def encode_annotated_image(
+    image: np.ndarray,
+    image_format: str = "jpeg",
+    quality: Optional[int] = None,
+    thumbnail_width: Optional[int] = None,
+    store: Optional[Callable[[bytes, str], str]] = None,
+) -> tuple[str, Optional[str]]:
+    """Encode an annotated image and its thumbnail straight from the pixels.
+
+    The thumbnail is resized from the same array rather than decoded back
+    from the encoded image. It is optional: if it can't be made, the image
+    is returned without one.
+
+    Args:
+        image: OpenCV image array
+        image_format: "jpeg", "webp" or "png"
+        quality: JPEG/WebP quality (1-100; None = encoder default)
+        thumbnail_width: Maximum thumbnail width (None = no thumbnail)
+        store: Called with each encoded image and its file extension,
+            returning the URL to refer to it by (None = inline data URLs)
+
+    Returns:
+        Tuple of (image URL, JPEG thumbnail URL or None)
+
+    Raises:
+        ValueError: If the format is unknown or encoding the image fails
+    """
+    extension = IMAGE_FORMATS.get(image_format)
+    if extension is None:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    publish = store or to_data_url
+
+    encoded = publish(encode_image(image, extension, quality), extension)
+    thumbnail = None
+    if thumbnail_width is not None:
+        try:
+            thumbnail = publish(encode_image(shrink_to_width(image, thumbnail_width), ".jpg", quality), ".jpg")
+        except Exception:
+            pass  # Thumbnail is optional, continue without it
+    return encoded, thumbnail
+
+
 def decode_image_base64(b64_string: str) -> np.ndarray:
     """Decode a base64 string to OpenCV image.
 
@@ -112,9 +302,42 @@ def resize_image(image: np.ndarray, max_dimension: int = 1920) -> np.ndarray:
     return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
 
 
+def compute_dhash(image: np.ndarray, hash_size: int = 8) -> int:
+    """Compute a difference hash (dHash) for near-duplicate detection.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale grid and
+    each bit records whether a pixel is brighter than its right neighbour.
+    Re-encodes and small resizes of the same photo produce hashes within a
+    few bits of each other.
+
+    Args:
+        image: OpenCV image array (BGR or grayscale)
+        hash_size: Grid size (hash has hash_size * hash_size bits)
+
+    Returns:
+        Hash as an integer
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def shrink_to_width(image: np.ndarray, max_width: int) -> np.ndarray:
+    """Scale an image down to ``max_width`` (height scales proportionally)."""
+    height, width = image.shape[:2]
+    if width <= max_width:
+        return image
+    new_height = int(height * max_width / width)
+    return cv2.resize(image, (max_width, new_height), interpolation=cv2.INTER_AREA)
+
+
 def create_thumbnail(image_base64: str, max_width: int = 150) -> str:
     """Create a thumbnail from a base64 encoded image.
 
+    Check-ins get their thumbnail from ``encode_annotated_image`` instead,
+    which skips decoding the image again.
+
     Args:
         image_base64: Base64 data URL of the image
         max_width: Maximum width of thumbnail (height scales proportionally)
@@ -123,11 +346,4 @@ def create_thumbnail(image_base64: str, max_width: int = 150) -> str:
         Base64 data URL of the thumbnail
     """
     image = decode_image_base64(image_base64)
-    height, width = image.shape[:2]
-
-    if width > max_width:
-        scale = max_width / width
-        new_height = int(height * scale)
-        image = cv2.resize(image, (max_width, new_height), interpolation=cv2.INTER_AREA)
-
-    return encode_image_base64(image, ".jpg")
+    return encode_image_base64(shrink_to_width(image, max_width), ".jpg")
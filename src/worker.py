@@ -0,0 +1,138 @@
+"""
+Standalone worker for asynchronous check-in jobs.
+
+Usage:
+    python -m src.worker [--worker-id NAME] [--poll-interval 1.0] [--once]
+
+Run as many workers as needed against the same toolkit data directory (see
+src/services/job_queue.py for filesystem requirements). Each worker claims
+one job at a time, runs the normal check-in and stores the result for
+``GET /api/jobs/{job_id}``. The job's lease is renewed while the check-in
+runs; if it is lost anyway (e.g. the worker stalled), the check-in is
+abandoned before the toolkit is updated.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from .core.config import settings
+from .core.deadline import CheckInAborted, Deadline
+from .services.job_queue import job_queue
+from .services.resource_governor import ResourceGovernor
+
+logger = logging.getLogger("toolkit.worker")
+
+
+def _keep_lease(job_id: str, worker_id: str, deadline: Deadline, done: threading.Event) -> None:
+    """Renew a job's lease until ``done`` is set; cancel the check-in if the lease is lost."""
+    interval = settings.job_lease_seconds / 3
+    while not done.wait(interval):
+        if not job_queue.renew(job_id, worker_id):
+            logger.warning("Lost the lease of job %s; abandoning it", job_id)
+            deadline.cancel("job lease lost")
+            return
+
+
+def process_job(job_id: str, worker_id: str) -> None:
+    """Run the check-in for a claimed job and record the outcome."""
+    from .services.toolkit_instance_service import toolkit_instance_service
+    from .utils.image_utils import load_image
+
+    job = job_queue.get_job(job_id)
+    params = job_queue.get_params(job_id)
+    try:
+        contents = job_queue.get_upload_path(job_id).read_bytes()
+    except FileNotFoundError:
+        job_queue.fail(job_id, worker_id, "Uploaded image is missing")
+        return
+
+    deadline = Deadline()
+    done = threading.Event()
+    heartbeat = threading.Thread(
+        target=_keep_lease, args=(job_id, worker_id, deadline, done), name=f"lease-{job_id}", daemon=True
+    )
+    heartbeat.start()
+    try:
+        result = toolkit_instance_service.check_in(
+            toolkit_id=job.toolkit_id,
+            image=load_image(contents, target_size=toolkit_instance_service.get_decode_target(job.toolkit_id)),
+            notes=params.get("notes"),
+            checked_in_by=params.get("checked_in_by"),
+            content_hash=hashlib.sha256(contents).hexdigest(),
+            deadline=deadline,
+        )
+    except CheckInAborted:
+        return  # Lease lost: the job belongs to another worker now
+    except ValueError as e:
+        # Bad input (unreadable image, markers not found, ...): retrying won't help
+        updated = job_queue.fail(job_id, worker_id, f"Check-in failed: {e}")
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        updated = job_queue.fail(job_id, worker_id, f"Check-in failed: {e}", retry=True)
+    else:
+        updated = job_queue.complete(job_id, worker_id, result)
+    finally:
+        done.set()
+        heartbeat.join()
+    if not updated:
+        logger.warning("Job %s was claimed by another worker; outcome discarded", job_id)
+
+
+def run(worker_id: str, poll_interval: float, once: bool = False) -> None:
+    """Claim and process jobs until stopped.
+
+    Args:
+        worker_id: Identifier recorded on claimed jobs
+        poll_interval: Seconds to sleep when the queue is empty
+        once: Exit as soon as the queue is empty
+    """
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        logger.info("Stopping after the current job")
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info("Worker %s polling %s", worker_id, job_queue.db_path)
+    while not stopping:
+        job = job_queue.claim(worker_id)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        started = time.perf_counter()
+        process_job(job.job_id, worker_id)
+        logger.info("Job %s done in %.0f ms", job.job_id, (time.perf_counter() - started) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process asynchronous check-in jobs")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}", help="Worker identifier")
+    parser.add_argument(
+        "--poll-interval", type=float, default=settings.job_poll_interval_seconds,
+        help="Seconds to wait when the queue is empty",
+    )
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # One job at a time: it may use this process's whole CPU share
+    ResourceGovernor(concurrent_jobs=1).apply()
+    settings.ensure_directories()
+    run(args.worker_id, args.poll_interval, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -1179,7 +1179,8 @@ async function performCheckin(e) {
         const formData = new FormData();
         formData.append('file', file);
 
-        const res = await fetch(`/api/toolkits/${toolkitId}/checkin`, {
+        // The result image is shown right away, so render it with the check-in
+        const res = await fetch(`/api/toolkits/${toolkitId}/checkin?render=eager`, {
             method: 'POST',
             body: formData
         });
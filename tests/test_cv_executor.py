@@ -0,0 +1,170 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from src.core.config import settings
+from src.services.cv_executor import CVExecutor, ExecutorSaturated, Priority
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def make_executor():
+    executors = []
+
+    def make(max_workers: int, interactive_reserved: int = 0, max_queue: int = 64) -> CVExecutor:
+        executor = CVExecutor(
+            max_workers=max_workers,
+            max_queue=max_queue,
+            retry_after_seconds=1,
+            interactive_reserved=interactive_reserved,
+        )
+        executors.append(executor)
+        return executor
+
+    yield make
+    for executor in executors:
+        executor.shutdown()
+
+
+def occupy(executor: CVExecutor, priority: Priority = Priority.INTERACTIVE):
+    """Start a job that holds a worker until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(TIMEOUT)
+
+    future = executor.submit(hold, priority=priority)
+    assert started.wait(TIMEOUT)
+    return future, release
+
+
+def test_weighted_fair_shares(make_executor):
+    executor = make_executor(max_workers=1)
+    blocker, release = occupy(executor)
+
+    order = []
+    futures = [
+        executor.submit(order.append, priority, priority=priority)
+        for priority in Priority
+        for _ in range(40)
+    ]
+    release.set()
+    for future in [blocker] + futures:
+        future.result(TIMEOUT)
+
+    # While every class has work waiting, workers go to them in proportion to their weights
+    rounds = 4
+    weights = {
+        Priority.INTERACTIVE: settings.cv_weight_interactive,
+        Priority.BATCH: settings.cv_weight_batch,
+        Priority.BACKGROUND: settings.cv_weight_background,
+    }
+    per_round = sum(weights.values())
+    counts = Counter(order[:int(rounds * per_round)])
+    for priority, weight in weights.items():
+        assert abs(counts[priority] - rounds * weight) <= 1
+
+
+def test_returning_class_gets_no_credit_for_idle_time(make_executor):
+    executor = make_executor(max_workers=1)
+    for _ in range(20):
+        executor.submit(lambda: None, priority=Priority.BATCH).result(TIMEOUT)
+
+    blocker, release = occupy(executor, Priority.BATCH)
+    order = []
+    futures = [executor.submit(order.append, "batch", priority=Priority.BATCH) for _ in range(4)]
+    futures += [executor.submit(order.append, "background", priority=Priority.BACKGROUND) for _ in range(4)]
+    release.set()
+    for future in [blocker] + futures:
+        future.result(TIMEOUT)
+
+    # Background was idle while batch ran alone; it still only gets its share
+    assert order[:3].count("background") == 1
+
+
+def test_interactive_reservation(make_executor):
+    executor = make_executor(max_workers=2, interactive_reserved=1)
+    batch, release = occupy(executor, Priority.BATCH)
+
+    # The second worker is kept for interactive work
+    queued = executor.submit(lambda: "batch", priority=Priority.BATCH)
+    assert executor.stats()["classes"]["batch"]["queued"] == 1
+    assert executor.submit(lambda: "interactive").result(TIMEOUT) == "interactive"
+    assert not queued.done()
+
+    release.set()
+    assert queued.result(TIMEOUT) == "batch"
+    batch.result(TIMEOUT)
+
+
+def test_reservation_leaves_a_worker_for_other_classes(make_executor):
+    executor = make_executor(max_workers=1, interactive_reserved=1)
+    assert executor.interactive_reserved == 0
+    assert executor.submit(lambda: "batch", priority=Priority.BATCH).result(TIMEOUT) == "batch"
+
+
+def test_full_queue_rejects(make_executor):
+    executor = make_executor(max_workers=1, max_queue=2)
+    blocker, release = occupy(executor)
+    futures = [executor.submit(lambda: None) for _ in range(2)]
+    with pytest.raises(ExecutorSaturated):
+        executor.submit(lambda: None)
+    # Other classes have queues of their own
+    futures.append(executor.submit(lambda: None, priority=Priority.BATCH))
+
+    release.set()
+    for future in [blocker] + futures:
+        future.result(TIMEOUT)
+    assert executor.stats()["classes"]["interactive"]["rejected"] == 1
+
+
+def test_preempted_background_job_resumes_before_queued_batch_work(make_executor):
+    executor = make_executor(max_workers=1)
+    order = []
+    started, proceed = threading.Event(), threading.Event()
+
+    def background():
+        started.set()
+        proceed.wait(TIMEOUT)
+        order.append("background")
+        executor.preemption_point()
+        order.append("background resumed")
+
+    job = executor.submit(background, priority=Priority.BACKGROUND)
+    assert started.wait(TIMEOUT)
+
+    # Saturate the executor: interactive and batch work waits behind the background job
+    futures = [executor.submit(order.append, "interactive") for _ in range(2)]
+    futures += [executor.submit(order.append, "batch", priority=Priority.BATCH) for _ in range(3)]
+    proceed.set()
+    job.result(TIMEOUT)
+    for future in futures:
+        future.result(TIMEOUT)
+
+    assert order == ["background", "interactive", "interactive", "background resumed"] + ["batch"] * 3
+    assert executor.stats()["paused"] == 0
+
+
+@pytest.mark.parametrize("priority", [Priority.INTERACTIVE, Priority.BATCH])
+def test_preemption_point_only_pauses_background_jobs(make_executor, priority):
+    executor = make_executor(max_workers=1)
+    order = []
+    started, proceed = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        proceed.wait(TIMEOUT)
+        executor.preemption_point()
+        order.append("job")
+
+    future = executor.submit(job, priority=priority)
+    assert started.wait(TIMEOUT)
+    waiting = executor.submit(order.append, "interactive")
+    proceed.set()
+    future.result(TIMEOUT)
+    waiting.result(TIMEOUT)
+
+    assert order == ["job", "interactive"]
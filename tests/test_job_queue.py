@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.core.config import settings
+from src.core.models import JobStatus
+from src.services.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs")
+
+
+def set_updated_at(queue: JobQueue, job_id: str, when: datetime) -> None:
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (when.isoformat(), job_id))
+
+
+def test_lease_expired_too_often_fails_the_job_and_drops_its_upload(queue, monkeypatch):
+    monkeypatch.setattr(settings, "job_max_attempts", 1)
+    job = queue.enqueue("k1", b"image")
+    assert queue.claim("w1", lease_seconds=-1).job_id == job.job_id
+
+    # The worker died; its lease has lapsed
+    assert queue.claim("w2") is None
+    job = queue.get_job(job.job_id)
+    assert job.status == JobStatus.FAILED
+    assert not queue.get_upload_path(job.job_id).exists()
+
+
+def test_purge_finished_keeps_recent_and_unfinished_jobs(queue):
+    old = datetime.utcnow() - timedelta(hours=2)
+    succeeded, failed, recent = (queue.enqueue("k1", b"image") for _ in range(3))
+    for _ in range(3):
+        queue.claim("w1")
+    queued = queue.enqueue("k1", b"image")
+    queue.fail(failed.job_id, "w1", "bad image")
+    queue.fail(recent.job_id, "w1", "bad image")
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET status = ? WHERE job_id = ?", (JobStatus.SUCCEEDED.value, succeeded.job_id))
+    for job in (succeeded, failed, queued):
+        set_updated_at(queue, job.job_id, old)
+
+    assert queue.purge_finished(max_age_seconds=3600) == 2
+    assert queue.get_job(succeeded.job_id) is None
+    assert queue.get_job(failed.job_id) is None
+    assert not queue.get_upload_path(succeeded.job_id).exists()
+    assert queue.get_job(queued.job_id).status == JobStatus.QUEUED
+    assert queue.get_upload_path(queued.job_id).exists()
+    assert queue.get_job(recent.job_id).status == JobStatus.FAILED
+
+
+def test_purge_finished_disabled(queue):
+    job = queue.enqueue("k1", b"image")
+    queue.claim("w1")
+    queue.fail(job.job_id, "w1", "bad image")
+    set_updated_at(queue, job.job_id, datetime.utcnow() - timedelta(days=365))
+    assert queue.purge_finished(max_age_seconds=0) == 0
+    assert queue.get_job(job.job_id) is not None
@@ -0,0 +1,94 @@
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.core.models import UploadStatus
+from src.services.upload_sessions import (
+    FINALIZE_LEASE_SECONDS,
+    UploadConflict,
+    UploadSessionService,
+    subtract_range,
+)
+
+
+@pytest.fixture
+def service(tmp_path):
+    return UploadSessionService(tmp_path / "uploads")
+
+
+def test_subtract_range_out_of_order_chunks():
+    missing = [(0, 100)]
+    for start, end in [(60, 80), (0, 10), (90, 100), (30, 40)]:
+        missing = subtract_range(missing, start, end)
+    assert missing == [(10, 30), (40, 60), (80, 90)]
+
+
+def test_subtract_range_overlapping_chunks():
+    missing = [(10, 30), (40, 60), (80, 90)]
+    # Spans two gaps and the received bytes between them
+    missing = subtract_range(missing, 20, 50)
+    assert missing == [(10, 20), (50, 60), (80, 90)]
+    # Already received
+    assert subtract_range(missing, 60, 80) == missing
+    # Overlaps the end of one gap and the start of the next
+    assert subtract_range(missing, 55, 85) == [(10, 20), (50, 55), (85, 90)]
+    # Covers everything
+    assert subtract_range(missing, 0, 100) == []
+
+
+def test_chunks_in_any_order_complete_the_upload(service):
+    data = bytes(range(256)) * 4
+    session = service.create_session("k1", len(data), sha256=hashlib.sha256(data).hexdigest())
+    for start, end in [(512, 1024), (0, 300), (200, 700)]:
+        session = service.write_chunk(session.upload_id, start, data[start:end])
+    assert session.missing == []
+    assert session.received_bytes == len(data)
+
+    session, received = service.begin_finalize(session.upload_id)
+    assert session.status == UploadStatus.FINALIZING
+    assert bytes(received) == data
+
+
+def test_sha256_mismatch_reopens_the_upload(service):
+    data = b"x" * 64
+    session = service.create_session("k1", len(data), sha256=hashlib.sha256(data).hexdigest())
+    service.write_chunk(session.upload_id, 0, b"y" * 64)
+
+    with pytest.raises(ValueError):
+        service.begin_finalize(session.upload_id)
+    session = service.write_chunk(session.upload_id, 0, data)
+    assert session.status == UploadStatus.RECEIVING
+
+    _, received = service.begin_finalize(session.upload_id)
+    assert bytes(received) == data
+
+
+def test_sha256_mismatch_after_taking_over_a_lapsed_claim(service):
+    data = b"x" * 64
+    session = service.create_session("k1", len(data), sha256=hashlib.sha256(data).hexdigest())
+    service.write_chunk(session.upload_id, 0, b"y" * 64)
+
+    # A finalize that died after claiming the upload
+    session = service.get_session(session.upload_id)
+    session.status = UploadStatus.FINALIZING
+    session.updated_at = datetime.utcnow() - timedelta(seconds=FINALIZE_LEASE_SECONDS + 1)
+    service._session_path(session.upload_id).write_text(session.model_dump_json())
+
+    with pytest.raises(ValueError):
+        service.begin_finalize(session.upload_id)
+    session = service.write_chunk(session.upload_id, 0, data)
+    assert session.status == UploadStatus.RECEIVING
+    assert session.missing == []
+
+
+def test_live_claim_conflicts(service):
+    data = b"x" * 64
+    session = service.create_session("k1", len(data))
+    service.write_chunk(session.upload_id, 0, data)
+    service.begin_finalize(session.upload_id)
+
+    with pytest.raises(UploadConflict):
+        service.begin_finalize(session.upload_id)
+    with pytest.raises(UploadConflict):
+        service.write_chunk(session.upload_id, 0, data)